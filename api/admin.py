@@ -1,6 +1,12 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import Usuario, Projeto, Ambiente, Log, ModeloDocumento, MaterialSpec, TipoAmbiente, Marca
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
+
+from .models import Usuario, Projeto, Ambiente, Log, ModeloDocumento, MaterialSpec, TipoAmbiente, Marca, Outbox, PerfilRequisicao
+from .perfilamento import arquivo_prof, top_funcoes
 
 class CustomUserAdmin(UserAdmin):
     # Mostra os campos personalizados na lista de usuários
@@ -20,4 +26,56 @@ admin.site.register(Log)
 admin.site.register(ModeloDocumento)
 admin.site.register(MaterialSpec)
 admin.site.register(TipoAmbiente)
-admin.site.register(Marca)
\ No newline at end of file
+admin.site.register(Marca)
+
+
+@admin.register(Outbox)
+class OutboxAdmin(admin.ModelAdmin):
+    list_display = ('assunto', 'status', 'tentativas', 'proxima_tentativa', 'criado_em', 'enviado_em')
+    list_filter = ('status',)
+    exclude = ('corpo',)  # pode ter uma senha enquanto a mensagem não sai
+
+
+@admin.register(PerfilRequisicao)
+class PerfilRequisicaoAdmin(admin.ModelAdmin):
+    list_display = ('criado_em', 'metodo', 'rota', 'duracao_ms', 'status_code', 'usuario', 'motivo')
+    list_filter = ('motivo', 'metodo')
+    search_fields = ('rota', 'caminho')
+    list_select_related = ('usuario',)
+    fields = ('metodo', 'rota', 'caminho', 'usuario', 'status_code', 'duracao_ms', 'motivo', 'criado_em', 'download', 'funcoes')
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/', self.admin_site.admin_view(self.baixar), name='api_perfilrequisicao_download'),
+            *super().get_urls(),
+        ]
+
+    def baixar(self, request, pk):
+        registro = get_object_or_404(PerfilRequisicao, pk=pk)
+        resposta = HttpResponse(arquivo_prof(registro.perfil), content_type='application/octet-stream')
+        resposta['Content-Disposition'] = f'attachment; filename="perfil-{pk}.prof"'
+        return resposta
+
+    @admin.display(description='Arquivo')
+    def download(self, obj):
+        return format_html('<a href="{}">perfil-{}.prof</a>', reverse('admin:api_perfilrequisicao_download', args=[obj.pk]), obj.pk)
+
+    @admin.display(description='Maiores tempos acumulados')
+    def funcoes(self, obj):
+        linhas = format_html_join(
+            '', '<tr><td style="text-align:right">{}</td><td style="text-align:right">{}</td>'
+                '<td style="text-align:right">{}</td><td><code>{}</code></td></tr>',
+            ((f"{acumulado:.1f}", f"{proprio:.1f}", chamadas, funcao)
+             for acumulado, proprio, chamadas, funcao in top_funcoes(bytes(obj.perfil))),
+        )
+        return format_html(
+            '<table><thead><tr><th>acumulado ms</th><th>próprio ms</th><th>chamadas</th><th>função</th></tr></thead>'
+            '<tbody>{}</tbody></table>', linhas,
+        )
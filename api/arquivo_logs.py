@@ -0,0 +1,135 @@
+"""
+Arquivo frio do log de auditoria.
+
+`arquivar()` tira da tabela `Log` as linhas antigas, em lotes, e as grava em
+arquivos JSONL comprimidos por mês (`logs-AAAA-MM.jsonl.gz` em
+settings.LOG_ARQUIVO_DIR). Cada lote vira um membro gzip novo no fim do arquivo
+do mês (gzip aceita membros concatenados), então rodar de novo só acrescenta.
+
+Cada linha já está no formato do LogSerializer (mais `usuario_id`, usado para
+aplicar a mesma visibilidade por cargo do LogViewSet).
+"""
+import gzip
+import json
+import os
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.fields import DateTimeField
+
+from .models import Log
+
+_data_hora = DateTimeField()
+
+CAMPOS = ["id", "usuario_id", "usuario__email", "acao", "projeto__nome_do_projeto", "motivo", "data_hora"]
+
+
+def _diretorio(diretorio=None):
+    return Path(diretorio or settings.LOG_ARQUIVO_DIR)
+
+
+def _registro(linha):
+    return {
+        "id": linha["id"],
+        "usuario_id": linha["usuario_id"],
+        "usuario_email": linha["usuario__email"],
+        "acao": linha["acao"],
+        "projeto_nome": linha["projeto__nome_do_projeto"],
+        "motivo": linha["motivo"],
+        "data_hora": _data_hora.to_representation(linha["data_hora"]),
+    }
+
+
+def arquivar(antes_de, lote=1000, diretorio=None):
+    """
+    Move os logs com data_hora < `antes_de` para os arquivos mensais.
+    Cada lote é gravado (e sincronizado no disco) antes de ser apagado, na
+    mesma transação; se o processo cair entre os dois, o lote é regravado na
+    próxima execução e a leitura descarta o id repetido.
+    Retorna {"AAAA-MM": quantidade}.
+    """
+    pasta = _diretorio(diretorio)
+    pasta.mkdir(parents=True, exist_ok=True)
+    por_mes = {}
+
+    while True:
+        with transaction.atomic():
+            linhas = list(Log.objects.filter(data_hora__lt=antes_de)
+                          .order_by("id")
+                          .values(*CAMPOS)[:lote])
+            if not linhas:
+                break
+
+            meses = {}
+            for linha in linhas:
+                mes = timezone.localtime(linha["data_hora"]).strftime("%Y-%m")
+                meses.setdefault(mes, []).append(_registro(linha))
+
+            for mes, registros in meses.items():
+                with open(pasta / f"logs-{mes}.jsonl.gz", "ab") as bruto:
+                    with gzip.GzipFile(fileobj=bruto, mode="wb") as gz:
+                        for r in registros:
+                            gz.write(json.dumps(r, ensure_ascii=False).encode() + b"\n")
+                    bruto.flush()
+                    os.fsync(bruto.fileno())
+                por_mes[mes] = por_mes.get(mes, 0) + len(registros)
+
+            Log.objects.filter(id__in=[l["id"] for l in linhas]).delete()
+
+    return por_mes
+
+
+def _ler_mes(caminho, usuarios):
+    """Um mês, do mais novo ao mais antigo, sem ids repetidos e só com os `usuarios` visíveis."""
+    vistos, registros = set(), []
+    with gzip.open(caminho, "rt", encoding="utf-8") as f:
+        for texto in f:
+            r = json.loads(texto)
+            if r["id"] in vistos:
+                continue
+            vistos.add(r["id"])
+            if usuarios is None or r["usuario_id"] in usuarios:
+                registros.append(r)
+    registros.sort(key=lambda r: (datetime.fromisoformat(r["data_hora"]), r["id"]), reverse=True)
+    return [{k: v for k, v in r.items() if k != "usuario_id"} for r in registros]
+
+
+def ler_arquivados(usuarios=None, diretorio=None):
+    """
+    Logs arquivados do mais novo para o mais antigo, sob demanda: um mês só é
+    descomprimido quando o anterior acabou, então quem para no fim da página
+    não lê os meses mais velhos. `usuarios`: ids visíveis (None = todos).
+    Gera dicts no formato do LogSerializer.
+    """
+    pasta = _diretorio(diretorio)
+    if not pasta.is_dir():
+        return
+    usuarios = None if usuarios is None else set(usuarios)
+    for caminho in sorted(pasta.glob("logs-*.jsonl.gz"), reverse=True):
+        yield from _ler_mes(caminho, usuarios)
+
+
+class LogsComArquivo:
+    """
+    Sequência "tabela quente + arquivo": os logs arquivados são sempre mais
+    antigos que os da tabela, então vêm depois. `fatia()` só consulta o trecho
+    da tabela que precisa e só lê do arquivo até o fim do trecho; não há total
+    (contar obrigaria a descomprimir todos os meses).
+    """
+
+    def __init__(self, queryset, arquivados):
+        self.queryset = queryset
+        self.arquivados = arquivados
+
+    def fatia(self, inicio, fim):
+        itens = list(self.queryset[inicio:fim])
+        if len(itens) == fim - inicio:
+            return itens
+        # a tabela acabou no meio (ou antes) do trecho
+        quente = inicio + len(itens) if itens else self.queryset.count()
+        pular = max(inicio - quente, 0)
+        return itens + list(islice(self.arquivados, pular, pular + fim - inicio - len(itens)))
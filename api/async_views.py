@@ -0,0 +1,132 @@
+"""
+Versões assíncronas (ASGI) dos endpoints de estatística do dashboard.
+
+O DRF não tem views async, então aqui são views Django puras: a autenticação
+JWT é a mesma do DRF (rodada via sync_to_async) e a resposta sai pelo mesmo
+renderer, com os mesmos bytes das versões síncronas.
+"""
+import asyncio
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import exceptions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .eventos import broker
+from .models import Projeto
+from .renderers import StreamingJSONRenderer
+from .views import AGREGADOS_DASHBOARD, montar_stats_mensais, stats_mensais_qs
+
+_jwt = JWTAuthentication()
+_renderer = StreamingJSONRenderer()
+
+
+def _json(data, status=200, headers=None):
+    return HttpResponse(_renderer.render(data), status=status, content_type=_renderer.media_type, headers=headers)
+
+
+def requer_autenticacao(view):
+    """Equivalente async de @permission_classes([IsAuthenticated]) com JWT."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        cabecalhos = {"WWW-Authenticate": _jwt.authenticate_header(request)}
+        try:
+            resultado = await sync_to_async(_jwt.authenticate)(request)
+        except exceptions.AuthenticationFailed as exc:
+            detalhe = exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail}
+            return _json(detalhe, status=401, headers=cabecalhos)
+        if resultado is None:
+            return _json({"detail": exceptions.NotAuthenticated.default_detail}, status=401, headers=cabecalhos)
+        request.user = resultado[0]
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def _contagens():
+    return await Projeto.objects.aaggregate(**AGREGADOS_DASHBOARD)
+
+
+async def _mensais():
+    return montar_stats_mensais([r async for r in stats_mensais_qs()])
+
+
+@require_GET
+@requer_autenticacao
+async def dashboard_stats(request):
+    return _json(await _contagens())
+
+
+@require_GET
+@requer_autenticacao
+async def stats_mensais(request):
+    return _json(await _mensais())
+
+
+@require_GET
+@requer_autenticacao
+async def painel(request):
+    """Contagens + série mensal numa chamada só; as duas consultas são disparadas juntas."""
+    contagens, mensais = await asyncio.gather(_contagens(), _mensais())
+    return _json({"contagens": contagens, "mensais": mensais})
+
+
+# ---------------- EVENTOS (SSE) ----------------
+
+def token_na_url(view):
+    """EventSource do navegador não envia cabeçalhos: aceita ?token= como Bearer."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        token = request.GET.get("token")
+        if token and "HTTP_AUTHORIZATION" not in request.META:
+            request.META["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def _sse(evento):
+    return f"id: {evento['id']}\nevent: status\ndata: {json.dumps(evento, ensure_ascii=False)}\n\n"
+
+
+@require_GET
+@token_na_url
+@requer_autenticacao
+async def eventos_projeto(request, projeto_id):
+    """
+    GET /api/projetos/<id>/eventos/ (text/event-stream, só em ASGI).
+    Envia um evento "status" a cada aprovação/reprovação do projeto ou dos
+    seus materiais. Reconectando com Last-Event-ID, recebe o que perdeu; se
+    o histórico não cobre mais esse id, recebe "reset" (use /alteracoes/).
+    """
+    if not await Projeto.objects.filter(pk=projeto_id).aexists():
+        return _json({"detail": "Não encontrado."}, status=404)
+
+    ultimo = request.headers.get("Last-Event-ID") or request.GET.get("ultimo")
+    ultimo = int(ultimo) if ultimo and ultimo.isdigit() else None
+    fila, pendentes, perdeu = await broker().assinar(projeto_id, ultimo)
+
+    async def fluxo():
+        try:
+            yield "retry: 3000\n\n"
+            if perdeu:
+                yield "event: reset\ndata: {}\n\n"
+            for evento in pendentes:
+                yield _sse(evento)
+            while True:
+                try:
+                    evento = await asyncio.wait_for(fila.get(), timeout=settings.EVENTOS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"  # mantém proxies e o navegador com a conexão aberta
+                    continue
+                yield _sse(evento)
+        finally:
+            # cliente desconectou (o Django cancela o gerador) ou o servidor está parando
+            broker().cancelar(fila)
+
+    resposta = StreamingHttpResponse(fluxo(), content_type="text/event-stream")
+    resposta["Cache-Control"] = "no-cache"
+    resposta["X-Accel-Buffering"] = "no"  # nginx: não segurar os eventos no buffer
+    return resposta
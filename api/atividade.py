@@ -0,0 +1,218 @@
+"""
+Atividade dos revisores (`/api/stats/atividade/`), servida do resumo diário
+`AtividadeDiaria` em vez de varrer Log e MaterialSpec a cada consulta.
+
+- `registrar(log)`: chamado no post_save de Log (mesma transação da view);
+- `recalcular(inicio, fim)`: refaz os dias do intervalo a partir dos logs
+  (`manage.py recalcular_atividade`). Logs já arquivados não voltam: o resumo
+  deles só existe se foi montado antes do `archive_logs`;
+- `resumo(inicio, fim)`: contagens e mediana por usuário e por projeto;
+- `soltar(ids)`: linhas de um projeto sendo apagado passam para a linha sem
+  projeto do mesmo dia e usuário (exclusao_projetos).
+
+Tempo até a decisão: da criação do projeto até o log de APROVACAO/REPROVACAO
+(de item ou do projeto). Guardado como histograma por faixas, que soma entre
+dias; a mediana é interpolada dentro da faixa em que cai.
+"""
+from datetime import datetime, time as hora
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import AtividadeDiaria, Log, Projeto
+
+CAMPO_POR_ACAO = {"APROVACAO": "aprovacoes", "REPROVACAO": "reprovacoes", "EDICAO": "edicoes"}
+DECISOES = ("APROVACAO", "REPROVACAO")
+
+# limites superiores das faixas, em segundos: 15 min ... 60 dias
+FAIXAS_DECISAO_S = (
+    900, 3600, 3 * 3600, 6 * 3600, 12 * 3600,
+    86400, 2 * 86400, 3 * 86400, 5 * 86400, 7 * 86400, 14 * 86400, 30 * 86400, 60 * 86400,
+)
+
+
+def faixa(segundos):
+    return next((i for i, limite in enumerate(FAIXAS_DECISAO_S) if segundos <= limite), len(FAIXAS_DECISAO_S))
+
+
+def somar_faixas(a, b):
+    if len(a) < len(b):
+        a, b = b, a
+    return [x + (b[i] if i < len(b) else 0) for i, x in enumerate(a)]
+
+
+def mediana_faixas(contagens):
+    """Mediana (segundos) de um histograma em FAIXAS_DECISAO_S, ou None sem decisões."""
+    total = sum(contagens)
+    if not total:
+        return None
+    metade, acumulado = total / 2, 0
+    for i, qtd in enumerate(contagens):
+        if qtd and acumulado + qtd >= metade:
+            inicio = FAIXAS_DECISAO_S[i - 1] if i else 0
+            if i >= len(FAIXAS_DECISAO_S):
+                return float(inicio)  # acima da última faixa: o limite é o que se sabe
+            return inicio + (FAIXAS_DECISAO_S[i] - inicio) * (metade - acumulado) / qtd
+        acumulado += qtd
+    return None
+
+
+def _contar(linha, acao, segundos):
+    campo = CAMPO_POR_ACAO[acao]
+    setattr(linha, campo, getattr(linha, campo) + 1)
+    if segundos is not None:
+        faixas = list(linha.decisoes_por_faixa) or [0] * (len(FAIXAS_DECISAO_S) + 1)
+        faixas[faixa(segundos)] += 1
+        linha.decisoes_por_faixa = faixas
+
+
+def _segundos(acao, data_hora, projeto_criado_em):
+    if acao not in DECISOES or projeto_criado_em is None:
+        return None
+    return max((data_hora - projeto_criado_em).total_seconds(), 0)
+
+
+def _criar(chave, log):
+    """Primeira linha do dia para (usuário, projeto); se outra requisição criou junto, usa a dela."""
+    criado_em = None
+    if log.acao in DECISOES and log.projeto_id:
+        criado_em = Projeto.todos.filter(pk=log.projeto_id).values_list("data_criacao", flat=True).first()
+    linha = AtividadeDiaria(**chave)
+    _contar(linha, log.acao, _segundos(log.acao, log.data_hora, criado_em))
+    try:
+        with transaction.atomic():
+            linha.save(force_insert=True)
+        return True
+    except IntegrityError:
+        return False
+
+
+def registrar(log):
+    if log.acao not in CAMPO_POR_ACAO or log.usuario_id is None:
+        return
+    chave = {"dia": timezone.localdate(log.data_hora), "usuario_id": log.usuario_id, "projeto_id": log.projeto_id}
+    # sem savepoint: dentro da view isto é só mais um SELECT ... FOR UPDATE e um UPDATE
+    with transaction.atomic(savepoint=False):
+        while True:
+            # o select_related traz a criação do projeto junto; a linha do projeto
+            # já está travada pelas views de aprovação (contadores)
+            linha = (AtividadeDiaria.objects.select_for_update().select_related("projeto")
+                     .only(*CAMPO_POR_ACAO.values(), "decisoes_por_faixa", "projeto__data_criacao")
+                     .filter(**chave).first())
+            if linha is None:
+                if _criar(chave, log):
+                    return
+                continue
+            criado_em = linha.projeto.data_criacao if log.projeto_id else None
+            _contar(linha, log.acao, _segundos(log.acao, log.data_hora, criado_em))
+            linha.save(update_fields=[CAMPO_POR_ACAO[log.acao], "decisoes_por_faixa"])
+            return
+
+
+def soltar(ids):
+    """Junta as linhas `ids` na linha sem projeto do mesmo (dia, usuário), criando-a se preciso."""
+    campos = [*CAMPO_POR_ACAO.values(), "decisoes_por_faixa"]
+    for linha in AtividadeDiaria.objects.select_for_update().filter(pk__in=ids).order_by("dia", "usuario_id"):
+        while True:
+            destino = AtividadeDiaria.objects.select_for_update().filter(
+                dia=linha.dia, usuario_id=linha.usuario_id, projeto__isnull=True).first()
+            if destino is not None:
+                for campo in CAMPO_POR_ACAO.values():
+                    setattr(destino, campo, getattr(destino, campo) + getattr(linha, campo))
+                destino.decisoes_por_faixa = somar_faixas(destino.decisoes_por_faixa, linha.decisoes_por_faixa)
+                destino.save(update_fields=campos)
+                linha.delete()
+                break
+            try:
+                with transaction.atomic():
+                    AtividadeDiaria.objects.filter(pk=linha.pk).update(projeto=None)
+                break
+            except IntegrityError:
+                continue  # um registrar() criou a linha sem projeto agora: junta nela
+
+
+def _limites(inicio, fim):
+    """Instantes (no fuso do projeto) que cobrem os dias de `inicio` a `fim`, inclusive."""
+    fuso = timezone.get_current_timezone()
+    return (datetime.combine(inicio, hora.min, tzinfo=fuso) if inicio else None,
+            datetime.combine(fim, hora.max, tzinfo=fuso) if fim else None)
+
+
+def recalcular(inicio=None, fim=None):
+    """Refaz o resumo dos dias entre `inicio` e `fim` (None = sem limite). Retorna quantas linhas gravou."""
+    logs = Log.objects.filter(acao__in=list(CAMPO_POR_ACAO), usuario__isnull=False)
+    existentes = AtividadeDiaria.objects.all()
+    desde, ate = _limites(inicio, fim)
+    if desde:
+        logs, existentes = logs.filter(data_hora__gte=desde), existentes.filter(dia__gte=inicio)
+    if ate:
+        logs, existentes = logs.filter(data_hora__lte=ate), existentes.filter(dia__lte=fim)
+
+    linhas = {}
+    colunas = ("usuario_id", "projeto_id", "acao", "data_hora", "projeto__data_criacao")
+    for usuario_id, projeto_id, acao, data_hora, criado_em in logs.values_list(*colunas).iterator(chunk_size=2000):
+        chave = (timezone.localdate(data_hora), usuario_id, projeto_id)
+        linha = linhas.get(chave)
+        if linha is None:
+            linha = linhas[chave] = AtividadeDiaria(dia=chave[0], usuario_id=usuario_id, projeto_id=projeto_id)
+        _contar(linha, acao, _segundos(acao, data_hora, criado_em))
+
+    with transaction.atomic():
+        existentes.delete()
+        AtividadeDiaria.objects.bulk_create(linhas.values(), batch_size=500)
+    return len(linhas)
+
+
+def _total(grupos, chave, nome, linha):
+    g = grupos.get(chave)
+    if g is None:
+        g = grupos[chave] = {"nome": nome, "aprovacoes": 0, "reprovacoes": 0, "edicoes": 0, "faixas": []}
+    for campo in ("aprovacoes", "reprovacoes", "edicoes"):
+        g[campo] += linha[campo]
+    g["faixas"] = somar_faixas(g["faixas"], linha["decisoes_por_faixa"])
+
+
+def _saida(grupos, campo_id, campo_nome):
+    saida = []
+    for chave, g in grupos.items():
+        mediana = mediana_faixas(g["faixas"])
+        saida.append({
+            campo_id: chave,
+            campo_nome: g["nome"],
+            "aprovacoes": g["aprovacoes"],
+            "reprovacoes": g["reprovacoes"],
+            "edicoes": g["edicoes"],
+            "decisoes": sum(g["faixas"]),
+            "mediana_decisao_horas": None if mediana is None else round(mediana / 3600, 2),
+        })
+    saida.sort(key=lambda g: -(g["aprovacoes"] + g["reprovacoes"]))
+    return saida
+
+
+def resumo(inicio, fim, usuario_id=None, projeto_id=None):
+    """
+    Contagens e mediana do tempo até a decisão por usuário e por projeto, numa consulta ao resumo.
+
+    A mediana é aproximada duas vezes: o tempo conta da criação do projeto (o
+    log não diz quando o item voltou a PENDENTE, nem qual item era), e o valor
+    é interpolado dentro da faixa de FAIXAS_DECISAO_S em que cai.
+    """
+    linhas = AtividadeDiaria.objects.filter(dia__gte=inicio, dia__lte=fim, usuario__isnull=False)
+    if usuario_id:
+        linhas = linhas.filter(usuario_id=usuario_id)
+    if projeto_id:
+        linhas = linhas.filter(projeto_id=projeto_id)
+
+    por_usuario, por_projeto = {}, {}
+    for linha in linhas.values("usuario_id", "usuario__email", "projeto_id", "projeto__nome_do_projeto",
+                               "aprovacoes", "reprovacoes", "edicoes", "decisoes_por_faixa"):
+        _total(por_usuario, linha["usuario_id"], linha["usuario__email"], linha)
+        if linha["projeto_id"]:
+            _total(por_projeto, linha["projeto_id"], linha["projeto__nome_do_projeto"], linha)
+
+    return {
+        "inicio": inicio.isoformat(),
+        "fim": fim.isoformat(),
+        "usuarios": _saida(por_usuario, "usuario", "email"),
+        "projetos": _saida(por_projeto, "projeto", "nome"),
+    }
@@ -0,0 +1,210 @@
+"""
+Índice de prefixos em memória para o autocomplete (`/api/autocomplete/`).
+
+Cada tipo (marca, tipo de ambiente, ambiente, item de material) é uma lista
+ordenada de (chave sem acento e minúscula, nome, id); a busca é um bisect até
+o primeiro nome com o prefixo, seguido de uma varredura curta, sem ir ao banco.
+
+O índice é por processo: é montado na primeira consulta (ou no `when_ready`
+do gunicorn, antes do fork) e mantido pelos signals de save/delete deste
+processo. O que os outros workers gravam, ou o que passa por fora dos signals
+(bulk_create, QuerySet.update), aparece na reconstrução seguinte, feita a cada
+AUTOCOMPLETE_RECONSTRUIR_S segundos numa thread: a consulta que encontra o
+índice vencido responde com ele mesmo e o novo entra inteiro, de uma vez, quando
+fica pronto. Só a primeira montagem do processo faz a requisição esperar.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import connection
+
+from . import metricas
+from .models import Ambiente, Marca, MaterialSpec, TipoAmbiente
+from .serializers import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+
+class IndicePrefixos:
+    """
+    `distintos=False`: uma entrada por objeto (com o id).
+    `distintos=True`: uma entrada por nome, enquanto algum objeto o usar
+    (itens de material se repetem em todo projeto; o id não faz sentido).
+    """
+
+    def __init__(self, distintos=False):
+        self.distintos = distintos
+        self._entradas = []   # [(chave, nome, id)] ordenada; trocada inteira a cada escrita
+        self._nomes = {}      # pk -> nome
+        self._usos = {}       # nome -> quantos objetos (só distintos)
+        self._lock = threading.Lock()
+
+    def _entrada(self, pk, nome):
+        return (normalizar_texto(nome), nome, None if self.distintos else pk)
+
+    def carregar(self, pares):
+        """Monta tudo de uma vez a partir de [(pk, nome)]."""
+        nomes, usos = {}, {}
+        for pk, nome in pares:
+            if nome:
+                nomes[pk] = nome
+                usos[nome] = usos.get(nome, 0) + 1
+        if self.distintos:
+            entradas = sorted(self._entrada(None, nome) for nome in usos)
+        else:
+            entradas = sorted(self._entrada(pk, nome) for pk, nome in nomes.items())
+        with self._lock:
+            self._entradas, self._nomes, self._usos = entradas, nomes, usos
+
+    def _soltar(self, entradas, pk):
+        nome = self._nomes.pop(pk, None)
+        if nome is None:
+            return
+        if self.distintos:
+            self._usos[nome] -= 1
+            if self._usos[nome] > 0:
+                return
+            del self._usos[nome]
+        entrada = self._entrada(pk, nome)
+        i = bisect_left(entradas, entrada)
+        if i < len(entradas) and entradas[i] == entrada:
+            del entradas[i]
+
+    def salvar(self, pk, nome):
+        with self._lock:
+            if self._nomes.get(pk) == nome:
+                return
+            # cópia: quem está lendo continua com a lista antiga, sem trava
+            entradas = list(self._entradas)
+            self._soltar(entradas, pk)
+            if nome:
+                self._nomes[pk] = nome
+                if self.distintos:
+                    self._usos[nome] = self._usos.get(nome, 0) + 1
+                if not self.distintos or self._usos[nome] == 1:
+                    insort(entradas, self._entrada(pk, nome))
+            self._entradas = entradas
+
+    def remover(self, pk):
+        with self._lock:
+            if pk not in self._nomes:
+                return
+            entradas = list(self._entradas)
+            self._soltar(entradas, pk)
+            self._entradas = entradas
+
+    def buscar(self, prefixo, limite=10):
+        entradas = self._entradas
+        chave = normalizar_texto(prefixo)
+        resultado = []
+        for i in range(bisect_left(entradas, (chave,)), len(entradas)):
+            if len(resultado) >= limite or not entradas[i][0].startswith(chave):
+                break
+            _, nome, pk = entradas[i]
+            resultado.append({"nome": nome} if pk is None else {"id": pk, "nome": nome})
+        return resultado
+
+
+# tipo da URL -> (modelo, campo do nome, distintos)
+FONTES = {
+    "marca": (Marca, "nome", False),
+    "tipo_ambiente": (TipoAmbiente, "nome", False),
+    "ambiente": (Ambiente, "nome_do_ambiente", False),
+    "item": (MaterialSpec, "item", True),
+}
+
+_indices = {}
+_montado_em = None
+_lock_montagem = threading.Lock()  # uma montagem por vez
+_lock_troca = threading.Lock()     # _indices, _pendentes e _reconstruindo
+_pendentes = None                  # durante a montagem: o que os signals mudaram, para reaplicar
+_reconstruindo = False
+
+
+def _aplicar(indices, tipo, pk, nome, removido):
+    if removido:
+        indices[tipo].remover(pk)
+    else:
+        indices[tipo].salvar(pk, nome)
+
+
+def _montar():
+    global _indices, _montado_em, _pendentes
+    with _lock_troca:
+        _pendentes = []
+    try:
+        novos = {}
+        for tipo, (modelo, campo, distintos) in FONTES.items():
+            novos[tipo] = IndicePrefixos(distintos)
+            novos[tipo].carregar(modelo.objects.order_by().values_list("pk", campo).iterator(chunk_size=5000))
+        with _lock_troca:
+            # commits que chegaram enquanto o banco era lido podem ter ficado de fora da leitura
+            for alteracao in _pendentes:
+                _aplicar(novos, *alteracao)
+            _indices, _montado_em = novos, time.monotonic()
+    finally:
+        with _lock_troca:
+            _pendentes = None
+
+
+def montar():
+    """(Re)constrói todos os índices a partir do banco e troca os antigos de uma vez."""
+    with _lock_montagem:
+        _montar()
+
+
+def _reconstruir():
+    global _reconstruindo
+    try:
+        montar()
+    except Exception:
+        logger.exception("Falha ao reconstruir o autocomplete; segue o índice anterior")
+    finally:
+        with _lock_troca:
+            _reconstruindo = False
+
+
+def _reconstruir_na_thread():
+    try:
+        _reconstruir()
+    finally:
+        connection.close()  # a conexão é desta thread
+
+
+def indice(tipo):
+    montado_em = _montado_em
+    valido = montado_em is not None and time.monotonic() - montado_em <= settings.AUTOCOMPLETE_RECONSTRUIR_S
+    metricas.cache_acerto("autocomplete", valido)
+    if montado_em is None:
+        # sem índice não há o que responder: quem chegar junto espera a mesma montagem
+        with _lock_montagem:
+            if _montado_em is None:
+                _montar()
+    elif not valido:
+        global _reconstruindo
+        with _lock_troca:
+            disparar, _reconstruindo = not _reconstruindo, True
+        if disparar:
+            threading.Thread(target=_reconstruir_na_thread, name="autocomplete", daemon=True).start()
+    return _indices[tipo]
+
+
+def atualizar(tipo, pk, nome=None, removido=False):
+    """Chamado pelos signals (depois do commit). Antes da primeira montagem não há o que atualizar."""
+    with _lock_troca:
+        if _pendentes is not None:
+            _pendentes.append((tipo, pk, nome, removido))
+        if _montado_em is None:
+            return
+        indices = _indices
+    _aplicar(indices, tipo, pk, nome, removido)
+
+
+def descartar():
+    """Esquece os índices (testes); a próxima consulta remonta."""
+    global _indices, _montado_em, _reconstruindo
+    with _lock_troca:
+        _indices, _montado_em, _reconstruindo = {}, None, False
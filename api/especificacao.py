@@ -0,0 +1,301 @@
+"""
+Geração do PDF de especificação técnica.
+
+A leitura do banco (`dados_especificacao`) é separada da renderização
+(`renderizar_especificacao`): os dados viram dicts/tuplas simples, que podem
+ser enviados para outros processos. Assim o lote de especificações renderiza
+vários PDFs em paralelo num ProcessPoolExecutor (um por processo, ver `pool()`),
+sem tocar no banco nos workers.
+"""
+import io
+import multiprocessing
+import os
+import threading
+import time
+import zipfile
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing
+from functools import lru_cache
+from itertools import islice
+
+import django
+from django.conf import settings
+
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.enums import TA_LEFT
+from reportlab.lib import colors
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from . import metricas
+from .models import Projeto, MaterialSpec, DescricaoMarca
+
+# áreas que entram no documento, na ordem em que aparecem
+AREAS = [("PRIVATIVA", "ÁREA PRIVATIVA"), ("COMUM", "ÁREA COMUM")]
+
+
+# ---------------- DADOS ----------------
+
+def dados_especificacao(projeto_ids):
+    """
+    Tudo que os PDFs dos projetos precisam, em 4 consultas (independe da
+    quantidade de projetos). Retorna uma lista de dicts na ordem de `projeto_ids`;
+    ids inexistentes são ignorados.
+    """
+    projetos = {p.id: p for p in Projeto.objects.filter(id__in=projeto_ids).only("id", "nome_do_projeto", "descricao")}
+
+    ambientes = defaultdict(list)  # projeto_id -> [(ambiente_id, nome, categoria)]
+    vinculos = (Projeto.ambientes.through.objects
+                .filter(projeto_id__in=projetos, ambiente__categoria__in=[c for c, _ in AREAS])
+                .order_by("ambiente__nome_do_ambiente", "ambiente_id")
+                .values_list("projeto_id", "ambiente_id", "ambiente__nome_do_ambiente", "ambiente__categoria"))
+    for pid, aid, nome, categoria in vinculos:
+        ambientes[pid].append((aid, nome, categoria))
+
+    materiais = defaultdict(list)  # (projeto_id, ambiente_id) -> [(item, descricao)]
+    linhas = (MaterialSpec.objects.filter(projeto_id__in=projetos)
+              .order_by("item")
+              .values_list("projeto_id", "ambiente_id", "item", "descricao"))
+    for pid, aid, item, descricao in linhas:
+        materiais[(pid, aid)].append((item, descricao))
+
+    marcas = list(DescricaoMarca.objects.order_by("material").values_list("material", "marcas"))
+
+    dados = []
+    for pid in dict.fromkeys(projeto_ids):
+        projeto = projetos.get(pid)
+        if projeto is None:
+            continue
+        dados.append({
+            "id": pid,
+            "nome": projeto.nome_do_projeto,
+            "descricao": projeto.descricao,
+            "ambientes": [
+                {"nome": nome, "categoria": categoria, "materiais": materiais.get((pid, aid), [])}
+                for aid, nome, categoria in ambientes[pid]
+            ],
+            "marcas": marcas,
+        })
+    return dados
+
+
+def nome_arquivo(dados):
+    return f"{dados['nome']}_especificacao.pdf"
+
+
+# ---------------- RENDERIZAÇÃO ----------------
+
+# linhas por tabela: tabelas enormes ficam caras de quebrar entre páginas
+LINHAS_POR_TABELA = 200
+PADDING_CELULA = 12  # LEFTPADDING + RIGHTPADDING padrão do reportlab
+
+
+@lru_cache(maxsize=None)
+def _estilos():
+    """Estilos criados uma vez por processo (antes eram refeitos a cada PDF/tabela)."""
+    styles = getSampleStyleSheet()
+    celula = ParagraphStyle(
+        'cell_style',
+        fontSize=10,
+        leading=12,
+        alignment=TA_LEFT
+    )
+    tabela = TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
+        ('GRID', (0,0), (-1,-1), 0.7, colors.black),
+        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0,0), (-1,-1), celula.fontSize),
+        ('LEADING', (0,0), (-1,-1), celula.leading),
+        ('VALIGN', (0,0), (-1,-1), 'TOP')
+    ])
+    return styles, celula, tabela
+
+
+def _celula(texto, largura):
+    """
+    Texto que cabe numa linha vai como string simples (o Table só desenha);
+    o resto vira Paragraph, que quebra linha mas custa bem mais para diagramar.
+    """
+    _, celula, _ = _estilos()
+    texto = str(texto)
+    if "\n" not in texto and stringWidth(texto, celula.fontName, celula.fontSize) <= largura - PADDING_CELULA:
+        return texto
+    return Paragraph(texto.replace("\n", "<br/>"), celula)
+
+
+def _tabelas(cabecalho, linhas, larguras):
+    """Uma ou mais tabelas de até LINHAS_POR_TABELA linhas, com o cabeçalho repetido a cada página."""
+    _, _, estilo = _estilos()
+    linhas = [[_celula(v, w) for v, w in zip(linha, larguras)] for linha in linhas]
+    for inicio in range(0, max(len(linhas), 1), LINHAS_POR_TABELA):
+        tabela = Table([cabecalho, *linhas[inicio:inicio + LINHAS_POR_TABELA]], colWidths=larguras, repeatRows=1)
+        tabela.setStyle(estilo)
+        yield tabela
+
+
+def renderizar_especificacao(dados, destino=None):
+    """
+    Monta o PDF a partir do dict de `dados_especificacao`. Escreve em `destino`
+    (arquivo/HttpResponse) ou devolve os bytes. Função de módulo, sem acesso ao
+    banco, para poder rodar num processo do pool.
+    """
+    pdf, segundos = _renderizar_medindo(dados, destino)
+    metricas.observar("pdf_renderizacao_segundos", segundos)
+    return pdf
+
+
+def _renderizar_medindo(dados, destino=None):
+    # no pool a métrica é registrada no processo pai, que é quem publica em /metrics
+    inicio = time.perf_counter()
+    return _renderizar(dados, destino), time.perf_counter() - inicio
+
+
+def _renderizar(dados, destino):
+    saida = destino if destino is not None else io.BytesIO()
+
+    doc = SimpleDocTemplate(saida, pagesize=A4)
+    styles, _, _ = _estilos()
+    story = []
+
+    # --------- CABEÇALHO ---------
+    story.append(Paragraph("<b>ESPECIFICAÇÃO TÉCNICA</b>", styles['Title']))
+    story.append(Spacer(1, 20))
+
+    story.append(Paragraph(f"<b>Projeto:</b> {dados['nome']}", styles['Normal']))
+    story.append(Paragraph(f"<b>Observações:</b> {dados['descricao'] or '-'}", styles['Normal']))
+    story.append(Spacer(1, 20))
+
+    # --------- ÁREA PRIVATIVA / ÁREA COMUM ---------
+    for categoria, titulo in AREAS:
+        story.append(Paragraph(f"<b>{titulo}</b>", styles['Heading2']))
+
+        for amb in dados["ambientes"]:
+            if amb["categoria"] != categoria:
+                continue
+            story.append(Paragraph(f"<b>{amb['nome']}</b>", styles['Heading3']))
+            linhas = [(item, descricao or "-") for item, descricao in amb["materiais"]]
+            story.extend(_tabelas(["Item", "Descrição"], linhas, [120, 330]))
+            story.append(Spacer(1, 15))
+
+    # --------- MARCAS ---------
+    story.append(Paragraph("<b>DESCRIÇÃO DAS MARCAS</b>", styles['Heading2']))
+    story.extend(_tabelas(["Material", "Marcas"], dados["marcas"], [150, 300]))
+
+    # FINALIZAR PDF
+    doc.build(story)
+    if destino is None:
+        return saida.getvalue()
+    return destino
+
+
+# ---------------- LOTE (ZIP) ----------------
+
+class _SaidaZip:
+    """Arquivo "só escrita" para o ZipFile: acumula bytes até alguém drenar."""
+
+    def __init__(self):
+        self.pedacos = []
+
+    def write(self, dados):
+        self.pedacos.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def drenar(self):
+        dados = b"".join(self.pedacos)
+        self.pedacos = []
+        return dados
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def pool():
+    """
+    Pool de renderização do processo, criado na primeira vez que é usado (depois
+    do fork do gunicorn) e reaproveitado pelas requisições seguintes. Os
+    processos nascem por forkserver/spawn: um fork de um worker com várias
+    threads herdaria locks travados por outras threads.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            metodo = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.ESPECIFICACAO_WORKERS or os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context(metodo),
+                initializer=django.setup,  # os processos novos não têm o Django carregado
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _descartar_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def renderizar_varios(lista_dados, workers=None):
+    """
+    Gera (dados, pdf) na ordem da lista. Com mais de um worker os PDFs são
+    renderizados no pool do processo, com no máximo `workers` deles na fila ao
+    mesmo tempo; cada um é devolvido assim que fica pronto. Se o gerador for
+    fechado antes do fim (cliente desconectou), o que ainda não começou é cancelado.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(lista_dados))
+    if workers <= 1:
+        for dados in lista_dados:
+            yield dados, renderizar_especificacao(dados)
+        return
+
+    executor = pool()
+    pendentes = deque()
+    proximos = iter(lista_dados)
+    try:
+        for dados in islice(proximos, workers):
+            pendentes.append((dados, executor.submit(_renderizar_medindo, dados)))
+        while pendentes:
+            dados, futuro = pendentes.popleft()
+            try:
+                pdf, segundos = futuro.result()
+            except BrokenProcessPool:
+                _descartar_pool()  # um processo morreu: a próxima requisição cria outro pool
+                raise
+            for seguinte in islice(proximos, 1):
+                pendentes.append((seguinte, executor.submit(_renderizar_medindo, seguinte)))
+            metricas.observar("pdf_renderizacao_segundos", segundos)
+            yield dados, pdf
+    finally:
+        for _, futuro in pendentes:
+            futuro.cancel()
+
+
+def zip_especificacoes(lista_dados, workers=None):
+    """
+    ZIP com um PDF por projeto, gerado em pedaços (um por PDF) para uma
+    StreamingHttpResponse ou para ser gravado em disco.
+    """
+    saida = _SaidaZip()
+    usados = set()
+    with zipfile.ZipFile(saida, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        # closing: se o cliente desconectar, o gerador dos PDFs é fechado na hora (e cancela a fila)
+        with closing(renderizar_varios(lista_dados, workers)) as pdfs:
+            for dados, pdf in pdfs:
+                nome = nome_arquivo(dados).replace("/", "-")
+                if nome in usados:
+                    nome = f"{dados['id']}_{nome}"
+                usados.add(nome)
+                zf.writestr(nome, pdf)
+                yield saida.drenar()
+    # diretório central do ZIP, escrito no close()
+    yield saida.drenar()
@@ -0,0 +1,205 @@
+"""
+Eventos de mudança de status (aprovação/reprovação) para o SSE
+`/api/projetos/<id>/eventos/` (ver async_views.eventos_projeto).
+
+As views publicam no broker depois do commit; cada conexão SSE assina os
+eventos do seu projeto. O broker vem de settings.EVENTOS_BROKER:
+- `BrokerBanco` (padrão): a tabela EventoStatus é o canal, então o evento
+  chega às conexões de qualquer worker que use o mesmo banco;
+- `BrokerLocal`: em memória, vale para um processo só (testes); com vários
+  workers cada um veria apenas o que ele mesmo publicou.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import EventoStatus
+
+logger = logging.getLogger(__name__)
+
+
+def _entregar(destinos, evento):
+    """Põe o evento nas filas (no loop de cada assinante). Retorna as filas de conexões mortas."""
+    mortas = []
+    for fila, loop in destinos:
+        # quem publica é uma view síncrona (outra thread): entrega no loop do assinante
+        try:
+            loop.call_soon_threadsafe(fila.put_nowait, evento)
+        except RuntimeError:  # loop já encerrado: conexão morta
+            mortas.append(fila)
+    return mortas
+
+
+class BrokerLocal:
+    """
+    Fan-out em memória. Guarda os últimos `historico` eventos para quem
+    reconecta com Last-Event-ID; eventos mais antigos que isso se perdem
+    (o cliente recebe um "reset" e deve ressincronizar).
+    """
+
+    def __init__(self, historico=1000):
+        self._ultimo = 0
+        self._historico = deque(maxlen=historico)
+        self._assinantes = {}  # fila -> (loop, projeto_id)
+        self._lock = threading.Lock()
+
+    def publicar(self, projeto_id, dados):
+        with self._lock:
+            self._ultimo += 1
+            evento = {"id": self._ultimo, "projeto": projeto_id, **dados}
+            self._historico.append(evento)
+            destinos = [(fila, loop) for fila, (loop, pid) in self._assinantes.items() if pid == projeto_id]
+        for fila in _entregar(destinos, evento):
+            self.cancelar(fila)
+        return evento
+
+    async def assinar(self, projeto_id, ultimo_id=None):
+        """
+        Registra uma fila para o projeto. Retorna (fila, pendentes, perdeu),
+        onde `pendentes` são os eventos guardados depois de `ultimo_id` e
+        `perdeu` indica que parte deles já saiu do histórico.
+        """
+        fila = asyncio.Queue()
+        with self._lock:
+            self._assinantes[fila] = (asyncio.get_running_loop(), projeto_id)
+            pendentes, perdeu = [], False
+            if ultimo_id is not None:
+                pendentes = [e for e in self._historico if e["id"] > ultimo_id and e["projeto"] == projeto_id]
+                mais_antigo = self._historico[0]["id"] if self._historico else self._ultimo + 1
+                # id maior que o último publicado: veio de outro processo/reinício
+                perdeu = ultimo_id + 1 < mais_antigo or ultimo_id > self._ultimo
+        return fila, pendentes, perdeu
+
+    def cancelar(self, fila):
+        with self._lock:
+            self._assinantes.pop(fila, None)
+
+
+class BrokerBanco:
+    """
+    Eventos na tabela EventoStatus. `publicar` é um INSERT (já fora da
+    transação da view); em cada processo com conexões SSE abertas uma thread
+    lê os eventos novos a cada EVENTOS_INTERVALO_S e entrega às filas locais,
+    e para sozinha quando a última conexão fecha. O histórico para
+    Last-Event-ID é a própria tabela (até o `limpar_eventos`).
+
+    O id é atribuído antes do COMMIT, então um evento pode aparecer depois de
+    um id maior: cada leitura relê os últimos EVENTOS_JANELA_S segundos e
+    descarta os ids já entregues.
+    """
+
+    def __init__(self):
+        self._assinantes = {}  # fila -> (loop, projeto_id)
+        self._lock = threading.Lock()
+        self._vigia = None
+        self._ultimo = None    # maior id já entregue às filas deste processo
+        self._entregues = {}   # id -> criado_em, só os que ainda caem na janela
+
+    @staticmethod
+    def _evento(pk, projeto_id, dados):
+        return {"id": pk, "projeto": projeto_id, **dados}
+
+    def publicar(self, projeto_id, dados):
+        evento = EventoStatus.objects.create(projeto_id=projeto_id, dados=dados)
+        return self._evento(evento.pk, projeto_id, dados)
+
+    def _janela(self):
+        return timezone.now() - timedelta(seconds=settings.EVENTOS_JANELA_S)
+
+    def _linha_de_base(self):
+        # o que já existe quando a thread começa a ouvir não é "novo"
+        recentes = dict(EventoStatus.objects.filter(criado_em__gte=self._janela()).values_list("id", "criado_em"))
+        maximo = EventoStatus.objects.aggregate(m=Max("id"))["m"] or 0
+        return maximo, recentes
+
+    def _assinar(self, fila, loop, projeto_id, ultimo_id):
+        while True:
+            # sem thread ouvindo, o que foi publicado nesse meio-tempo é histórico (só
+            # volta com Last-Event-ID): cada thread nova parte de uma linha de base nova
+            base = self._linha_de_base() if self._vigia is None else None
+            with self._lock:
+                if self._vigia is None and base is None:
+                    continue  # a thread parou entre a leitura e o lock: lê de novo
+                self._assinantes[fila] = (loop, projeto_id)
+                if self._vigia is None:
+                    self._ultimo, self._entregues = base
+                    self._vigia = threading.Thread(target=self._vigiar, name="eventos-banco", daemon=True)
+                    self._vigia.start()
+                # até `corte` a thread já entregou (a outras filas); depois dele, entrega a esta
+                corte = self._ultimo
+                break
+        if ultimo_id is None:
+            return [], False
+        eventos = EventoStatus.objects.filter(projeto_id=projeto_id, id__gt=ultimo_id, id__lte=corte)
+        pendentes = [self._evento(pk, projeto_id, dados) for pk, dados in eventos.order_by("id").values_list("id", "dados")]
+        mais_antigo = EventoStatus.objects.aggregate(m=Min("id"))["m"] or corte + 1
+        return pendentes, ultimo_id + 1 < mais_antigo or ultimo_id > corte
+
+    async def assinar(self, projeto_id, ultimo_id=None):
+        """Mesmo contrato do BrokerLocal.assinar: (fila, pendentes, perdeu)."""
+        fila = asyncio.Queue()
+        pendentes, perdeu = await sync_to_async(self._assinar)(fila, asyncio.get_running_loop(), projeto_id, ultimo_id)
+        return fila, pendentes, perdeu
+
+    def cancelar(self, fila):
+        with self._lock:
+            self._assinantes.pop(fila, None)
+
+    def entregar_novos(self):
+        """Uma leitura da tabela: entrega às filas deste processo o que ainda não entregou."""
+        janela = self._janela()
+        novos = (EventoStatus.objects.filter(Q(id__gt=self._ultimo) | Q(criado_em__gte=janela))
+                 .order_by("id").values_list("id", "projeto_id", "dados", "criado_em"))
+        mortas = []
+        for pk, projeto_id, dados, criado_em in novos:
+            with self._lock:
+                if pk in self._entregues:
+                    continue
+                self._entregues[pk] = criado_em
+                self._ultimo = max(self._ultimo, pk)
+                destinos = [(fila, loop) for fila, (loop, pid) in self._assinantes.items() if pid == projeto_id]
+                mortas += _entregar(destinos, self._evento(pk, projeto_id, dados))
+        with self._lock:
+            self._entregues = {pk: em for pk, em in self._entregues.items() if em >= janela}
+        for fila in mortas:
+            self.cancelar(fila)
+
+    def _vigiar(self):
+        try:
+            while True:
+                time.sleep(settings.EVENTOS_INTERVALO_S)
+                with self._lock:
+                    if not self._assinantes:
+                        self._vigia = None
+                        return
+                close_old_connections()
+                try:
+                    self.entregar_novos()
+                except DatabaseError:
+                    logger.exception("Falha ao ler eventos; tentando de novo")
+        finally:
+            connection.close()
+
+
+@lru_cache(maxsize=None)
+def broker():
+    return import_string(settings.EVENTOS_BROKER)()
+
+
+def publicar_status(projeto_id, tipo, objeto_id, status):
+    """Avisa os assinantes do projeto, só depois que a transação da view confirmar."""
+    if not projeto_id:
+        return
+    dados = {"tipo": tipo, "objeto": objeto_id, "status": status, "em": timezone.now().isoformat()}
+    transaction.on_commit(lambda: broker().publicar(projeto_id, dados))
@@ -0,0 +1,118 @@
+"""
+Exclusão de projetos em segundo plano.
+
+O `DELETE /api/projetos/<id>/` só esconde o projeto (`excluido_em`), grava a
+lápide da sincronização e libera o nome; quem apaga os materiais, modelos e
+vínculos, e solta os logs e o resumo de atividade, é o `manage.py
+excluir_projetos`, em lotes de EXCLUSAO_LOTE linhas, cada lote na sua
+transação e com DELETE/UPDATE direto por id (sem o Collector do Django, que
+carregaria todas as linhas na memória).
+
+Como os deletes em lote não disparam signals, os materiais apagados aqui não
+ganham lápide própria (a do projeto cobre) e o índice do autocomplete só os
+esquece na reconstrução seguinte.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import atividade
+from .models import AtividadeDiaria, Exclusao, Log, MaterialSpec, ModeloDocumento, Projeto
+
+Vinculo = Projeto.ambientes.through
+
+
+def _pendentes(projeto_id):
+    """(queryset, ação) de cada tipo de linha filha, na ordem em que são tratadas."""
+    return [
+        (MaterialSpec.objects.filter(projeto_id=projeto_id), "apagar"),
+        (ModeloDocumento.objects.filter(projeto_id=projeto_id), "apagar"),
+        (Vinculo.objects.filter(projeto_id=projeto_id), "apagar"),
+        (Log.objects.filter(projeto_id=projeto_id), "soltar"),
+        (AtividadeDiaria.objects.filter(projeto_id=projeto_id), "fundir"),
+    ]
+
+
+def restantes(projeto_id):
+    return sum(qs.count() for qs, _ in _pendentes(projeto_id))
+
+
+def progresso(projeto_id):
+    """Estado da exclusão para a API, ou None se o projeto não existe nem foi excluído."""
+    projeto = Projeto.todos.filter(pk=projeto_id).only("excluido_em", "exclusao_total").first()
+    if projeto is None:
+        if Exclusao.objects.filter(modelo="PROJETO", objeto_id=projeto_id).exists():
+            return {"id": projeto_id, "status": "concluida", "total": None, "restantes": 0, "percentual": 100}
+        return None
+    if projeto.excluido_em is None:
+        return None
+    falta = restantes(projeto_id)
+    total = max(projeto.exclusao_total, falta)
+    return {
+        "id": projeto_id,
+        "status": "excluindo",
+        "total": total,
+        "restantes": falta,
+        "percentual": 100 if not total else round(100 * (total - falta) / total),
+    }
+
+
+@transaction.atomic
+def ocultar(projeto):
+    """Marca o projeto como excluído; o resto fica para `excluir_pendentes`."""
+    agora = timezone.now()
+    projeto.excluido_em = agora
+    projeto.exclusao_total = restantes(projeto.pk)
+    # o nome é único: renomeia para que um projeto novo possa usá-lo já
+    sufixo = f" [excluído #{projeto.pk}]"
+    projeto.nome_do_projeto = projeto.nome_do_projeto[:255 - len(sufixo)] + sufixo
+    projeto.save(update_fields=["excluido_em", "exclusao_total", "nome_do_projeto", "data_atualizacao"])
+    Exclusao.objects.create(modelo="PROJETO", objeto_id=projeto.pk, projeto_id=projeto.pk, excluido_em=agora)
+
+
+def _processar_lote(qs, acao, lote):
+    with transaction.atomic():
+        ids = list(qs.order_by().values_list("pk", flat=True)[:lote])
+        if not ids:
+            return 0
+        alvo = qs.model.objects.filter(pk__in=ids)
+        if acao == "soltar":
+            alvo.update(projeto=None)
+        elif acao == "fundir":
+            # só pode haver uma linha sem projeto por dia e usuário
+            atividade.soltar(ids)
+        else:
+            # DELETE ... WHERE id IN (...): sem signals e sem carregar as linhas
+            alvo._raw_delete(alvo.db)
+        return len(ids)
+
+
+def _esvaziar(qs, acao, lote):
+    total = 0
+    while True:
+        feitos = _processar_lote(qs, acao, lote)
+        total += feitos
+        if feitos < lote:
+            return total
+
+
+def excluir_projeto(projeto_id, lote=None):
+    """Apaga as linhas filhas de um projeto oculto, lote a lote, e por fim a linha dele."""
+    lote = lote or settings.EXCLUSAO_LOTE
+    total = sum(_esvaziar(qs, acao, lote) for qs, acao in _pendentes(projeto_id))
+    # um log ou resumo de atividade gravado depois do lote dele (requisição que já
+    # estava em andamento) quebraria a FK do DELETE: a última passada e o DELETE vão
+    # juntos, com a linha do projeto travada, então nada novo passa a apontar para ele
+    with transaction.atomic():
+        alvo = Projeto.todos.filter(pk=projeto_id, excluido_em__isnull=False)
+        if not alvo.select_for_update().exists():
+            return total
+        total += sum(_esvaziar(qs, acao, lote) for qs, acao in _pendentes(projeto_id))
+        alvo._raw_delete(alvo.db)  # a lápide já foi gravada em ocultar()
+    return total
+
+
+def excluir_pendentes(lote=None):
+    """Processa todos os projetos ocultos, do mais antigo para o mais novo. Retorna {id: linhas}."""
+    pendentes = Projeto.todos.filter(excluido_em__isnull=False).order_by("excluido_em").values_list("pk", flat=True)
+    return {pid: excluir_projeto(pid, lote) for pid in list(pendentes)}
@@ -0,0 +1,110 @@
+"""
+`Idempotency-Key` para POSTs que o app móvel repete quando a conexão cai
+(criação de projeto, add-item, aprovar/reprovar).
+
+A primeira requisição com a chave reserva a linha em ChaveIdempotencia antes
+de rodar a view e guarda a resposta na mesma transação da view (o que a view
+grava e a resposta guardada confirmam juntos); as repetições (mesmo usuário,
+mesma chave) recebem essa resposta sem executar nada, com o cabeçalho
+`Idempotency-Replayed: true`. Sem o cabeçalho, nada muda.
+
+- repetição enquanto a primeira ainda roda: 409;
+- reserva sem resposta há mais de IDEMPOTENCIA_RESERVA_S (worker morto por
+  timeout/OOM no meio da view, que foi desfeita): a repetição assume a chave;
+- mesma chave com outro método/caminho/corpo: 422;
+- resposta de erro (4xx/5xx) ou exceção: a reserva é desfeita e a repetição
+  roda a view de novo (validar de novo é barato e nada foi gravado).
+"""
+import functools
+import hashlib
+import json
+
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .models import ChaveIdempotencia
+
+CABECALHO = "Idempotency-Key"
+
+
+class RequisicaoEmAndamento(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Uma requisição com esta Idempotency-Key ainda está sendo processada."
+    default_code = "idempotencia_em_andamento"
+
+
+class ChaveReutilizada(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "Esta Idempotency-Key já foi usada com outra requisição."
+    default_code = "idempotencia_chave_reutilizada"
+
+
+def _assinatura(request):
+    corpo = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method} {request.path}\n{corpo}".encode()).hexdigest()
+
+
+def _reservar(usuario, chave, assinatura):
+    """Cria e devolve a linha "processando"; se a chave já tem resposta, devolve a existente (ou levanta)."""
+    while True:
+        existente = ChaveIdempotencia.objects.filter(usuario=usuario, chave=chave).first()
+        if existente is not None and (existente.expirada or existente.abandonada):
+            # condicional: de duas repetições juntas, só uma apaga (a outra relê e cai no 409)
+            ChaveIdempotencia.objects.filter(pk=existente.pk, status_code=existente.status_code,
+                                             criada_em=existente.criada_em).delete()
+            continue
+        if existente is not None:
+            if existente.requisicao != assinatura:
+                raise ChaveReutilizada()
+            if existente.status_code is None:
+                raise RequisicaoEmAndamento()
+            return existente
+        try:
+            with transaction.atomic():
+                return ChaveIdempotencia.objects.create(usuario=usuario, chave=chave, requisicao=assinatura)
+        except IntegrityError:
+            continue  # outra requisição com a mesma chave chegou junto: relê
+
+
+def idempotente(view):
+    """Decorator para métodos de viewset/@action e para funções @api_view."""
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        request = next(a for a in args if isinstance(a, Request))
+        chave = request.headers.get(CABECALHO)
+        if not chave or not request.user.is_authenticated:
+            return view(*args, **kwargs)
+        if len(chave) > 255:
+            raise ValidationError({CABECALHO: "Use no máximo 255 caracteres."})
+
+        registro = _reservar(request.user, chave, _assinatura(request))
+        if registro.status_code is not None:
+            resposta = Response(registro.resposta, status=registro.status_code)
+            resposta["Idempotency-Replayed"] = "true"
+            return resposta
+
+        # pelo id: se esta reserva for assumida por uma repetição, não mexe na nova
+        reserva = ChaveIdempotencia.objects.filter(pk=registro.pk)
+        try:
+            # o @transaction.atomic da view vira savepoint desta: sem janela entre o
+            # COMMIT da view e a resposta guardada (queda ali faria a repetição rodar de novo)
+            with transaction.atomic():
+                resposta = view(*args, **kwargs)
+                sucesso = isinstance(resposta, Response) and resposta.status_code < 400
+                if sucesso:
+                    # o que o JSONRenderer escreveria: datas, Decimal etc. viram JSON puro
+                    dados = json.loads(JSONRenderer().render(resposta.data) or "null")
+                    reserva.update(status_code=resposta.status_code, resposta=dados)
+        except BaseException:
+            reserva.delete()
+            raise
+        if not sucesso:
+            reserva.delete()
+        return resposta
+
+    return wrapper
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.arquivo_logs import arquivar
+
+
+class Command(BaseCommand):
+    help = "Move os logs antigos para arquivos mensais JSONL comprimidos (settings.LOG_ARQUIVO_DIR)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", dest="dias", type=int, required=True,
+                            help="Arquiva logs com mais de N dias.")
+        parser.add_argument("--lote", type=int, default=1000, help="Linhas por lote (gravar + apagar).")
+        parser.add_argument("--diretorio", default=None, help="Sobrescreve settings.LOG_ARQUIVO_DIR.")
+
+    def handle(self, *args, **opcoes):
+        if opcoes["dias"] < 1:
+            raise CommandError("--older-than precisa ser de pelo menos 1 dia.")
+        limite = timezone.now() - timedelta(days=opcoes["dias"])
+        por_mes = arquivar(limite, lote=opcoes["lote"], diretorio=opcoes["diretorio"])
+        for mes, qtd in sorted(por_mes.items()):
+            self.stdout.write(f"{mes}: {qtd} log(s) arquivado(s)")
+        self.stdout.write(f"Total: {sum(por_mes.values())} log(s) anteriores a {limite:%d/%m/%Y}")
@@ -0,0 +1,319 @@
+import asyncio
+import io
+import os
+import re
+import statistics
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from asgiref.sync import async_to_sync
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.utils import timezone
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.especificacao import dados_especificacao, renderizar_especificacao, zip_especificacoes
+from api.models import Usuario, Projeto, Ambiente, MaterialSpec, Marca
+from api.serializers import MaterialSpecSerializer, leitura_materiais, materiais_para_serializer
+
+
+def semear_projeto(n_itens, itens_por_ambiente=50, nome="Benchmark"):
+    """Cria um projeto com `n_itens` materiais distribuídos em ambientes."""
+    usuario, _ = Usuario.objects.get_or_create(
+        email="bench@lab.com",
+        defaults={"username": "bench", "cargo": "superadmin"},
+    )
+    marca, _ = Marca.objects.get_or_create(nome="Marca Benchmark")
+    n_ambientes = max(1, -(-n_itens // itens_por_ambiente))
+    categorias = ["PRIVATIVA", "COMUM", "EXTERNA"]
+    ambientes = Ambiente.objects.bulk_create([
+        Ambiente(nome_do_ambiente=f"{nome} Ambiente {i}", categoria=categorias[i % 3])
+        for i in range(n_ambientes)
+    ])
+    projeto = Projeto.objects.create(
+        nome_do_projeto=nome,
+        tipo_do_projeto="RESIDENCIAL",
+        data_entrega=date(2030, 1, 1),
+        descricao="Projeto gerado para benchmark",
+        responsavel=usuario,
+    )
+    projeto.ambientes.set(ambientes)
+    MaterialSpec.objects.bulk_create(
+        (MaterialSpec(
+            projeto=projeto,
+            ambiente=ambientes[i // itens_por_ambiente],
+            item=f"Item {i % itens_por_ambiente}",
+            descricao=f"Descrição do item {i}\nlinha extra",
+            marca=marca if i % 2 else None,
+        ) for i in range(n_itens)),
+        batch_size=500,
+    )
+    return usuario, projeto
+
+
+def resumo_tempos(tempos):
+    return (f"mediana {statistics.median(tempos) * 1000:.1f} ms | "
+            f"min {min(tempos) * 1000:.1f} ms | max {max(tempos) * 1000:.1f} ms")
+
+
+# Cada cenário devolve (linhas do relatório, métrica comparada com --limite).
+def bench_clonar(cmd, opcoes):
+    usuario, projeto = semear_projeto(opcoes["itens"])
+    client = APIClient()
+    client.force_authenticate(usuario)
+
+    tempos = []
+    for i in range(opcoes["repeticoes"]):
+        inicio = time.perf_counter()
+        resp = client.post(f"/api/projetos/{projeto.id}/clonar/",
+                           {"nome_do_projeto": f"Clone {i}"}, format="json")
+        tempos.append(time.perf_counter() - inicio)
+        if resp.status_code != 201:
+            raise CommandError(f"clonar falhou: {resp.status_code} {resp.content[:200]!r}")
+    mediana = statistics.median(tempos)
+    return [f"clonar: {opcoes['itens']} itens | {resumo_tempos(tempos)}"], mediana
+
+
+def bench_streaming(cmd, opcoes):
+    """
+    Pico de memória (tracemalloc) do GET /api/projetos/<id>/ com e sem
+    streaming, para projetos de tamanhos crescentes. A métrica é a razão
+    entre o pico no maior e no menor projeto com streaming (1.0 = plano).
+    """
+    client = APIClient()
+    linhas, picos_streaming = [], []
+    for n in (opcoes["itens"] // 4, opcoes["itens"] // 2, opcoes["itens"]):
+        usuario, projeto = semear_projeto(n, nome=f"Streaming {n}")
+        client.force_authenticate(usuario)
+        picos = {}
+        for modo, limite in (("normal", 10**9), ("streaming", 0)):
+            with override_settings(JSON_STREAMING_MIN_ITENS=limite):
+                tracemalloc.start()
+                resp = client.get(f"/api/projetos/{projeto.id}/")
+                tamanho = sum(len(p) for p in resp.streaming_content) if resp.streaming else len(resp.content)
+                del resp
+                picos[modo] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        picos_streaming.append(picos["streaming"])
+        linhas.append(f"streaming: {n} itens ({tamanho / 1024:.0f} KiB) | "
+                      f"pico normal {picos['normal'] / 2**20:.1f} MiB | "
+                      f"pico streaming {picos['streaming'] / 2**20:.1f} MiB")
+    return linhas, picos_streaming[-1] / picos_streaming[0]
+
+
+def bench_serializar(cmd, opcoes):
+    """MaterialSpecSerializer x MaterialSpecLeituraRapida nos materiais de um projeto."""
+    _, projeto = semear_projeto(opcoes["itens"])
+    qs = MaterialSpec.objects.filter(projeto=projeto).order_by("ambiente_id", "item")
+    tempos = {"drf": [], "rapida": []}
+    for _ in range(opcoes["repeticoes"]):
+        inicio = time.perf_counter()
+        MaterialSpecSerializer(materiais_para_serializer(qs), many=True).data
+        tempos["drf"].append(time.perf_counter() - inicio)
+        inicio = time.perf_counter()
+        list(leitura_materiais().linhas(qs))
+        tempos["rapida"].append(time.perf_counter() - inicio)
+    razao = statistics.median(tempos["rapida"]) / statistics.median(tempos["drf"])
+    linhas = [f"serializar ({nome}): {opcoes['itens']} itens | {resumo_tempos(t)}" for nome, t in tempos.items()]
+    linhas.append(f"serializar: leitura rápida em {razao:.2f}x o tempo do DRF")
+    return linhas, razao
+
+
+def bench_stats(cmd, opcoes):
+    """
+    Carga do dashboard: caminho WSGI (dashboard + mensais, DRF síncrono)
+    contra o ASGI (um /stats/async/painel/ com as consultas via asyncio.gather),
+    com `--repeticoes` dashboards disparados ao mesmo tempo.
+    """
+    usuario, _ = semear_projeto(10)
+    agora = timezone.now()
+    Projeto.objects.bulk_create(
+        Projeto(nome_do_projeto=f"Stats {i}", tipo_do_projeto="RESIDENCIAL", data_entrega=date(2030, 1, 1),
+                status=("PENDENTE", "APROVADO", "REPROVADO")[i % 3], responsavel=usuario)
+        for i in range(opcoes["itens"])
+    )
+    # espalha as datas de criação por 24 meses
+    ids = list(Projeto.objects.values_list("id", flat=True))
+    for mes in range(24):
+        Projeto.objects.filter(id__in=ids[mes::24]).update(data_criacao=agora - timedelta(days=30 * mes))
+
+    token = str(RefreshToken.for_user(usuario).access_token)
+    wsgi = Client(HTTP_AUTHORIZATION=f"Bearer {token}")
+    asgi = AsyncClient(AUTHORIZATION=f"Bearer {token}")
+    n = opcoes["repeticoes"]
+
+    def carga_wsgi():
+        for _ in range(n):
+            wsgi.get("/api/stats/dashboard/")
+            wsgi.get("/api/stats/mensais/")
+
+    async def carga_asgi():
+        await asyncio.gather(*(asgi.get("/api/stats/async/painel/") for _ in range(n)))
+
+    tempos = {}
+    for nome, carga in (("wsgi", carga_wsgi), ("asgi", async_to_sync(carga_asgi))):
+        carga()  # aquecimento
+        inicio = time.perf_counter()
+        carga()
+        tempos[nome] = time.perf_counter() - inicio
+
+    razao = tempos["asgi"] / tempos["wsgi"]
+    return [
+        f"stats ({nome}): {n} dashboards, {opcoes['itens']} projetos | {t * 1000:.1f} ms "
+        f"({t / n * 1000:.2f} ms por dashboard)"
+        for nome, t in tempos.items()
+    ] + [f"stats: ASGI em {razao:.2f}x o tempo do WSGI"], razao
+
+
+def bench_especificacoes(cmd, opcoes):
+    """
+    ZIP de especificações de vários projetos: renderização sequencial contra
+    o ProcessPoolExecutor (um processo por núcleo). A métrica é a razão
+    paralelo/sequencial (quanto menor, melhor).
+    """
+    n_projetos = 8
+    ids = [semear_projeto(opcoes["itens"] // n_projetos, nome=f"Especificação {i}")[1].id
+           for i in range(n_projetos)]
+    workers = os.cpu_count() or 1
+
+    inicio = time.perf_counter()
+    dados = dados_especificacao(ids)
+    t_dados = time.perf_counter() - inicio
+
+    tempos = {}
+    for nome, n in (("sequencial", 1), (f"{workers} processos", workers)):
+        inicio = time.perf_counter()
+        tamanho = sum(len(p) for p in zip_especificacoes(dados, workers=n))
+        tempos[nome] = time.perf_counter() - inicio
+
+    sequencial, paralelo = tempos.values()
+    linhas = [f"especificacoes: {n_projetos} projetos, {opcoes['itens']} itens | dados {t_dados * 1000:.1f} ms"
+              f" | ZIP {tamanho / 1024:.0f} KiB"]
+    linhas += [f"especificacoes ({nome}): {t * 1000:.1f} ms ({n_projetos / t:.1f} PDFs/s)" for nome, t in tempos.items()]
+    linhas.append(f"especificacoes: paralelo em {paralelo / sequencial:.2f}x o tempo sequencial")
+    return linhas, paralelo / sequencial
+
+
+def renderizar_paragrafos(dados):
+    """
+    Renderização antiga (referência do cenário "pdf"): estilos refeitos a cada
+    PDF e tabela, toda célula como Paragraph, uma tabela inteira por ambiente.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_LEFT
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    saida = io.BytesIO()
+    doc = SimpleDocTemplate(saida, pagesize=A4)
+    styles = getSampleStyleSheet()
+    estilo = ParagraphStyle("cell_style", fontSize=10, leading=12, alignment=TA_LEFT)
+
+    def cell(text):
+        return Paragraph(str(text).replace("\n", "<br/>"), estilo)
+
+    def tabela(data, larguras):
+        t = Table(data, colWidths=larguras)
+        t.setStyle(TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+            ("GRID", (0, 0), (-1, -1), 0.7, colors.black),
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("VALIGN", (0, 0), (-1, -1), "TOP"),
+        ]))
+        return t
+
+    story = [Paragraph("<b>ESPECIFICAÇÃO TÉCNICA</b>", styles["Title"]), Spacer(1, 20)]
+    for categoria in ("PRIVATIVA", "COMUM"):
+        story.append(Paragraph(f"<b>ÁREA {categoria}</b>", styles["Heading2"]))
+        for amb in dados["ambientes"]:
+            if amb["categoria"] != categoria:
+                continue
+            story.append(Paragraph(f"<b>{amb['nome']}</b>", styles["Heading3"]))
+            linhas = [[cell("Item"), cell("Descrição")]]
+            linhas += [[cell(item), cell(descricao or "-")] for item, descricao in amb["materiais"]]
+            story += [tabela(linhas, [120, 330]), Spacer(1, 15)]
+    linhas = [[cell("Material"), cell("Marcas")]] + [[cell(m), cell(ms)] for m, ms in dados["marcas"]]
+    story.append(tabela(linhas, [150, 300]))
+    doc.build(story)
+    return saida.getvalue()
+
+
+def contar_paginas(pdf):
+    return len(re.findall(rb"/Type /Page[^s]", pdf))
+
+
+def bench_pdf(cmd, opcoes):
+    """
+    Páginas por segundo do PDF de especificação: renderização antiga contra a
+    de api.especificacao. Itens curtos numa linha, como os nomes reais
+    ("Piso", "Rodapé"...); metade das descrições é longa e precisa quebrar.
+    Métrica: razão entre os tempos (novo/antigo).
+    """
+    _, projeto = semear_projeto(opcoes["itens"], itens_por_ambiente=opcoes["itens"] // 4)
+    for i, m in enumerate(MaterialSpec.objects.filter(projeto=projeto).only("id")):
+        if i % 2:
+            m.descricao = "Porcelanato retificado 60x60, acabamento acetinado, assentado com argamassa AC-III e rejunte epóxi"
+        else:
+            m.descricao = "Conforme projeto"
+        m.save(update_fields=["descricao"])
+    dados, = dados_especificacao([projeto.id])
+
+    resultados = {}
+    for nome, renderizar in (("antigo", renderizar_paragrafos), ("novo", renderizar_especificacao)):
+        renderizar(dados)  # aquecimento (fontes, estilos)
+        tempos = []
+        for _ in range(opcoes["repeticoes"]):
+            inicio = time.perf_counter()
+            pdf = renderizar(dados)
+            tempos.append(time.perf_counter() - inicio)
+        resultados[nome] = (statistics.median(tempos), contar_paginas(pdf), tempos)
+
+    linhas = [
+        f"pdf ({nome}): {opcoes['itens']} itens, {paginas} páginas | {paginas / t:.1f} páginas/s | {resumo_tempos(tempos)}"
+        for nome, (t, paginas, tempos) in resultados.items()
+    ]
+    razao = resultados["novo"][0] / resultados["antigo"][0]
+    linhas.append(f"pdf: novo em {razao:.2f}x o tempo do antigo")
+    return linhas, razao
+
+
+CENARIOS = {
+    "clonar": bench_clonar,
+    "streaming": bench_streaming,
+    "serializar": bench_serializar,
+    "stats": bench_stats,
+    "especificacoes": bench_especificacoes,
+    "pdf": bench_pdf,
+}
+
+
+class Command(BaseCommand):
+    help = "Roda benchmarks de desempenho num banco de teste isolado."
+
+    def add_arguments(self, parser):
+        parser.add_argument("cenario", choices=sorted(CENARIOS))
+        parser.add_argument("--itens", type=int, default=5000, help="Materiais no projeto semeado.")
+        parser.add_argument("--repeticoes", type=int, default=3)
+        parser.add_argument("--limite", type=float, default=None,
+                            help="Falha se a métrica do cenário passar deste valor.")
+
+    def handle(self, *args, **opcoes):
+        cenario = opcoes["cenario"]
+        setup_test_environment()
+        nome_original = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            linhas, metrica = CENARIOS[cenario](self, opcoes)
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0)
+            teardown_test_environment()
+
+        for linha in linhas:
+            self.stdout.write(linha)
+        if opcoes["limite"] is not None and metrica > opcoes["limite"]:
+            raise CommandError(f"{cenario}: métrica {metrica:.3f} acima do limite {opcoes['limite']}")
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.especificacao import dados_especificacao, zip_especificacoes
+
+
+class Command(BaseCommand):
+    help = "Gera um ZIP com o PDF de especificação de cada projeto informado."
+
+    def add_arguments(self, parser):
+        parser.add_argument("ids", nargs="+", type=int, help="Ids dos projetos.")
+        parser.add_argument("--saida", default="especificacoes.zip")
+        parser.add_argument("--workers", type=int, default=settings.ESPECIFICACAO_WORKERS,
+                            help="Processos de renderização (0 = um por núcleo).")
+
+    def handle(self, *args, **opcoes):
+        dados = dados_especificacao(opcoes["ids"])
+        inexistentes = sorted(set(opcoes["ids"]) - {d["id"] for d in dados})
+        if inexistentes:
+            raise CommandError(f"Projetos não encontrados: {inexistentes}")
+
+        with open(opcoes["saida"], "wb") as arquivo:
+            for pedaco in zip_especificacoes(dados, workers=opcoes["workers"]):
+                arquivo.write(pedaco)
+        self.stdout.write(f"{len(dados)} especificação(ões) em {opcoes['saida']}")
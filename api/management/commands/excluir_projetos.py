@@ -0,0 +1,23 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.exclusao_projetos import excluir_pendentes
+
+
+class Command(BaseCommand):
+    help = "Apaga em lotes os materiais, modelos e vínculos dos projetos excluídos pela API, e depois os projetos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=settings.EXCLUSAO_LOTE)
+        parser.add_argument("--loop", action="store_true", help="Continua rodando e procurando projetos excluídos.")
+        parser.add_argument("--intervalo", type=float, default=10.0, help="Segundos entre consultas no modo --loop.")
+
+    def handle(self, *args, **opcoes):
+        while True:
+            for projeto_id, linhas in excluir_pendentes(opcoes["lote"]).items():
+                self.stdout.write(f"Projeto #{projeto_id} excluído ({linhas} linha(s) filhas)")
+            if not opcoes["loop"]:
+                break
+            time.sleep(opcoes["intervalo"])
@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import EventoStatus
+
+
+class Command(BaseCommand):
+    help = "Apaga eventos de status (SSE) mais antigos que EVENTOS_RETENCAO_HORAS."
+
+    def handle(self, *args, **opcoes):
+        limite = timezone.now() - timedelta(hours=settings.EVENTOS_RETENCAO_HORAS)
+        apagados, _ = EventoStatus.objects.filter(criado_em__lt=limite).delete()
+        self.stdout.write(f"{apagados} evento(s) anteriores a {limite:%d/%m/%Y %H:%M} apagado(s)")
@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import Exclusao
+
+
+class Command(BaseCommand):
+    help = "Apaga lápides de sincronização mais antigas que SYNC_RETENCAO_EXCLUSOES_DIAS."
+
+    def handle(self, *args, **opcoes):
+        limite = timezone.now() - timedelta(days=settings.SYNC_RETENCAO_EXCLUSOES_DIAS)
+        apagadas, _ = Exclusao.objects.filter(excluido_em__lt=limite).delete()
+        self.stdout.write(f"{apagadas} lápide(s) anteriores a {limite:%d/%m/%Y} apagada(s)")
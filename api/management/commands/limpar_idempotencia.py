@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import ChaveIdempotencia
+
+
+class Command(BaseCommand):
+    help = "Apaga as chaves de idempotência mais antigas que IDEMPOTENCIA_TTL_HORAS."
+
+    def handle(self, *args, **opcoes):
+        limite = timezone.now() - timedelta(hours=settings.IDEMPOTENCIA_TTL_HORAS)
+        apagadas, _ = ChaveIdempotencia.objects.filter(criada_em__lt=limite).delete()
+        self.stdout.write(f"{apagadas} chave(s) anteriores a {limite:%d/%m/%Y %H:%M} apagada(s)")
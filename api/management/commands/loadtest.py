@@ -0,0 +1,233 @@
+import json
+import logging
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.signals import got_request_exception
+from django.db import OperationalError, connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from api.management.commands.benchmark import semear_projeto
+from api.models import MaterialSpec, Usuario
+
+SENHA = "carga123"
+CABECALHO_CENARIO = "X-Carga-Cenario"
+CENARIOS = ["login", "abrir_projeto", "aprovar", "reprovar", "pdf"]
+
+
+class _Servidor(ThreadedWSGIServer):
+    # 50 usuários conectando juntos estouram a fila padrão (10) do runserver
+    request_queue_size = 256
+
+
+class _HandlerSilencioso(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class Resultados:
+    """Tempos e erros por cenário, preenchidos pelas threads dos usuários e do servidor."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tempos = defaultdict(list)
+        self.erros = defaultdict(int)
+        self.status = defaultdict(lambda: defaultdict(int))
+        self.locks = defaultdict(int)
+
+    def registrar(self, cenario, segundos, codigo):
+        with self._lock:
+            self.tempos[cenario].append(segundos)
+            self.status[cenario][codigo] += 1
+            if not 200 <= codigo < 400:
+                self.erros[cenario] += 1
+
+    def excecao_no_servidor(self, sender, request=None, **kwargs):
+        # chamado dentro do except do handler do Django: a exceção é a corrente
+        exc = sys.exc_info()[1]
+        if isinstance(exc, OperationalError) and "locked" in str(exc):
+            cenario = request.META.get("HTTP_X_CARGA_CENARIO", "?") if request else "?"
+            with self._lock:
+                self.locks[cenario] += 1
+
+
+def percentis(tempos):
+    """(p50, p95, p99) em segundos."""
+    if len(tempos) == 1:
+        return tempos * 3
+    q = statistics.quantiles(tempos, n=100, method="inclusive")
+    return q[49], q[94], q[98]
+
+
+class Cliente:
+    """Um revisor simulado: faz login e segue o fluxo de revisão contra o servidor ao vivo."""
+
+    def __init__(self, base, resultados):
+        self.base = base
+        self.resultados = resultados
+        self.token = None
+
+    def chamar(self, cenario, metodo, caminho, corpo=None):
+        cabecalhos = {CABECALHO_CENARIO: cenario, "Content-Type": "application/json"}
+        if self.token:
+            cabecalhos["Authorization"] = f"Bearer {self.token}"
+        dados = json.dumps(corpo).encode() if corpo is not None else None
+        requisicao = urllib.request.Request(self.base + caminho, data=dados, headers=cabecalhos, method=metodo)
+        inicio = time.perf_counter()
+        try:
+            with urllib.request.urlopen(requisicao, timeout=120) as resp:
+                conteudo, codigo = resp.read(), resp.status
+        except urllib.error.HTTPError as exc:
+            conteudo, codigo = exc.read(), exc.code
+        except OSError:
+            conteudo, codigo = b"", 0  # conexão recusada/derrubada
+        self.resultados.registrar(cenario, time.perf_counter() - inicio, codigo)
+        return codigo, conteudo
+
+    def executar(self, email, projetos, iteracoes, pdf_a_cada, semente):
+        aleatorio = random.Random(semente)
+        codigo, conteudo = self.chamar("login", "POST", "/api/token/", {"email": email, "password": SENHA})
+        if codigo != 200:
+            return
+        self.token = json.loads(conteudo)["access"]
+
+        for i in range(iteracoes):
+            projeto_id, materiais = aleatorio.choice(projetos)
+            self.chamar("abrir_projeto", "GET", f"/api/projetos/{projeto_id}/")
+            self.chamar("aprovar", "POST", f"/api/materiais/{aleatorio.choice(materiais)}/aprovar/", {})
+            self.chamar("reprovar", "POST", f"/api/materiais/{aleatorio.choice(materiais)}/reprovar/",
+                        {"motivo": "Teste de carga"})
+            if pdf_a_cada and (i + 1) % pdf_a_cada == 0:
+                self.chamar("pdf", "GET", f"/api/projetos/{projeto_id}/download-especificacao/")
+
+
+def semear(opcoes):
+    """Revisores (gerentes, que podem aprovar) e projetos com materiais. Retorna (emails, [(projeto, [materiais])])."""
+    senha = make_password(SENHA)  # um hash só: o PBKDF2 de cada usuário dominaria a semeadura
+    revisores = Usuario.objects.bulk_create(
+        Usuario(username=f"revisor{i}", email=f"revisor{i}@carga.lab", password=senha, cargo="gerente")
+        for i in range(opcoes["usuarios"])
+    )
+    projetos = []
+    for i in range(opcoes["projetos"]):
+        _, projeto = semear_projeto(opcoes["itens"], itens_por_ambiente=25, nome=f"Carga {i}")
+        projetos.append((projeto.id, list(MaterialSpec.objects.filter(projeto=projeto).values_list("id", flat=True))))
+    return [r.email for r in revisores], projetos
+
+
+def executar_carga(base, emails, projetos, opcoes):
+    resultados = Resultados()
+    got_request_exception.connect(resultados.excecao_no_servidor)
+    try:
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(emails)) as pool:
+            tarefas = [
+                pool.submit(Cliente(base, resultados).executar, email, projetos,
+                            opcoes["iteracoes"], opcoes["pdf_a_cada"], i)
+                for i, email in enumerate(emails)
+            ]
+            for tarefa in tarefas:
+                tarefa.result()
+        duracao = time.perf_counter() - inicio
+    finally:
+        got_request_exception.disconnect(resultados.excecao_no_servidor)
+    return resultados, duracao
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de carga do fluxo de revisão: sobe um servidor local num banco de teste semeado e "
+        "simula revisores simultâneos (login, abrir projeto, aprovar/reprovar, baixar PDF)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--usuarios", type=int, default=50, help="Revisores simultâneos.")
+        parser.add_argument("--iteracoes", type=int, default=10, help="Ciclos de revisão por revisor.")
+        parser.add_argument("--projetos", type=int, default=5)
+        parser.add_argument("--itens", type=int, default=200, help="Materiais por projeto.")
+        parser.add_argument("--pdf-a-cada", type=int, default=5, help="Baixa o PDF a cada N ciclos (0 = nunca).")
+        parser.add_argument("--com-throttle", action="store_true",
+                            help="Mantém os limites de taxa (por padrão desligados: todos vêm do mesmo IP).")
+        parser.add_argument("--limite-erros", type=float, default=None,
+                            help="Falha se a taxa de erros (%%) de algum cenário passar deste valor.")
+
+    def handle(self, *args, **opcoes):
+        if opcoes["usuarios"] < 1 or opcoes["projetos"] < 1 or opcoes["itens"] < 1:
+            raise CommandError("--usuarios, --projetos e --itens precisam ser maiores que zero.")
+
+        temporario = tempfile.TemporaryDirectory()
+        if connection.vendor == "sqlite":
+            # em arquivo, não em memória: cada thread do servidor abre a sua conexão,
+            # como os workers de verdade, e a disputa pelo lock de escrita aparece
+            connection.settings_dict["TEST"]["NAME"] = str(Path(temporario.name) / "carga.sqlite3")
+        setup_test_environment()
+        nome_original = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        sem_throttle = {} if opcoes["com_throttle"] else {
+            "REST_FRAMEWORK": {**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": {}},
+        }
+        servidor = None
+        nivel_log = logging.getLogger("django.request").level
+        try:
+            emails, projetos = semear(opcoes)
+            connection.close()
+
+            with override_settings(**sem_throttle):
+                servidor = _Servidor(("127.0.0.1", 0), _HandlerSilencioso, allow_reuse_address=False)
+                servidor.set_app(WSGIHandler())
+                threading.Thread(target=servidor.serve_forever, daemon=True).start()
+                # os 500 são contados no relatório; o traceback de cada um só atrapalharia a saída
+                logging.getLogger("django.request").setLevel(logging.CRITICAL)
+
+                self.stdout.write(f"{len(emails)} revisores x {opcoes['iteracoes']} ciclos em "
+                                  f"{len(projetos)} projetos de {opcoes['itens']} itens ({connection.vendor})")
+                resultados, duracao = executar_carga(f"http://127.0.0.1:{servidor.server_port}",
+                                                     emails, projetos, opcoes)
+        finally:
+            logging.getLogger("django.request").setLevel(nivel_log)
+            if servidor is not None:
+                servidor.shutdown()
+                servidor.server_close()
+            connection.creation.destroy_test_db(nome_original, verbosity=0)
+            teardown_test_environment()
+            temporario.cleanup()
+
+        self.relatorio(resultados, duracao, opcoes)
+
+    def relatorio(self, resultados, duracao, opcoes):
+        self.stdout.write(f"duração total: {duracao:.1f} s")
+        self.stdout.write(f"{'cenário':<15} {'req':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                          f"{'erros %':>8} {'locks':>6}  status")
+        acima = []
+        for cenario in CENARIOS:
+            tempos = resultados.tempos.get(cenario)
+            if not tempos:
+                continue
+            p50, p95, p99 = percentis(tempos)
+            erros = 100 * resultados.erros[cenario] / len(tempos)
+            codigos = " ".join(f"{c}:{n}" for c, n in sorted(resultados.status[cenario].items()))
+            self.stdout.write(
+                f"{cenario:<15} {len(tempos):>6} {len(tempos) / duracao:>8.1f} {p50 * 1000:>8.1f} "
+                f"{p95 * 1000:>8.1f} {p99 * 1000:>8.1f} {erros:>8.1f} {resultados.locks[cenario]:>6}  {codigos}"
+            )
+            if opcoes["limite_erros"] is not None and erros > opcoes["limite_erros"]:
+                acima.append(f"{cenario} ({erros:.1f}%)")
+
+        total = sum(len(t) for t in resultados.tempos.values())
+        self.stdout.write(f"total: {total} requisições, {total / duracao:.1f} req/s, "
+                          f"{sum(resultados.locks.values())} 'database is locked'")
+        if acima:
+            raise CommandError(f"Taxa de erros acima de {opcoes['limite_erros']}%: {', '.join(acima)}")
@@ -0,0 +1,29 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.atividade import recalcular
+
+
+def _data(valor):
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise CommandError(f"Data inválida: {valor} (use AAAA-MM-DD).")
+
+
+class Command(BaseCommand):
+    help = "Reconstrói o resumo diário de atividade (/api/stats/atividade/) a partir da tabela Log."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", default=None, help="Primeiro dia (AAAA-MM-DD); sem ele, desde o primeiro log.")
+        parser.add_argument("--ate", default=None, help="Último dia (AAAA-MM-DD); sem ele, até hoje.")
+
+    def handle(self, *args, **opcoes):
+        inicio = _data(opcoes["desde"]) if opcoes["desde"] else None
+        fim = _data(opcoes["ate"]) if opcoes["ate"] else None
+        if inicio and fim and inicio > fim:
+            raise CommandError("--desde deve ser anterior ou igual a --ate.")
+        linhas = recalcular(inicio, fim)
+        periodo = f"{inicio or 'início'} a {fim or 'hoje'}"
+        self.stdout.write(self.style.SUCCESS(f"{linhas} linha(s) de resumo gravadas ({periodo})."))
@@ -0,0 +1,74 @@
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+
+from api.models import Outbox
+
+
+class Command(BaseCommand):
+    help = "Entrega os e-mails pendentes da Outbox em lotes, reaproveitando uma conexão SMTP."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=settings.OUTBOX_LOTE)
+        parser.add_argument("--loop", action="store_true", help="Continua rodando e consultando a fila.")
+        parser.add_argument("--intervalo", type=float, default=5.0, help="Segundos entre consultas no modo --loop.")
+
+    def handle(self, *args, **opcoes):
+        while True:
+            enviados, falhas = self.processar_lote(opcoes["lote"])
+            if enviados or falhas:
+                self.stdout.write(f"{enviados} enviado(s), {falhas} falha(s)")
+            if not opcoes["loop"]:
+                break
+            # lote cheio: provavelmente tem mais na fila, não espera
+            if enviados + falhas < opcoes["lote"]:
+                time.sleep(opcoes["intervalo"])
+
+    def processar_lote(self, tamanho):
+        # reserva numa transação curta; o SMTP roda fora dela e cada mensagem é
+        # marcada assim que sai (um crash no meio não reenvia as já entregues)
+        mensagens = Outbox.reservar(tamanho, settings.OUTBOX_RESERVA_S)
+        if not mensagens:
+            return 0, 0
+
+        smtp = get_connection(fail_silently=False)
+        try:
+            smtp.open()
+        except Exception as exc:
+            # servidor fora: todo o lote volta para a fila com backoff
+            for msg in mensagens:
+                self.falhou(msg, exc)
+            return 0, len(mensagens)
+
+        enviados = falhas = 0
+        try:
+            for msg in mensagens:
+                email = EmailMessage(
+                    subject=msg.assunto,
+                    body=msg.corpo,
+                    from_email=msg.remetente or None,
+                    to=msg.destinatarios,
+                    connection=smtp,
+                )
+                try:
+                    email.send()
+                except Exception as exc:
+                    self.falhou(msg, exc)
+                    falhas += 1
+                else:
+                    msg.marcar_enviado()
+                    enviados += 1
+        finally:
+            smtp.close()
+        return enviados, falhas
+
+    def falhou(self, msg, erro):
+        msg.registrar_falha(
+            erro,
+            max_tentativas=settings.OUTBOX_MAX_TENTATIVAS,
+            backoff_base=settings.OUTBOX_BACKOFF_BASE,
+            backoff_max=settings.OUTBOX_BACKOFF_MAX,
+        )
+        self.stderr.write(f"Outbox #{msg.id}: {msg.ultimo_erro} (tentativa {msg.tentativas})")
@@ -0,0 +1,80 @@
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# roda num interpretador novo: o que já está carregado neste processo não conta
+SCRIPT = """
+import os, sys, time
+inicio = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(f"TOTAL_MS={(time.perf_counter() - inicio) * 1000:.1f}", file=sys.stderr)
+print("MODULOS=" + ",".join(sorted(sys.modules)), file=sys.stderr)
+"""
+
+LINHA_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def medir_inicializacao(importtime=False):
+    """
+    Mede `django.setup()` + carga das URLs num processo novo.
+    Retorna (total_ms, módulos carregados, [(módulo, próprio_us, acumulado_us, nível)]).
+    """
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "config.settings")}
+    comando = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c", SCRIPT]
+    proc = subprocess.run(comando, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise CommandError(proc.stderr[-2000:])
+
+    total, modulos, importacoes = None, set(), []
+    for linha in proc.stderr.splitlines():
+        if linha.startswith("TOTAL_MS="):
+            total = float(linha.split("=", 1)[1])
+        elif linha.startswith("MODULOS="):
+            modulos = set(linha.split("=", 1)[1].split(","))
+        else:
+            m = LINHA_IMPORTTIME.match(linha)
+            if m:
+                importacoes.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2))
+    return total, modulos, importacoes
+
+
+class Command(BaseCommand):
+    help = "Mostra o custo de import de cada módulo na inicialização (django.setup() + URLs)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=20)
+        parser.add_argument("--pacotes", action="store_true", help="Agrupa por pacote de primeiro nível.")
+
+    def handle(self, *args, **opcoes):
+        # -X importtime deixa tudo mais lento: o total vem de uma medição separada
+        total, modulos, _ = medir_inicializacao()
+        _, _, importacoes = medir_inicializacao(importtime=True)
+
+        if opcoes["pacotes"]:
+            por_pacote = defaultdict(int)
+            for modulo, proprio, _, _ in importacoes:
+                por_pacote[modulo.split(".")[0]] += proprio
+            linhas = sorted(por_pacote.items(), key=lambda x: -x[1])[:opcoes["top"]]
+            self.stdout.write(f"{'pacote':<40} {'ms':>8}")
+            for pacote, proprio in linhas:
+                self.stdout.write(f"{pacote:<40} {proprio / 1000:>8.1f}")
+        else:
+            linhas = sorted(importacoes, key=lambda x: -x[2])[:opcoes["top"]]
+            self.stdout.write(f"{'módulo':<50} {'próprio ms':>10} {'acumulado ms':>13}")
+            for modulo, proprio, acumulado, _ in linhas:
+                self.stdout.write(f"{modulo:<50} {proprio / 1000:>10.1f} {acumulado / 1000:>13.1f}")
+
+        self.stdout.write("")
+        self.stdout.write(f"django.setup() + URLs: {total:.1f} ms ({len(modulos)} módulos; "
+                          f"orçamento {settings.ORCAMENTO_INICIALIZACAO_MS} ms)")
+        pesados = sorted(m for m in modulos if m.split(".")[0] in settings.IMPORTS_SOB_DEMANDA)
+        if pesados:
+            self.stdout.write(self.style.WARNING(f"Carregados no boot, mas deveriam ser sob demanda: {', '.join(pesados[:10])}"))
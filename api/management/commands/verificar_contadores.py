@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import Projeto
+
+
+class Command(BaseCommand):
+    help = "Recalcula os contadores desnormalizados de Projeto e informa divergências."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--corrigir", action="store_true", help="Grava os valores recalculados.")
+
+    def handle(self, *args, **opcoes):
+        campos = Projeto.CAMPOS_CONTADORES
+        reais = Projeto.contar()
+        divergentes = 0
+
+        with transaction.atomic():
+            for projeto in Projeto.objects.only("id", "nome_do_projeto", *campos).order_by("id"):
+                esperado = reais.get(projeto.id, dict.fromkeys(campos, 0))
+                diff = {c: (getattr(projeto, c), esperado[c]) for c in campos if getattr(projeto, c) != esperado[c]}
+                if not diff:
+                    continue
+                divergentes += 1
+                detalhes = ", ".join(f"{c}: {salvo} -> {real}" for c, (salvo, real) in diff.items())
+                self.stdout.write(f"#{projeto.id} {projeto.nome_do_projeto}: {detalhes}")
+                if opcoes["corrigir"]:
+                    Projeto.objects.filter(pk=projeto.id).update(**esperado)
+
+        if not divergentes:
+            self.stdout.write(self.style.SUCCESS("Contadores consistentes."))
+        elif opcoes["corrigir"]:
+            self.stdout.write(self.style.SUCCESS(f"{divergentes} projeto(s) corrigido(s)."))
+        else:
+            self.stdout.write(self.style.WARNING(f"{divergentes} projeto(s) com divergência. Use --corrigir."))
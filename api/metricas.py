@@ -0,0 +1,449 @@
+"""
+Métricas no formato texto do Prometheus (`GET /metrics`).
+
+Cada processo soma em memória (dicts + um lock, sem I/O no caminho da
+requisição) e, no máximo a cada METRICAS_GRAVAR_S segundos, grava um retrato em
+METRICAS_DIR/metricas-<pid>.json. A coleta junta os arquivos de todos os
+workers do gunicorn: contadores e histogramas somam; gauges só contam
+processos vivos. Quando um worker sai (child_exit do gunicorn, ou a coleta
+que encontra o arquivo de um pid morto), os contadores e histogramas dele vão
+para metricas-mortos.json e o arquivo dele é apagado: com a reciclagem dos
+workers o diretório não cresce, e um pid reaproveitado não sobrescreve nada.
+Sem METRICAS_DIR (dev, um processo só) a coleta mostra apenas a memória do
+processo.
+
+- http_requisicoes_segundos / http_requisicoes_em_andamento: middleware, por rota
+  (respostas em streaming contam até o corpo terminar de sair);
+- db_consultas_total / db_consultas_segundos_total: execute_wrapper, por rota.
+  As conexões são por thread: o wrapper fica em todas (instalado quando cada
+  uma conecta) e soma no contador da requisição que está no contextvar, que o
+  sync_to_async leva junto para a thread onde a view roda em ASGI;
+- pdf_renderizacao_segundos: api/especificacao.py;
+- cache_acertos_total / cache_faltas_total (+ cache_taxa_acerto): lru_caches
+  registrados com `registrar_lru` e contagens manuais (`cache_acerto`);
+- login_verificacao_segundos: ModelBackendMedido (AUTHENTICATION_BACKENDS).
+"""
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+BUCKETS_HTTP = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_PDF = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# nome -> (tipo, ajuda, buckets)
+DEFINICOES = {
+    "http_requisicoes_segundos": ("histogram", "Duração das requisições por rota.", BUCKETS_HTTP),
+    "http_requisicoes_em_andamento": ("gauge", "Requisições sendo atendidas agora.", None),
+    "db_consultas_total": ("counter", "Consultas ao banco feitas pelas requisições, por rota.", None),
+    "db_consultas_segundos_total": ("counter", "Tempo gasto em consultas ao banco, por rota.", None),
+    "pdf_renderizacao_segundos": ("histogram", "Tempo de renderização de cada PDF de especificação.", BUCKETS_PDF),
+    "cache_acertos_total": ("counter", "Acertos dos caches em memória.", None),
+    "cache_faltas_total": ("counter", "Faltas dos caches em memória.", None),
+    "login_verificacao_segundos": ("histogram", "Verificação de e-mail e senha no login.", BUCKETS_HTTP),
+}
+
+
+class _Registro:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lrus = {}
+        self._zerar()
+
+    def _zerar(self):
+        self.pid = os.getpid()
+        self.valores = {}      # (nome, labels) -> float (counter/gauge)
+        self.histogramas = {}  # (nome, labels) -> [contagem por bucket..., +Inf, soma]
+        self.gravado_em = 0.0
+
+    def _conferir_fork(self):
+        # o master do gunicorn (preload) não atende requisições; o que o filho herdou não é dele
+        if self.pid != os.getpid():
+            self._zerar()
+
+    def somar(self, nome, valor=1, **labels):
+        chave = (nome, tuple(sorted(labels.items())))
+        with self._lock:
+            self._conferir_fork()
+            self.valores[chave] = self.valores.get(chave, 0) + valor
+
+    def observar(self, nome, valor, **labels):
+        buckets = DEFINICOES[nome][2]
+        chave = (nome, tuple(sorted(labels.items())))
+        with self._lock:
+            self._conferir_fork()
+            h = self.histogramas.get(chave)
+            if h is None:
+                h = self.histogramas[chave] = [0] * (len(buckets) + 2)
+            i = next((i for i, limite in enumerate(buckets) if valor <= limite), len(buckets))
+            h[i] += 1
+            h[-1] += valor
+
+    def registrar_lru(self, nome, funcao):
+        self._lrus[nome] = funcao
+
+    def retrato(self):
+        with self._lock:
+            self._conferir_fork()
+            valores = dict(self.valores)
+            histogramas = {k: list(v) for k, v in self.histogramas.items()}
+        for nome, funcao in self._lrus.items():
+            info = funcao.cache_info()
+            for metrica, qtd in (("cache_acertos_total", info.hits), ("cache_faltas_total", info.misses)):
+                chave = (metrica, (("cache", nome),))
+                valores[chave] = valores.get(chave, 0) + qtd
+        return {
+            "pid": self.pid,
+            "valores": [[n, list(l), v] for (n, l), v in valores.items()],
+            "histogramas": [[n, list(l), h] for (n, l), h in histogramas.items()],
+        }
+
+    def gravar(self, forcar=False):
+        diretorio = settings.METRICAS_DIR
+        agora = time.monotonic()
+        if not diretorio or (not forcar and agora - self.gravado_em < settings.METRICAS_GRAVAR_S):
+            return
+        self.gravado_em = agora
+        os.makedirs(diretorio, exist_ok=True)
+        _gravar_json(os.path.join(diretorio, f"metricas-{os.getpid()}.json"), self.retrato())
+
+
+def _gravar_json(destino, dados):
+    temporario = f"{destino}.tmp"
+    with open(temporario, "w") as f:
+        json.dump(dados, f, separators=(",", ":"))
+    os.replace(temporario, destino)
+
+
+registro = _Registro()
+somar = registro.somar
+observar = registro.observar
+registrar_lru = registro.registrar_lru
+
+
+def cache_acerto(nome, acertou):
+    somar("cache_acertos_total" if acertou else "cache_faltas_total", cache=nome)
+
+
+def _vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+ARQUIVO_MORTOS = "metricas-mortos.json"
+
+
+def _pid_do_arquivo(arquivo):
+    pid = arquivo[len("metricas-"):-len(".json")]
+    return int(pid) if arquivo.startswith("metricas-") and arquivo.endswith(".json") and pid.isdigit() else None
+
+
+def _somar_retrato(valores, histogramas, retrato):
+    for nome, labels, valor in retrato["valores"]:
+        if DEFINICOES[nome][0] != "gauge":  # o gauge de um processo morto não vale mais
+            chave = (nome, tuple(map(tuple, labels)))
+            valores[chave] = valores.get(chave, 0) + valor
+    for nome, labels, h in retrato["histogramas"]:
+        chave = (nome, tuple(map(tuple, labels)))
+        atual = histogramas.setdefault(chave, [0] * len(h))
+        histogramas[chave] = [a + b for a, b in zip(atual, h)]
+
+
+def consolidar(pid):
+    """Soma os contadores e histogramas do processo `pid` (que saiu) em ARQUIVO_MORTOS e apaga o arquivo dele."""
+    diretorio = settings.METRICAS_DIR
+    if not diretorio:
+        return
+    import fcntl  # só com METRICAS_DIR (gunicorn, Unix); o dev no Windows não passa por aqui
+
+    origem = os.path.join(diretorio, f"metricas-{pid}.json")
+    destino = os.path.join(diretorio, ARQUIVO_MORTOS)
+    # o master (child_exit) e as coletas dos workers podem consolidar o mesmo arquivo juntos
+    with open(os.path.join(diretorio, ".consolidacao.lock"), "w") as trava:
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        try:
+            with open(origem) as f:
+                morto = json.load(f)
+        except FileNotFoundError:
+            return  # já consolidado
+        except ValueError:
+            os.remove(origem)  # gravação interrompida: o retrato anterior já foi substituído
+            return
+        valores, histogramas = {}, {}
+        try:
+            with open(destino) as f:
+                _somar_retrato(valores, histogramas, json.load(f))
+        except FileNotFoundError:
+            pass
+        _somar_retrato(valores, histogramas, morto)
+        _gravar_json(destino, {
+            "pid": None,
+            "valores": [[n, list(l), v] for (n, l), v in valores.items()],
+            "histogramas": [[n, list(l), h] for (n, l), h in histogramas.items()],
+        })
+        os.remove(origem)
+
+
+def coletar():
+    """Retratos de todos os processos (ou só deste, sem METRICAS_DIR)."""
+    diretorio = settings.METRICAS_DIR
+    if not diretorio:
+        return [registro.retrato()]
+    registro.gravar(forcar=True)
+    for arquivo in os.listdir(diretorio):
+        pid = _pid_do_arquivo(arquivo)
+        if pid is not None and pid != os.getpid() and not _vivo(pid):
+            consolidar(pid)  # saiu sem passar pelo child_exit (fora do gunicorn, kill -9 no master)
+    retratos = []
+    for arquivo in sorted(os.listdir(diretorio)):
+        if arquivo == ARQUIVO_MORTOS or _pid_do_arquivo(arquivo) is not None:
+            try:
+                with open(os.path.join(diretorio, arquivo)) as f:
+                    retratos.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # processo gravando ou arquivo estragado: entra na próxima coleta
+    return retratos
+
+
+def _labels(pares, extra=()):
+    pares = [*pares, *extra]
+    if not pares:
+        return ""
+    texto = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                     for k, v in pares)
+    return "{" + texto + "}"
+
+
+def _numero(valor):
+    if valor == math.inf:
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) and not valor.is_integer() else str(int(valor))
+
+
+def renderizar(retratos):
+    valores, histogramas = {}, {}
+    for r in retratos:
+        vivo = r["pid"] is not None and (r["pid"] == os.getpid() or _vivo(r["pid"]))
+        for nome, labels, valor in r["valores"]:
+            if DEFINICOES[nome][0] == "gauge" and not vivo:
+                continue
+            chave = (nome, tuple(map(tuple, labels)))
+            valores[chave] = valores.get(chave, 0) + valor
+        for nome, labels, h in r["histogramas"]:
+            chave = (nome, tuple(map(tuple, labels)))
+            atual = histogramas.setdefault(chave, [0] * len(h))
+            histogramas[chave] = [a + b for a, b in zip(atual, h)]
+
+    linhas = []
+    for nome, (tipo, ajuda, buckets) in DEFINICOES.items():
+        linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}"]
+        if tipo == "histogram":
+            for (n, labels), h in sorted(histogramas.items()):
+                if n != nome:
+                    continue
+                acumulado = 0
+                for limite, qtd in zip((*buckets, math.inf), h[:-1]):
+                    acumulado += qtd
+                    linhas.append(f"{nome}_bucket{_labels(labels, [('le', _numero(limite))])} {acumulado}")
+                linhas.append(f"{nome}_sum{_labels(labels)} {_numero(h[-1])}")
+                linhas.append(f"{nome}_count{_labels(labels)} {acumulado}")
+        else:
+            for (n, labels), valor in sorted(valores.items()):
+                if n == nome:
+                    linhas.append(f"{nome}{_labels(labels)} {_numero(valor)}")
+
+    # razão pronta para quem olha sem PromQL
+    linhas += ["# HELP cache_taxa_acerto Acertos / (acertos + faltas) de cada cache.", "# TYPE cache_taxa_acerto gauge"]
+    for (n, labels), acertos in sorted(valores.items()):
+        if n == "cache_acertos_total":
+            total = acertos + valores.get(("cache_faltas_total", labels), 0)
+            linhas.append(f"cache_taxa_acerto{_labels(labels)} {_numero(acertos / total if total else 0.0)}")
+    return "\n".join(linhas) + "\n"
+
+
+def metricas_view(request):
+    token = settings.METRICAS_TOKEN
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponse(status=401)
+    return HttpResponse(renderizar(coletar()), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# ---------------- COLETA NAS REQUISIÇÕES ----------------
+class _ContadorConsultas:
+    def __init__(self):
+        self.consultas = 0
+        self.segundos = 0.0
+
+
+_consultas = contextvars.ContextVar("metricas_consultas", default=None)
+
+
+def _medir_consulta(execute, sql, params, many, context):
+    banco = _consultas.get()
+    if banco is None:  # fora de requisição (comandos, threads de fundo)
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        banco.consultas += 1
+        banco.segundos += time.perf_counter() - inicio
+
+
+def _instalar(conexao):
+    if _medir_consulta not in conexao.execute_wrappers:
+        conexao.execute_wrappers.append(_medir_consulta)
+
+
+def _conexao_criada(sender, connection, **kwargs):
+    _instalar(connection)
+
+
+connection_created.connect(_conexao_criada, dispatch_uid="metricas_consultas")
+
+
+def _rota(request):
+    match = getattr(request, "resolver_match", None)
+    # nome da view, não o caminho: /api/projetos/1/ e /api/projetos/2/ são a mesma série
+    return match.view_name if match else "nao_encontrada"
+
+
+class _Medicao:
+    """Uma requisição em andamento; `fechar` registra tudo uma vez só."""
+
+    def __init__(self, request):
+        # conexões abertas antes deste módulo ser importado não passaram pelo connection_created
+        for conexao in connections.all(initialized_only=True):
+            _instalar(conexao)
+        self.request = request
+        self.banco = _ContadorConsultas()
+        self.aberta = True
+        somar("http_requisicoes_em_andamento", 1)
+        self.inicio = time.perf_counter()
+
+    def fechar(self, resposta):
+        if not self.aberta:
+            return
+        self.aberta = False
+        duracao = time.perf_counter() - self.inicio
+        somar("http_requisicoes_em_andamento", -1)
+        rota = _rota(self.request)
+        codigo = resposta.status_code if resposta is not None else 500
+        observar("http_requisicoes_segundos", duracao, metodo=self.request.method, rota=rota,
+                 status=f"{codigo // 100}xx")
+        if self.banco.consultas:
+            somar("db_consultas_total", self.banco.consultas, rota=rota)
+            somar("db_consultas_segundos_total", self.banco.segundos, rota=rota)
+        registro.gravar()
+
+    def acompanhar(self, resposta):
+        """Fecha agora ou, em streaming, quando o corpo terminar de sair (ou o servidor fechar a resposta)."""
+        if not resposta.streaming:
+            self.fechar(resposta)
+        elif resposta.is_async:
+            resposta.streaming_content = self._corpo_async(resposta, resposta.streaming_content)
+        else:
+            resposta.streaming_content = _FechaAoTerminar(resposta.streaming_content, self, resposta)
+        return resposta
+
+    async def _corpo_async(self, resposta, conteudo):
+        # sem contextvar aqui: o servidor pode fechar o gerador a partir de outro
+        # Context (cancelamento), e o reset do token falharia
+        try:
+            async for parte in conteudo:
+                yield parte
+        finally:
+            self.fechar(resposta)
+
+
+class _FechaAoTerminar:
+    def __init__(self, conteudo, medicao, resposta):
+        self._conteudo = iter(conteudo)
+        self._medicao = medicao
+        self._resposta = resposta
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        # as consultas feitas enquanto o corpo é gerado contam para a rota
+        token = _consultas.set(self._medicao.banco)
+        try:
+            return next(self._conteudo)
+        except BaseException:
+            self.close()
+            raise
+        finally:
+            _consultas.reset(token)
+
+    def close(self):
+        self._medicao.fechar(self._resposta)
+        if hasattr(self._conteudo, "close"):
+            self._conteudo.close()
+
+
+class MetricasMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path == "/metrics":
+            return self.get_response(request)
+
+        medicao = _Medicao(request)
+        token = _consultas.set(medicao.banco)
+        try:
+            resposta = self.get_response(request)
+        except BaseException:
+            medicao.fechar(None)
+            raise
+        finally:
+            _consultas.reset(token)
+        return medicao.acompanhar(resposta)
+
+    async def __acall__(self, request):
+        if request.path == "/metrics":
+            return await self.get_response(request)
+
+        medicao = _Medicao(request)
+        token = _consultas.set(medicao.banco)
+        try:
+            resposta = await self.get_response(request)
+        except BaseException:
+            medicao.fechar(None)
+            raise
+        finally:
+            _consultas.reset(token)
+        return medicao.acompanhar(resposta)
+
+
+class ModelBackendMedido(ModelBackend):
+    """ModelBackend que mede a verificação de credenciais (o hash da senha domina o custo do login)."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        inicio = time.perf_counter()
+        usuario = super().authenticate(request, username=username, password=password, **kwargs)
+        observar("login_verificacao_segundos", time.perf_counter() - inicio,
+                 resultado="ok" if usuario else "falha")
+        return usuario
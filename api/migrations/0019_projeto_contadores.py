@@ -0,0 +1,65 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:45
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def preencher_contadores(apps, schema_editor):
+    Projeto = apps.get_model('api', 'Projeto')
+    MaterialSpec = apps.get_model('api', 'MaterialSpec')
+    Vinculo = Projeto.ambientes.through
+    por_status = {'PENDENTE': 'materiais_pendentes', 'APROVADO': 'materiais_aprovados', 'REPROVADO': 'materiais_reprovados'}
+    por_categoria = {'PRIVATIVA': 'ambientes_privativos', 'COMUM': 'ambientes_comuns', 'EXTERNA': 'ambientes_externos'}
+
+    valores = {}
+    for pid, status, qtd in (MaterialSpec.objects.filter(projeto__isnull=False).order_by()
+                             .values_list('projeto_id', 'status').annotate(qtd=Count('id'))):
+        if status in por_status:
+            valores.setdefault(pid, {})[por_status[status]] = qtd
+    for pid, categoria, qtd in (Vinculo.objects.order_by()
+                                .values_list('projeto_id', 'ambiente__categoria').annotate(qtd=Count('id'))):
+        if categoria in por_categoria:
+            valores.setdefault(pid, {})[por_categoria[categoria]] = qtd
+    for pid, campos in valores.items():
+        Projeto.objects.filter(pk=pid).update(**campos)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_remove_ambiente_esquadria_remove_ambiente_ferragem_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projeto',
+            name='ambientes_comuns',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='projeto',
+            name='ambientes_externos',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='projeto',
+            name='ambientes_privativos',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='projeto',
+            name='materiais_aprovados',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='projeto',
+            name='materiais_pendentes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='projeto',
+            name='materiais_reprovados',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(preencher_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Exclusao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(choices=[('MATERIAL', 'Material'), ('PROJETO', 'Projeto')], max_length=10)),
+                ('objeto_id', models.BigIntegerField()),
+                ('projeto_id', models.BigIntegerField(blank=True, null=True)),
+                ('excluido_em', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Exclusão',
+                'verbose_name_plural': 'Exclusões',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='materialspec',
+            index=models.Index(fields=['updated_at', 'id'], name='material_alteracao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materialspec',
+            index=models.Index(fields=['projeto', 'updated_at', 'id'], name='material_proj_alteracao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='projeto',
+            index=models.Index(fields=['data_atualizacao'], name='projeto_atualizacao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exclusao',
+            index=models.Index(fields=['modelo', 'excluido_em'], name='exclusao_modelo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exclusao',
+            index=models.Index(fields=['projeto_id', 'excluido_em'], name='exclusao_projeto_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:20
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_sincronizacao_incremental'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='usuario_email_busca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(django.db.models.functions.text.Lower('first_name'), name='usuario_nome_busca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(django.db.models.functions.text.Lower('last_name'), name='usuario_sobrenome_busca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(django.db.models.functions.text.Lower('username'), name='usuario_username_busca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(models.F('cargo'), django.db.models.functions.text.Lower('email'), name='usuario_cargo_email_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_diretorio_usuarios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projeto',
+            name='excluido_em',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='projeto',
+            name='exclusao_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:39
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_chave_idempotencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerfilRequisicao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metodo', models.CharField(max_length=10)),
+                ('rota', models.CharField(max_length=255)),
+                ('caminho', models.CharField(max_length=500)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('duracao_ms', models.FloatField()),
+                ('motivo', models.CharField(choices=[('CABECALHO', 'Pedido pelo cabeçalho'), ('AMOSTRAGEM', 'Amostragem')], max_length=10)),
+                ('perfil', models.BinaryField()),
+                ('criado_em', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Perfil de requisição',
+                'verbose_name_plural': 'Perfis de requisição',
+                'ordering': ['-criado_em'],
+            },
+        ),
+    ]
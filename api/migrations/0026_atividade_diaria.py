@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_perfil_requisicao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AtividadeDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('aprovacoes', models.PositiveIntegerField(default=0)),
+                ('reprovacoes', models.PositiveIntegerField(default=0)),
+                ('edicoes', models.PositiveIntegerField(default=0)),
+                ('decisoes_por_faixa', models.JSONField(default=list)),
+                ('projeto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.projeto')),
+                ('usuario', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Atividade diária',
+                'verbose_name_plural': 'Atividades diárias',
+                'constraints': [models.UniqueConstraint(fields=('dia', 'usuario', 'projeto'), name='atividade_dia_usuario_projeto_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_atividade_diaria'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outbox',
+            name='reserva',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='outbox',
+            name='reservado_ate',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='outbox',
+            name='status',
+            field=models.CharField(choices=[('PENDENTE', 'Pendente'), ('ENVIANDO', 'Enviando'), ('ENVIADO', 'Enviado'), ('FALHOU', 'Falhou')], default='PENDENTE', max_length=10),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_outbox_reserva'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('projeto_id', models.BigIntegerField()),
+                ('dados', models.JSONField(default=dict)),
+                ('criado_em', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Evento de status',
+                'verbose_name_plural': 'Eventos de status',
+                'indexes': [models.Index(fields=['projeto_id', 'id'], name='evento_projeto_idx')],
+            },
+        ),
+    ]
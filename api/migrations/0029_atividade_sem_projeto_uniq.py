@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:18
+
+from django.db import migrations, models
+
+
+def juntar_duplicadas(apps, schema_editor):
+    # sem a constraint, requisições simultâneas podiam criar mais de uma linha sem projeto
+    AtividadeDiaria = apps.get_model('api', 'AtividadeDiaria')
+    vistas = {}
+    for linha in AtividadeDiaria.objects.filter(projeto__isnull=True, usuario__isnull=False).order_by('id'):
+        chave = (linha.dia, linha.usuario_id)
+        destino = vistas.setdefault(chave, linha)
+        if destino is linha:
+            continue
+        for campo in ('aprovacoes', 'reprovacoes', 'edicoes'):
+            setattr(destino, campo, getattr(destino, campo) + getattr(linha, campo))
+        a, b = list(destino.decisoes_por_faixa), list(linha.decisoes_por_faixa)
+        if len(a) < len(b):
+            a, b = b, a
+        destino.decisoes_por_faixa = [x + (b[i] if i < len(b) else 0) for i, x in enumerate(a)]
+        destino.save()
+        linha.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0028_evento_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(juntar_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='atividadediaria',
+            constraint=models.UniqueConstraint(condition=models.Q(('projeto__isnull', True)), fields=('dia', 'usuario'), name='atividade_dia_usuario_sem_projeto_uniq'),
+        ),
+    ]
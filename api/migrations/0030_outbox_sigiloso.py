@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:32
+
+from django.db import migrations, models
+
+
+def marcar_senhas(apps, schema_editor):
+    # e-mails de senha redefinida já na fila: sigilosos, e sem corpo os que já saíram ou desistiram
+    Outbox = apps.get_model('api', 'Outbox')
+    senhas = Outbox.objects.filter(assunto='Sua senha foi redefinida')
+    senhas.update(sigiloso=True)
+    senhas.filter(status__in=['ENVIADO', 'FALHOU']).update(corpo='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0029_atividade_sem_projeto_uniq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outbox',
+            name='sigiloso',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(marcar_senhas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:34
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0030_outbox_sigiloso'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='atividadediaria',
+            name='atividade_dia_usuario_projeto_uniq',
+        ),
+        migrations.RemoveConstraint(
+            model_name='atividadediaria',
+            name='atividade_dia_usuario_sem_projeto_uniq',
+        ),
+        migrations.AddField(
+            model_name='atividadediaria',
+            name='projeto_chave',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Coalesce('projeto', models.Value(0)), output_field=models.BigIntegerField()),
+        ),
+        migrations.AddConstraint(
+            model_name='atividadediaria',
+            constraint=models.UniqueConstraint(fields=('dia', 'usuario', 'projeto_chave'), name='atividade_dia_usuario_chave_uniq'),
+        ),
+    ]
@@ -7,6 +7,11 @@ from django.conf import settings
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.db.models.signals import m2m_changed
+from django.db.models.functions import Coalesce, Greatest, Lower
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+from datetime import timedelta
 
 #Modelo de Usuário 
 class Usuario(AbstractUser):
@@ -21,10 +26,27 @@ class Usuario(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
+    class Meta(AbstractUser.Meta):
+        # diretório de usuários (?q= por prefixo, ?cargo=, keyset por e-mail):
+        # cada busca é uma faixa nesses índices de expressão
+        indexes = [
+            models.Index(Lower("email"), name="usuario_email_busca_idx"),
+            models.Index(Lower("first_name"), name="usuario_nome_busca_idx"),
+            models.Index(Lower("last_name"), name="usuario_sobrenome_busca_idx"),
+            models.Index(Lower("username"), name="usuario_username_busca_idx"),
+            models.Index(models.F("cargo"), Lower("email"), name="usuario_cargo_email_idx"),
+        ]
+
     def __str__(self):
         return self.email
 
 # modelo de Projeto / documento de criação / entidade central
+class ProjetosVisiveisManager(models.Manager):
+    """Esconde os projetos já excluídos cujos filhos ainda estão sendo apagados (ver exclusao_projetos)."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(excluido_em__isnull=True)
+
 
 
 class Ambiente(models.Model):
@@ -72,13 +94,94 @@ class Projeto(models.Model):
     # agora cada projeto pode ter vários ambientes genéricos
     ambientes = models.ManyToManyField(Ambiente, related_name="projetos", blank=True)
 
+    # contadores desnormalizados (mantidos pelas views; conferidos por `verificar_contadores`)
+    materiais_pendentes = models.PositiveIntegerField(default=0)
+    materiais_aprovados = models.PositiveIntegerField(default=0)
+    materiais_reprovados = models.PositiveIntegerField(default=0)
+    ambientes_privativos = models.PositiveIntegerField(default=0)
+    ambientes_comuns = models.PositiveIntegerField(default=0)
+    ambientes_externos = models.PositiveIntegerField(default=0)
+
+    # exclusão em segundo plano: o projeto some na hora e o `manage.py excluir_projetos` apaga os filhos
+    excluido_em = models.DateTimeField(null=True, blank=True, db_index=True)
+    exclusao_total = models.PositiveIntegerField(default=0)  # linhas filhas a apagar, para o progresso
+
+    objects = ProjetosVisiveisManager()
+    todos = models.Manager()
+
+    CONTADOR_POR_STATUS = {
+        'PENDENTE': 'materiais_pendentes',
+        'APROVADO': 'materiais_aprovados',
+        'REPROVADO': 'materiais_reprovados',
+    }
+    CONTADOR_POR_CATEGORIA = {
+        'PRIVATIVA': 'ambientes_privativos',
+        'COMUM': 'ambientes_comuns',
+        'EXTERNA': 'ambientes_externos',
+    }
+    CAMPOS_CONTADORES = [*CONTADOR_POR_STATUS.values(), *CONTADOR_POR_CATEGORIA.values()]
+
     class Meta:
         verbose_name = "Projeto"
         verbose_name_plural = "Projetos"
+        # sincronização incremental (/api/projetos/<id>/alteracoes/)
+        indexes = [models.Index(fields=['data_atualizacao'], name='projeto_atualizacao_idx')]
 
     def __str__(self):
         return self.nome_do_projeto
 
+    @classmethod
+    def ajustar_contadores(cls, projeto_id, de=None, para=None, quantidade=1):
+        """
+        Move `quantidade` materiais do status `de` para o status `para`
+        com um único UPDATE atômico (F()). Use de=None para criação e
+        para=None para exclusão.
+        """
+        if not projeto_id or de == para:
+            return
+        campos = {}
+        if de:
+            campo = cls.CONTADOR_POR_STATUS[de]
+            campos[campo] = Greatest(models.F(campo) - quantidade, 0)
+        if para:
+            campo = cls.CONTADOR_POR_STATUS[para]
+            campos[campo] = models.F(campo) + quantidade
+        # contadores fazem parte da linha do projeto: a sincronização incremental precisa ver a mudança
+        cls.objects.filter(pk=projeto_id).update(**campos, data_atualizacao=timezone.now())
+
+    @classmethod
+    def contar(cls, projeto_ids=None):
+        """Conta materiais e ambientes de verdade. Retorna {projeto_id: {campo: qtd}}."""
+        Vinculo = cls.ambientes.through
+        materiais = MaterialSpec.objects.filter(projeto__isnull=False)
+        vinculos = Vinculo.objects.all()
+        if projeto_ids is not None:
+            materiais = materiais.filter(projeto_id__in=projeto_ids)
+            vinculos = vinculos.filter(projeto_id__in=projeto_ids)
+        else:
+            projeto_ids = cls.objects.values_list("id", flat=True)
+
+        resultado = {pid: dict.fromkeys(cls.CAMPOS_CONTADORES, 0) for pid in projeto_ids}
+        for pid, status_, qtd in (materiais.order_by().values_list("projeto_id", "status")
+                                  .annotate(qtd=models.Count("id"))):
+            campo = cls.CONTADOR_POR_STATUS.get(status_)
+            if campo and pid in resultado:
+                resultado[pid][campo] = qtd
+        for pid, categoria, qtd in (vinculos.order_by().values_list("projeto_id", "ambiente__categoria")
+                                    .annotate(qtd=models.Count("id"))):
+            campo = cls.CONTADOR_POR_CATEGORIA.get(categoria)
+            if campo and pid in resultado:
+                resultado[pid][campo] = qtd
+        return resultado
+
+    @classmethod
+    def recalcular_contadores(cls, projeto_ids):
+        """Recalcula do zero os contadores dos projetos informados."""
+        agora = timezone.now()
+        for pid, valores in cls.contar(list(projeto_ids)).items():
+            # só toca (e marca como alterado) o projeto cujo contador estava diferente
+            cls.objects.filter(pk=pid).exclude(**valores).update(**valores, data_atualizacao=agora)
+
 class Log(models.Model):
     ACAO_CHOICES = [
         ('CRIACAO', 'Criação'),
@@ -183,6 +286,11 @@ class MaterialSpec(models.Model):
     class Meta:
         unique_together = ('projeto', 'ambiente', 'item')  # um item de cada tipo por ambiente
         ordering = ['ambiente_id', 'item']
+        # sincronização incremental: keyset por (updated_at, id), global e por projeto
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='material_alteracao_idx'),
+            models.Index(fields=['projeto', 'updated_at', 'id'], name='material_proj_alteracao_idx'),
+        ]
         verbose_name = 'Material do Ambiente'
         verbose_name_plural = 'Materiais do Ambiente'
 
@@ -192,4 +300,251 @@ class MaterialSpec(models.Model):
     def criar_descricao_marca_automatica(sender, instance, created, **kwargs):
         if not instance.descricao:
             return
-        desc = instance.descricao.lower()
\ No newline at end of file
+        desc = instance.descricao.lower()
+
+
+class Outbox(models.Model):
+    """
+    Fila durável de e-mails: a view só grava a linha (na mesma transação)
+    e o `manage.py send_outbox` entrega em lote, com nova tentativa e backoff.
+
+    O envio fica fora de transação: o worker primeiro reserva as linhas
+    (ENVIANDO, com prazo em `reservado_ate`) e marca cada uma ao terminar. Se
+    o worker morrer no meio, só as linhas ainda reservadas voltam para a fila
+    quando o prazo vence.
+
+    Mensagens `sigiloso` (ex.: nova senha) têm o corpo apagado quando a linha
+    chega a ENVIADO ou FALHOU: o segredo não fica no banco nem nos backups.
+    """
+    STATUS_CHOICES = [
+        ('PENDENTE', 'Pendente'),
+        ('ENVIANDO', 'Enviando'),
+        ('ENVIADO', 'Enviado'),
+        ('FALHOU', 'Falhou'),
+    ]
+
+    assunto = models.CharField(max_length=255)
+    corpo = models.TextField()
+    sigiloso = models.BooleanField(default=False)
+    remetente = models.CharField(max_length=255, blank=True)
+    destinatarios = models.JSONField(default=list)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDENTE')
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    proxima_tentativa = models.DateTimeField(default=timezone.now)
+    ultimo_erro = models.TextField(blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    enviado_em = models.DateTimeField(null=True, blank=True)
+    reserva = models.CharField(max_length=32, blank=True)  # quem reservou (um por chamada de `reservar`)
+    reservado_ate = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "E-mail na fila"
+        verbose_name_plural = "Fila de e-mails"
+        indexes = [models.Index(fields=['status', 'proxima_tentativa'], name='outbox_fila_idx')]
+
+    def __str__(self):
+        return f"{self.assunto} -> {', '.join(self.destinatarios)} ({self.status})"
+
+    @classmethod
+    def enfileirar(cls, assunto, corpo, destinatarios, remetente="", sigiloso=False):
+        if isinstance(destinatarios, str):
+            destinatarios = [destinatarios]
+        # sem remetente (DEFAULT_FROM_EMAIL vazio): o envio usa o padrão do Django
+        return cls.objects.create(assunto=assunto, corpo=corpo, destinatarios=list(destinatarios),
+                                  remetente=remetente or "", sigiloso=sigiloso)
+
+    @classmethod
+    def reservar(cls, tamanho, prazo_s):
+        """
+        Reserva até `tamanho` mensagens prontas para envio (ou com reserva
+        vencida) e as devolve. O UPDATE condicional garante que dois workers
+        nunca ficam com a mesma linha, mesmo sem SKIP LOCKED (SQLite).
+        """
+        agora = timezone.now()
+        disponiveis = (models.Q(status='PENDENTE', proxima_tentativa__lte=agora)
+                       | models.Q(status='ENVIANDO', reservado_ate__lt=agora))
+        token = get_random_string(32)
+        with transaction.atomic():
+            fila = cls.objects.filter(disponiveis)
+            if connection.features.has_select_for_update_skip_locked:
+                # vários workers: cada um olha linhas diferentes
+                fila = fila.select_for_update(skip_locked=True)
+            ids = list(fila.order_by("proxima_tentativa", "id").values_list("id", flat=True)[:tamanho])
+            if not ids:
+                return []
+            cls.objects.filter(disponiveis, pk__in=ids).update(
+                status='ENVIANDO', reserva=token, reservado_ate=agora + timedelta(seconds=prazo_s),
+            )
+        return list(cls.objects.filter(reserva=token, status='ENVIANDO').order_by("proxima_tentativa", "id"))
+
+    def marcar_enviado(self):
+        self.status = 'ENVIADO'
+        self.enviado_em = timezone.now()
+        self.ultimo_erro = ''
+        self.reservado_ate = None
+        self.save(update_fields=['status', 'enviado_em', 'ultimo_erro', 'reservado_ate', *self._descartar_corpo()])
+
+    def _descartar_corpo(self):
+        """Apaga o corpo de mensagem sigilosa que não será mais enviada; devolve os campos alterados."""
+        if not self.sigiloso:
+            return []
+        self.corpo = ''
+        return ['corpo']
+
+    def registrar_falha(self, erro, max_tentativas, backoff_base, backoff_max):
+        """Agenda nova tentativa com backoff exponencial; desiste após `max_tentativas`."""
+        self.tentativas += 1
+        self.ultimo_erro = f"{type(erro).__name__}: {erro}"[:2000]
+        self.reservado_ate = None
+        campos = ['tentativas', 'ultimo_erro', 'status', 'proxima_tentativa', 'reservado_ate']
+        if self.tentativas >= max_tentativas:
+            self.status = 'FALHOU'
+            campos += self._descartar_corpo()
+        else:
+            self.status = 'PENDENTE'
+            espera = min(backoff_base * 2 ** (self.tentativas - 1), backoff_max)
+            self.proxima_tentativa = timezone.now() + timedelta(seconds=espera)
+        self.save(update_fields=campos)
+
+
+class Exclusao(models.Model):
+    """
+    Lápide de linha apagada: a sincronização incremental (`.../alteracoes/`)
+    avisa o cliente do que sumiu. Gravada pelos sinais de post_delete.
+    """
+    MODELO_CHOICES = [
+        ('MATERIAL', 'Material'),
+        ('PROJETO', 'Projeto'),
+    ]
+
+    modelo = models.CharField(max_length=10, choices=MODELO_CHOICES)
+    objeto_id = models.BigIntegerField()
+    projeto_id = models.BigIntegerField(null=True, blank=True)  # sem FK: o projeto pode ter sido apagado junto
+    excluido_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Exclusão"
+        verbose_name_plural = "Exclusões"
+        indexes = [
+            models.Index(fields=['modelo', 'excluido_em'], name='exclusao_modelo_idx'),
+            models.Index(fields=['projeto_id', 'excluido_em'], name='exclusao_projeto_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.modelo} #{self.objeto_id} em {self.excluido_em:%d/%m/%Y %H:%M}"
+
+
+class EventoStatus(models.Model):
+    """
+    Evento de status publicado para o SSE (ver api/eventos.py, BrokerBanco).
+    A tabela é o canal entre os workers: quem aprova grava, e cada processo
+    com conexões abertas lê os novos. Limpa por `manage.py limpar_eventos`.
+    """
+    projeto_id = models.BigIntegerField()  # sem FK: o evento pode sobreviver ao projeto
+    dados = models.JSONField(default=dict)
+    criado_em = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = "Evento de status"
+        verbose_name_plural = "Eventos de status"
+        indexes = [
+            models.Index(fields=['projeto_id', 'id'], name='evento_projeto_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} projeto {self.projeto_id}"
+
+
+class ChaveIdempotencia(models.Model):
+    """
+    Primeira resposta de um POST com `Idempotency-Key`, por usuário e chave.
+    Uma nova tentativa com a mesma chave recebe essa resposta sem rodar a view
+    de novo (ver api/idempotencia.py). Vale por IDEMPOTENCIA_TTL_HORAS.
+    """
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    chave = models.CharField(max_length=255)
+    requisicao = models.CharField(max_length=64)  # sha256 de método, caminho e corpo
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)  # None = ainda processando
+    resposta = models.JSONField(null=True, blank=True)
+    criada_em = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = "Chave de idempotência"
+        verbose_name_plural = "Chaves de idempotência"
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'chave'], name='idempotencia_usuario_chave_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario_id}:{self.chave} ({self.status_code or 'processando'})"
+
+    @property
+    def expirada(self):
+        return self.criada_em < timezone.now() - timedelta(hours=settings.IDEMPOTENCIA_TTL_HORAS)
+
+    @property
+    def abandonada(self):
+        """Ainda "processando" depois do prazo: o worker que reservou morreu sem responder."""
+        return (self.status_code is None
+                and self.criada_em < timezone.now() - timedelta(seconds=settings.IDEMPOTENCIA_RESERVA_S))
+
+
+class PerfilRequisicao(models.Model):
+    """
+    Perfil cProfile de uma requisição (api/perfilamento.py), pedido pelo
+    cabeçalho X-Perfilar ou sorteado por PERFIL_AMOSTRAGEM. Visto no admin.
+    """
+    MOTIVO_CHOICES = [
+        ('CABECALHO', 'Pedido pelo cabeçalho'),
+        ('AMOSTRAGEM', 'Amostragem'),
+    ]
+
+    metodo = models.CharField(max_length=10)
+    rota = models.CharField(max_length=255)  # padrão da URL (ex.: api/projetos/<pk>/)
+    caminho = models.CharField(max_length=500)
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    status_code = models.PositiveSmallIntegerField()
+    duracao_ms = models.FloatField()
+    motivo = models.CharField(max_length=10, choices=MOTIVO_CHOICES)
+    perfil = models.BinaryField()  # pstats (marshal) comprimido com zlib
+    criado_em = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = "Perfil de requisição"
+        verbose_name_plural = "Perfis de requisição"
+        ordering = ['-criado_em']
+
+    def __str__(self):
+        return f"{self.metodo} {self.rota} ({self.duracao_ms:.0f} ms)"
+
+
+class AtividadeDiaria(models.Model):
+    """
+    Resumo diário da atividade de revisão (api/atividade.py): por dia, usuário
+    e projeto, quantas aprovações, reprovações e edições os logs registraram e o
+    histograma do tempo até a decisão. Mantido a cada Log gravado; o
+    `manage.py recalcular_atividade` reconstrói a partir dos logs.
+    """
+    dia = models.DateField()
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, on_delete=models.SET_NULL, related_name='+')
+    projeto = models.ForeignKey('Projeto', null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    aprovacoes = models.PositiveIntegerField(default=0)
+    reprovacoes = models.PositiveIntegerField(default=0)
+    edicoes = models.PositiveIntegerField(default=0)
+    # decisões por faixa de atividade.FAIXAS_DECISAO_S (a última é "acima da maior")
+    decisoes_por_faixa = models.JSONField(default=list)
+    # projeto com 0 no lugar de NULL, para a chave única: NULL nunca colide, e o MySQL
+    # não tem UniqueConstraint com condição (as linhas sem projeto ficariam sem chave)
+    projeto_chave = models.GeneratedField(expression=Coalesce('projeto', models.Value(0)),
+                                          output_field=models.BigIntegerField(), db_persist=True)
+
+    class Meta:
+        verbose_name = "Atividade diária"
+        verbose_name_plural = "Atividades diárias"
+        constraints = [
+            models.UniqueConstraint(fields=['dia', 'usuario', 'projeto_chave'], name='atividade_dia_usuario_chave_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.dia} {self.usuario_id}/{self.projeto_id}: +{self.aprovacoes} -{self.reprovacoes}"
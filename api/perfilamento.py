@@ -0,0 +1,161 @@
+"""
+Perfilamento de requisições em produção (cProfile).
+
+Uma requisição da API é perfilada quando:
+- traz `X-Perfilar: 1` e vem de um gerente/superadmin (JWT ou sessão do admin);
+- ou cai na amostragem (PERFIL_AMOSTRAGEM, fração de 0 a 1; 0 desliga).
+
+O perfil vai comprimido para `PerfilRequisicao`, com rota, usuário e duração, e
+o id volta no cabeçalho `X-Perfil-Id`. No admin aparece como tabela dos
+PERFIL_TOP_N maiores tempos acumulados, com o `.prof` para baixar (abre com
+`python -m pstats` ou snakeviz). O corpo de respostas em streaming é gerado
+depois do middleware e fica fora do perfil.
+
+Em ASGI a view síncrona é perfilada na thread em que roda; views async não são
+perfiladas (o cProfile mede uma thread, e a do loop é de todas as requisições).
+"""
+import cProfile
+import io
+import logging
+import marshal
+import pstats
+import random
+import time
+import zlib
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .models import PerfilRequisicao
+from .permissions import role
+
+logger = logging.getLogger(__name__)
+
+CABECALHO = "X-Perfilar"
+
+
+def _pode_pedir(request):
+    usuario = getattr(request, "user", None)
+    if not (usuario and usuario.is_authenticated):
+        # a API autentica por JWT só dentro da view; aqui é preciso olhar o token
+        try:
+            autenticado = JWTAuthentication().authenticate(request)
+        except APIException:
+            return False
+        usuario = autenticado[0] if autenticado else None
+    return bool(usuario) and role(usuario) in {"gerente", "superadmin", "admin"}
+
+
+def comprimir(perfil):
+    return zlib.compress(marshal.dumps(pstats.Stats(perfil).stats))
+
+
+def arquivo_prof(dados):
+    """Bytes no formato do `Stats.dump_stats` (o que pstats/snakeviz leem)."""
+    return zlib.decompress(dados)
+
+
+def carregar(dados):
+    stats = pstats.Stats(stream=io.StringIO())
+    stats.stats = marshal.loads(arquivo_prof(dados))
+    stats.get_top_level_stats()
+    return stats
+
+
+def top_funcoes(dados, n=None):
+    """[(acumulado_ms, proprio_ms, chamadas, função)] pelo tempo acumulado."""
+    linhas = [
+        (ct * 1000, tt * 1000, nc, pstats.func_std_string(func))
+        for func, (cc, nc, tt, ct, callers) in carregar(dados).stats.items()
+    ]
+    linhas.sort(key=lambda l: -l[0])
+    return linhas[:n or settings.PERFIL_TOP_N]
+
+
+def salvar(request, resposta, perfil, duracao_ms, motivo):
+    usuario = getattr(request, "user", None)  # o DRF repassa o usuário do JWT ao HttpRequest
+    match = request.resolver_match
+    registro = PerfilRequisicao.objects.create(
+        metodo=request.method,
+        rota=(match.route if match else "")[:255],
+        caminho=request.get_full_path()[:500],
+        usuario=usuario if usuario and usuario.is_authenticated else None,
+        status_code=resposta.status_code,
+        duracao_ms=duracao_ms,
+        motivo=motivo,
+        perfil=comprimir(perfil),
+    )
+    limite = timezone.now() - timedelta(days=settings.PERFIL_RETENCAO_DIAS)
+    PerfilRequisicao.objects.filter(criado_em__lt=limite).delete()
+    return registro
+
+
+def _view_assincrona(request):
+    try:
+        match = resolve(request.path_info, getattr(request, "urlconf", None))
+    except Resolver404:
+        return False
+    return iscoroutinefunction(match.func)
+
+
+class PerfilamentoMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _motivo(self, request):
+        """Por que perfilar: "CABECALHO" (falta conferir quem pediu), "AMOSTRAGEM" ou None."""
+        if not request.path.startswith("/api/"):
+            return None
+        if request.headers.get(CABECALHO) == "1":
+            return "CABECALHO"
+        if settings.PERFIL_AMOSTRAGEM and random.random() < settings.PERFIL_AMOSTRAGEM:
+            return "AMOSTRAGEM"
+        return None
+
+    def _perfilar(self, request, motivo, get_response):
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:  # outro profiler já ativo neste processo
+            return get_response(request)
+        inicio = time.perf_counter()
+        try:
+            resposta = get_response(request)
+        finally:
+            perfil.disable()
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+
+        try:
+            resposta["X-Perfil-Id"] = str(salvar(request, resposta, perfil, duracao_ms, motivo).pk)
+        except Exception:
+            # perfilar nunca pode derrubar a requisição
+            logger.exception("Falha ao gravar o perfil de %s", request.path)
+        return resposta
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        motivo = self._motivo(request)
+        if motivo is None or (motivo == "CABECALHO" and not _pode_pedir(request)):
+            return self.get_response(request)
+        return self._perfilar(request, motivo, self.get_response)
+
+    async def __acall__(self, request):
+        motivo = self._motivo(request)
+        if motivo == "CABECALHO" and not await sync_to_async(_pode_pedir)(request):  # o JWT busca o usuário
+            motivo = None
+        if motivo is None or _view_assincrona(request):
+            return await self.get_response(request)
+        # o resto da cadeia chamado por async_to_sync de dentro desta thread: o
+        # sync_to_async que o Django usa para a view síncrona roda nela, a perfilada
+        return await sync_to_async(self._perfilar)(request, motivo, async_to_sync(self.get_response))
@@ -33,6 +33,11 @@ class AllowWriteForManagerUp(BasePermission):
             return True
         return role(request.user) in {"gerente", "superadmin", "admin"}
 
+class ManagerUpOnly(BasePermission):
+    """Somente gerente/superadmin, inclusive para leitura (relatórios da equipe)."""
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated) and role(request.user) in {"gerente", "superadmin", "admin"}
+
 class OnlySuperadminDelete(BasePermission):
     """Para usar especificamente na ação destroy (delete)."""
     def has_permission(self, request, view):
@@ -0,0 +1,74 @@
+from rest_framework.compat import INDENT_SEPARATORS, LONG_SEPARATORS, SHORT_SEPARATORS
+from rest_framework.renderers import JSONRenderer
+
+
+class ListaSobDemanda(list):
+    """
+    Lista "preguiçosa": cada item é serializado só quando o encoder chega nele.
+
+    Só funciona com o encoder em Python (`iterencode`), que percorre a lista
+    com `for`. O encoder em C lê o armazenamento interno da list, que aqui
+    fica vazio — por isso ela só é usada no caminho de streaming.
+    """
+
+    def __init__(self, itens, serializar):
+        super().__init__()
+        self._fonte = iter(itens)
+        self._serializar = serializar
+        self._primeiro = None
+        self._vazia = None
+
+    def __bool__(self):
+        # o encoder pergunta `if not lista` antes de iterar: espia o 1º item
+        if self._vazia is None:
+            try:
+                self._primeiro = next(self._fonte)
+                self._vazia = False
+            except StopIteration:
+                self._vazia = True
+        return not self._vazia
+
+    def __iter__(self):
+        if not self:
+            return
+        yield self._serializar(self._primeiro)
+        for obj in self._fonte:
+            yield self._serializar(obj)
+
+
+class StreamingJSONRenderer(JSONRenderer):
+    """
+    Mesmos bytes do JSONRenderer. `render()` continua igual (encoder em C);
+    `render_chunks()` gera o JSON em pedaços de ~`tamanho_chunk` bytes para
+    uma StreamingHttpResponse.
+    """
+    tamanho_chunk = 64 * 1024
+
+    def render_chunks(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return
+
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+
+        if indent is None:
+            separators = SHORT_SEPARATORS if self.compact else LONG_SEPARATORS
+        else:
+            separators = INDENT_SEPARATORS
+
+        encoder = self.encoder_class(
+            indent=indent, ensure_ascii=self.ensure_ascii,
+            allow_nan=not self.strict, separators=separators
+        )
+
+        buffer, tamanho = [], 0
+        for pedaco in encoder.iterencode(data):
+            # mesmo escape do JSONRenderer (cada pedaço é um token inteiro)
+            pedaco = pedaco.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+            buffer.append(pedaco)
+            tamanho += len(pedaco)
+            if tamanho >= self.tamanho_chunk:
+                yield ''.join(buffer).encode()
+                buffer, tamanho = [], 0
+        if buffer:
+            yield ''.join(buffer).encode()
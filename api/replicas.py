@@ -0,0 +1,168 @@
+"""
+Leitura em réplica.
+
+Com um alias `replica` em settings.DATABASES (ver REPLICA_* no settings), as
+requisições GET/HEAD/OPTIONS da API leem da réplica; escritas e o resto do
+site (admin etc.) continuam no `default`.
+
+- read-your-writes: depois de um POST/PUT/PATCH/DELETE na API as leituras de
+  quem escreveu ficam no primário por REPLICA_FIXAR_PRIMARIO_S segundos (o
+  atraso de replicação esperado). Vale pelo cookie `ler_primario` e pelo id do
+  usuário no cache REPLICA_CACHE, lido do JWT sem ir ao banco (apps e clientes
+  que não guardam cookie);
+- réplica fora do ar: se a conexão falhar, as leituras voltam ao primário e a
+  réplica só é tentada de novo depois de REPLICA_NOVA_TENTATIVA_S segundos.
+"""
+import contextvars
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+logger = logging.getLogger(__name__)
+
+COOKIE = "ler_primario"
+METODOS_SEGUROS = ("GET", "HEAD", "OPTIONS")
+
+_ler_da_replica = contextvars.ContextVar("ler_da_replica", default=False)
+_fora_ate = 0.0  # time.monotonic() até quando a réplica é considerada fora
+
+
+def replica_configurada():
+    return settings.REPLICA_ALIAS in connections.settings
+
+
+def replica_disponivel():
+    global _fora_ate
+    if time.monotonic() < _fora_ate:
+        return False
+    try:
+        connections[settings.REPLICA_ALIAS].ensure_connection()
+    except DatabaseError as exc:
+        _fora_ate = time.monotonic() + settings.REPLICA_NOVA_TENTATIVA_S
+        logger.warning("Réplica indisponível, lendo do primário por %ss: %s", settings.REPLICA_NOVA_TENTATIVA_S, exc)
+        return False
+    return True
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return settings.REPLICA_ALIAS if _ler_da_replica.get() else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # sem isso o Django gravaria no banco de onde a instância foi lida
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        bancos = {DEFAULT_DB_ALIAS, settings.REPLICA_ALIAS}
+        if obj1._state.db in bancos and obj2._state.db in bancos:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # o schema chega na réplica pela replicação
+        return db != settings.REPLICA_ALIAS
+
+
+def _na_replica(conteudo):
+    # o corpo de um StreamingHttpResponse é gerado depois que o middleware já retornou
+    token = _ler_da_replica.set(True)
+    try:
+        yield from conteudo
+    finally:
+        _ler_da_replica.reset(token)
+
+
+async def _na_replica_async(conteudo):
+    token = _ler_da_replica.set(True)
+    try:
+        async for parte in conteudo:
+            yield parte
+    finally:
+        _ler_da_replica.reset(token)
+
+
+_jwt = JWTAuthentication()
+
+
+def _chave(usuario_id):
+    return f"ler_primario:{usuario_id}"
+
+
+def _usuario_do_token(request):
+    """Id do usuário pelo cabeçalho Authorization, só validando a assinatura do JWT (sem banco)."""
+    cabecalho = _jwt.get_header(request)
+    bruto = _jwt.get_raw_token(cabecalho) if cabecalho else None
+    if bruto is None:
+        return None
+    try:
+        return _jwt.get_validated_token(bruto).get(jwt_settings.USER_ID_CLAIM)
+    except (InvalidToken, TokenError):
+        return None
+
+
+class LeituraReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _usar_replica(self, request):
+        if request.method not in METODOS_SEGUROS or COOKIE in request.COOKIES:
+            return False
+        usuario_id = _usuario_do_token(request)
+        if usuario_id is not None and caches[settings.REPLICA_CACHE].get(_chave(usuario_id)):
+            return False
+        return replica_disponivel()
+
+    def _concluir(self, request, resposta, usar):
+        if usar and resposta.streaming:
+            conteudo = resposta.streaming_content
+            resposta.streaming_content = _na_replica_async(conteudo) if resposta.is_async else _na_replica(conteudo)
+        if request.method not in METODOS_SEGUROS:
+            # o DRF já autenticou e deixou o usuário no HttpRequest
+            usuario = getattr(request, "user", None)
+            if usuario is not None and usuario.is_authenticated:
+                caches[settings.REPLICA_CACHE].set(_chave(usuario.pk), True, settings.REPLICA_FIXAR_PRIMARIO_S)
+            resposta.set_cookie(
+                COOKIE, "1", max_age=settings.REPLICA_FIXAR_PRIMARIO_S, httponly=True,
+                # o front em outro domínio só manda o cookie com SameSite=None (que exige HTTPS)
+                samesite="Lax" if settings.DEBUG else "None", secure=not settings.DEBUG,
+            )
+        return resposta
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not request.path.startswith("/api/") or not replica_configurada():
+            return self.get_response(request)
+
+        usar = self._usar_replica(request)
+        token = _ler_da_replica.set(usar)
+        try:
+            resposta = self.get_response(request)
+        finally:
+            _ler_da_replica.reset(token)
+        return self._concluir(request, resposta, usar)
+
+    async def __acall__(self, request):
+        if not request.path.startswith("/api/") or not replica_configurada():
+            return await self.get_response(request)
+
+        # a conexão de teste com a réplica e o cache são síncronos
+        usar = await sync_to_async(self._usar_replica)(request)
+        token = _ler_da_replica.set(usar)
+        try:
+            resposta = await self.get_response(request)
+        finally:
+            _ler_da_replica.reset(token)
+        return await sync_to_async(self._concluir)(request, resposta, usar)
@@ -2,7 +2,13 @@ from rest_framework import serializers
 from .models import Usuario, Projeto, Ambiente, Log, ModeloDocumento, MaterialSpec, TipoAmbiente, Marca, DescricaoMarca
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth import authenticate
+import re
 import unicodedata
+from functools import lru_cache
+
+from django.utils.encoding import force_str
+
+from .renderers import ListaSobDemanda
 
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
@@ -50,6 +56,15 @@ class UsuarioSerializer(serializers.ModelSerializer):
         return instance
 
 
+class UsuarioResumoSerializer(serializers.ModelSerializer):
+    """Payload compacto do diretório (`?campos=min`), para seletores de usuário."""
+    nome = serializers.CharField(source="get_full_name", read_only=True)
+
+    class Meta:
+        model = Usuario
+        fields = ['id', 'email', 'nome', 'cargo']
+
+
 class TipoAmbienteSerializer(serializers.ModelSerializer):
     class Meta:
         model = TipoAmbiente
@@ -108,6 +123,26 @@ class DescricaoMarcaSalvarSerializer(serializers.Serializer):
         return obj
 
 
+class ItensEmMassaSerializer(serializers.Serializer):
+    """Corpo do POST /api/projetos/<id>/itens-em-massa/ (ver ProjetoViewSet.itens_em_massa)."""
+    SELETORES = ("ambientes", "categoria", "tipo")
+
+    item = serializers.CharField(max_length=MaterialSpec._meta.get_field("item").max_length)
+    descricao = serializers.CharField(allow_blank=True, default="", trim_whitespace=False)
+    marca = serializers.PrimaryKeyRelatedField(queryset=Marca.objects.all(), required=False, allow_null=True)
+    ambientes = serializers.ListField(child=serializers.IntegerField(), required=False)
+    categoria = serializers.ChoiceField(choices=Ambiente.CATEGORIA_CHOICES, required=False, allow_blank=True)
+    tipo = serializers.IntegerField(required=False, allow_null=True)
+    existentes = serializers.ChoiceField(choices=["pular", "sobrescrever"], default="pular")
+
+    def validate(self, dados):
+        seletores = [k for k in self.SELETORES if dados.get(k) not in (None, "", [])]
+        if len(seletores) != 1:
+            raise serializers.ValidationError("Informe exatamente um entre 'ambientes', 'categoria' e 'tipo'.")
+        dados["seletor"] = seletores[0]
+        return dados
+
+
 class MaterialSpecSerializer(serializers.ModelSerializer):
     aprovador_email = serializers.EmailField(source='aprovador.email', read_only=True)
     item_label = serializers.CharField(source='get_item_display', read_only=True)
@@ -124,6 +159,98 @@ class MaterialSpecSerializer(serializers.ModelSerializer):
         read_only_fields = ['aprovador', 'aprovador_email', 'data_aprovacao', 'updated_at']
 
 
+# Colunas que o MaterialSpecSerializer realmente lê (inclusive pelos joins).
+CAMPOS_MATERIAL_SERIALIZER = [
+    "id", "projeto_id", "ambiente_id", "item", "descricao", "marca_id", "status", "motivo",
+    "aprovador_id", "data_aprovacao", "updated_at",
+    "ambiente__nome_do_ambiente", "ambiente__categoria", "marca__nome", "aprovador__email",
+]
+
+
+def materiais_para_serializer(qs=None):
+    """MaterialSpec com os joins e colunas exigidos pelo MaterialSpecSerializer."""
+    qs = MaterialSpec.objects.all() if qs is None else qs
+    return (qs.select_related("ambiente", "marca", "aprovador")
+              .only(*CAMPOS_MATERIAL_SERIALIZER)
+              .order_by("ambiente_id", "item"))
+
+
+class LeituraRapida:
+    """
+    Serialização somente-leitura a partir de .values_list(), sem instanciar
+    modelos nem resolver `source=` pontilhado linha a linha.
+
+    O mapa de campos é calculado uma vez a partir do serializer `base`, então
+    a saída é a mesma (chaves, ordem e valores): campo com FK nula no meio do
+    caminho é omitido, como o SkipField do DRF; método inexistente (ex.:
+    get_item_display sem choices) também; `get_X_display` com choices é
+    resolvido pelo dicionário de choices.
+    """
+    base = None
+
+    def __init__(self):
+        self.colunas = []
+        self.plano = []  # (chave, índice da coluna, índices das FKs do caminho, conversor)
+        modelo = self.base.Meta.model
+        for nome, field in self.base().fields.items():
+            if field.write_only:
+                continue
+            self._planejar(modelo, nome, field)
+
+    def _coluna(self, lookup):
+        if lookup not in self.colunas:
+            self.colunas.append(lookup)
+        return self.colunas.index(lookup)
+
+    def _planejar(self, modelo, nome, field):
+        attrs = field.source_attrs
+        if isinstance(field, serializers.RelatedField) and len(attrs) == 1:
+            # FK exibida como pk: values_list já devolve o id
+            self.plano.append((nome, self._coluna(attrs[0]), (), None))
+            return
+
+        nomes_campos = {f.name for f in modelo._meta.get_fields()}
+        if len(attrs) == 1 and attrs[0] not in nomes_campos:
+            exibicao = re.fullmatch(r"get_(\w+)_display", attrs[0])
+            campo = modelo._meta.get_field(exibicao[1]) if exibicao and exibicao[1] in nomes_campos else None
+            if campo is None or not campo.choices:
+                return  # o DRF nunca consegue ler esse atributo: a chave não sai
+            choices = dict(campo.flatchoices)
+            self.plano.append((nome, self._coluna(campo.name), (),
+                               lambda v, conv=field.to_representation: conv(force_str(choices.get(v, v), strings_only=True))))
+            return
+
+        # "aprovador.email" -> coluna "aprovador__email", guardada pela FK "aprovador"
+        guardas = tuple(self._coluna("__".join(attrs[:i])) for i in range(1, len(attrs)))
+        self.plano.append((nome, self._coluna("__".join(attrs)), guardas, field.to_representation))
+
+    def linhas(self, queryset, chunk_size=None):
+        """Gera um dict por linha do queryset, igual ao `base(obj).data`."""
+        linhas = queryset.values_list(*self.colunas)
+        if chunk_size:
+            linhas = linhas.iterator(chunk_size=chunk_size)
+        plano = self.plano
+        for row in linhas:
+            dados = {}
+            for chave, i, guardas, conv in plano:
+                if guardas and any(row[g] is None for g in guardas):
+                    continue
+                valor = row[i]
+                dados[chave] = valor if valor is None or conv is None else conv(valor)
+            yield dados
+
+
+class MaterialSpecLeituraRapida(LeituraRapida):
+    """Leitura rápida equivalente ao MaterialSpecSerializer (projetos grandes)."""
+    base = MaterialSpecSerializer
+
+
+@lru_cache(maxsize=None)
+def leitura_materiais():
+    # o mapa de campos é montado uma vez por processo
+    return MaterialSpecLeituraRapida()
+
+
 class AmbienteSerializer(serializers.ModelSerializer):
     materials = serializers.SerializerMethodField()
 
@@ -155,7 +282,9 @@ class ProjetoListSerializer(serializers.ModelSerializer):
             'responsavel_nome',
             'data_criacao',
             'data_atualizacao',
+            *Projeto.CAMPOS_CONTADORES,
         ]
+        read_only_fields = Projeto.CAMPOS_CONTADORES
 
 
 def normalizar_texto(text):
@@ -180,17 +309,28 @@ class ProjetoSerializer(serializers.ModelSerializer):
             'materiais_com_marcas', 
         ]
 
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.context.get("degradado"):
+            # sob carga o detalhe sai sem o cruzamento com as marcas (a parte mais cara)
+            fields.pop("materiais_com_marcas")
+        return fields
+
     # --------------- NOVA LÓGICA AQUI -----------------
     def get_materiais_com_marcas(self, projeto):
-        materiais_projeto = MaterialSpec.objects.filter(projeto=projeto)
-        todas_marcas = DescricaoMarca.objects.all()  # globais
+        linhas = getattr(self, "_linhas_materiais", {}).get(projeto.pk)
+        if linhas is not None:
+            pares = ((l["item"], l["descricao"]) for l in linhas)  # já lidas por get_ambientes
+        else:
+            pares = projeto.materiais.values_list("item", "descricao").iterator(chunk_size=2000)
+        todas_marcas = list(DescricaoMarca.objects.all())  # globais
         resultado = []
         ja_adicionados = set()
 
-        for material in materiais_projeto:
+        for item, descricao in pares:
             # Nome do item, exemplo: "Ferragem", "Parede", "Piso"
-            item_nome = (material.item or "").strip().lower()
-            descricao = (material.descricao or "").strip().lower()
+            item_nome = (item or "").strip().lower()
+            descricao = (descricao or "").strip().lower()
 
             # Se o nome do item for exatamente igual ao nome do material cadastrado globalmente → adiciona
             for marca_global in todas_marcas:
@@ -217,20 +357,50 @@ class ProjetoSerializer(serializers.ModelSerializer):
         return resultado
 
     def get_ambientes(self, instance):
-        # usa dados já "prefetched"
+        if self.context.get("streaming"):
+            return self._ambientes_sob_demanda(instance)
+
+        # uma query só (values_list), agrupada por ambiente
+        linhas = list(leitura_materiais().linhas(instance.materiais.order_by("ambiente_id", "item")))
+        self._linhas_materiais = {instance.pk: linhas}
         materiais_by_amb = {}
-        for m in instance.materiais.all():
-            materiais_by_amb.setdefault(m.ambiente_id, []).append(m)
+        for linha in linhas:
+            materiais_by_amb.setdefault(linha["ambiente"], []).append(linha)
 
         data = []
         for amb in instance.ambientes.all():
             amb_data = AmbienteSerializer(amb).data
-            amb_data['materials'] = MaterialSpecSerializer(
-                materiais_by_amb.get(amb.id, []), many=True
-            ).data
+            amb_data['materials'] = materiais_by_amb.get(amb.id, [])
             data.append(amb_data)
         return data
 
+    def _ambientes_sob_demanda(self, instance):
+        """
+        Versão de get_ambientes para o StreamingJSONRenderer: os materiais
+        vêm de um único cursor (iterator) na mesma ordem dos ambientes e
+        cada linha é serializada só quando o JSON chega nela.
+        """
+        ambientes = list(instance.ambientes.all())
+        cursor = leitura_materiais().linhas(
+            MaterialSpec.objects.filter(projeto=instance, ambiente_id__in=[a.id for a in ambientes])
+                                .order_by("ambiente__nome_do_ambiente", "ambiente_id", "item"),
+            chunk_size=1000,
+        )
+        pendente = [next(cursor, None)]
+
+        def materiais_do(ambiente):
+            # o encoder percorre os ambientes em ordem: consome o cursor até trocar de ambiente
+            while pendente[0] is not None and pendente[0]["ambiente"] == ambiente.id:
+                yield pendente[0]
+                pendente[0] = next(cursor, None)
+
+        def montar(amb):
+            amb_data = AmbienteSerializer(amb).data
+            amb_data['materials'] = ListaSobDemanda(materiais_do(amb), lambda linha: linha)
+            return amb_data
+
+        return ListaSobDemanda(ambientes, montar)
+
     def validate_nome_do_projeto(self, value):
         if Projeto.objects.filter(nome_do_projeto=value).exists():
             raise serializers.ValidationError("Já existe um projeto com esse nome.")
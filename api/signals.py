@@ -0,0 +1,94 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Projeto, Ambiente, MaterialSpec, Exclusao, Outbox, Log
+from . import atividade, autocomplete
+
+
+# ---------------- CONTADORES DO PROJETO ----------------
+@receiver(m2m_changed, sender=Projeto.ambientes.through)
+def atualizar_contadores_ambientes(sender, instance, action, reverse, pk_set, **kwargs):
+    """Mantém ambientes_privativos/comuns/externos quando os vínculos mudam."""
+    if reverse and action == "pre_clear":
+        # ambiente.projetos.clear(): guarda quem perde o vínculo antes de apagar
+        instance._projetos_antes_clear = list(instance.projetos.values_list("id", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        Projeto.recalcular_contadores([instance.pk])
+    elif action == "post_clear":
+        Projeto.recalcular_contadores(getattr(instance, "_projetos_antes_clear", []))
+    elif pk_set:
+        Projeto.recalcular_contadores(pk_set)
+
+
+@receiver(post_save, sender=Ambiente)
+def atualizar_contadores_categoria(sender, instance, created, **kwargs):
+    """Troca de categoria do ambiente muda a contagem dos projetos ligados a ele."""
+    if created:
+        return
+    Projeto.recalcular_contadores(instance.projetos.values_list("id", flat=True))
+
+
+# ---------------- LÁPIDES (SINCRONIZAÇÃO INCREMENTAL) ----------------
+@receiver(post_delete, sender=MaterialSpec)
+def registrar_exclusao_material(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Projeto):
+        # apagado junto com o projeto: a lápide do projeto já cobre os materiais
+        return
+    Exclusao.objects.create(modelo="MATERIAL", objeto_id=instance.pk, projeto_id=instance.projeto_id)
+
+
+@receiver(post_delete, sender=Projeto)
+def registrar_exclusao_projeto(sender, instance, **kwargs):
+    Exclusao.objects.create(modelo="PROJETO", objeto_id=instance.pk, projeto_id=instance.pk)
+
+
+# ---------------- ÍNDICE DO AUTOCOMPLETE ----------------
+def _autocomplete_salvo(sender, instance, **kwargs):
+    tipo, campo = _AUTOCOMPLETE[sender]
+    pk, nome = instance.pk, getattr(instance, campo)
+    transaction.on_commit(lambda: autocomplete.atualizar(tipo, pk, nome))
+
+
+def _autocomplete_removido(sender, instance, **kwargs):
+    tipo, _ = _AUTOCOMPLETE[sender]
+    pk = instance.pk  # o delete() zera o pk depois dos signals
+    transaction.on_commit(lambda: autocomplete.atualizar(tipo, pk, removido=True))
+
+
+_AUTOCOMPLETE = {modelo: (tipo, campo) for tipo, (modelo, campo, _) in autocomplete.FONTES.items()}
+for _modelo in _AUTOCOMPLETE:
+    post_save.connect(_autocomplete_salvo, sender=_modelo, dispatch_uid=f"autocomplete_salvo_{_modelo.__name__}")
+    post_delete.connect(_autocomplete_removido, sender=_modelo, dispatch_uid=f"autocomplete_removido_{_modelo.__name__}")
+
+
+# ---------------- RESUMO DE ATIVIDADE ----------------
+@receiver(post_save, sender=Log)
+def resumir_atividade(sender, instance, created, **kwargs):
+    # na mesma transação do log: o resumo nunca conta um log que não foi gravado
+    if created:
+        atividade.registrar(instance)
+
+
+# ---------------- E-MAILS ----------------
+def notificar_redefinicao_senha(usuario, nova_senha):
+    """Enfileira (Outbox) o e-mail com a nova senha; quem envia é o `send_outbox`, que depois apaga o corpo."""
+    nome = usuario.get_full_name() or usuario.username
+    corpo = (
+        f"Olá, {nome}.\n\n"
+        f"Sua senha de acesso foi redefinida por um administrador.\n"
+        f"Nova senha: {nova_senha}\n\n"
+        f"Recomendamos trocá-la no próximo acesso."
+    )
+    return Outbox.enfileirar(
+        assunto="Sua senha foi redefinida",
+        corpo=corpo,
+        destinatarios=[usuario.email],
+        remetente=settings.DEFAULT_FROM_EMAIL,
+        sigiloso=True,
+    )
@@ -0,0 +1,152 @@
+"""
+Sincronização incremental de materiais/projetos (`.../alteracoes/?desde=`).
+
+O cliente guarda o `cursor` da última resposta e pergunta só o que mudou
+depois dele: linhas alteradas (keyset por `updated_at, id`, indexado) e
+lápides (`Exclusao`) do que foi apagado. Na primeira vez `desde` pode ser um
+timestamp ISO 8601; daí em diante, o cursor opaco devolvido.
+
+`updated_at` e o id são atribuídos antes do COMMIT: uma transação lenta pode
+ficar visível depois que o cursor já passou da posição dela. Por isso cada
+chamada relê os últimos SYNC_JANELA_S segundos antes do cursor. O que já foi
+entregue nessa janela fica no cache SYNC_CACHE, sob uma chave que o cursor
+carrega: numa alteração em massa são milhares de ids, e o cursor vai na URL.
+Sem a entrada (expirou, foi descartada) a janela é reenviada; o cliente já
+grava os materiais por id, então repetir é inofensivo.
+"""
+import base64
+import json
+import secrets
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework import status
+
+from .models import Exclusao
+from .serializers import leitura_materiais
+
+
+class CursorExpirado(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = "Cursor de sincronização antigo demais. Recarregue os dados completos."
+    default_code = "cursor_expirado"
+
+
+def codificar_cursor(estado):
+    return base64.urlsafe_b64encode(json.dumps(estado, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def ler_cursor(desde):
+    """
+    `desde` -> {"m": [iso, id], "e": id | None, "t": iso, "mj": [[id, iso]...], "ej": [[id, iso]...]}.
+    "m" é a posição no keyset dos materiais, "e" o último id de Exclusao visto
+    e "t" o instante da resposta que gerou o cursor; "mj" e "ej" são os
+    materiais (com o updated_at entregue) e lápides já enviados dentro da janela,
+    lidos do cache pela chave "k" do cursor.
+    """
+    if not desde:
+        raise ValidationError({"desde": "Informe um timestamp ISO 8601 ou o cursor da última resposta."})
+
+    instante = None
+    try:
+        instante = datetime.fromisoformat(desde.replace(" ", "+"))  # "+" da URL pode virar espaço
+    except ValueError:
+        pass
+    if instante is not None:
+        if timezone.is_naive(instante):
+            instante = timezone.make_aware(instante)
+        estado = {"m": [instante.isoformat(), 0], "e": None, "t": instante.isoformat()}
+    else:
+        try:
+            estado = json.loads(base64.urlsafe_b64decode(desde + "=" * (-len(desde) % 4)))
+            datetime.fromisoformat(estado["t"])
+        except (ValueError, KeyError, TypeError):
+            raise ValidationError({"desde": "Cursor inválido."})
+
+    retencao = timedelta(days=settings.SYNC_RETENCAO_EXCLUSOES_DIAS)
+    if datetime.fromisoformat(estado["t"]) < timezone.now() - retencao:
+        # as lápides mais antigas que isso já podem ter sido limpas
+        raise CursorExpirado()
+    entregues = caches[settings.SYNC_CACHE].get(f"sync:{estado['k']}") if "k" in estado else None
+    estado["mj"], estado["ej"] = entregues or ([], [])
+    return estado
+
+
+def _guardar_entregues(estado, mj, ej):
+    """Cursor para `estado`, com a chave do que foi entregue na janela (se houver)."""
+    if mj or ej:
+        estado["k"] = secrets.token_urlsafe(12)
+        caches[settings.SYNC_CACHE].set(f"sync:{estado['k']}", [mj, ej])
+    return codificar_cursor(estado)
+
+
+def _atrasados(materiais, ts, ultimo_id, entregues):
+    """Ids da janela antes do cursor que não foram entregues como estão agora (commit atrasado)."""
+    janela = materiais.filter(updated_at__gte=ts - timedelta(seconds=settings.SYNC_JANELA_S)).filter(
+        Q(updated_at__lt=ts) | Q(updated_at=ts, id__lte=ultimo_id))
+    return [pk for pk, atualizado in janela.values_list("id", "updated_at") if entregues.get(pk) != atualizado]
+
+
+def alteracoes(materiais, exclusoes, desde, limite=None):
+    """
+    Materiais alterados e lápides a partir do cursor `desde`.
+    `materiais`: queryset de MaterialSpec já filtrado (ex.: por projeto);
+    `exclusoes`: queryset de Exclusao já filtrado.
+    Retorna (dados, estado do cursor recebido); `dados["cursor"]` é o próximo.
+    """
+    limite = limite or settings.SYNC_LIMITE
+    estado = ler_cursor(desde)
+    agora = timezone.now()
+    if estado["e"] is None:
+        # lida antes das lápides: o que for gravado depois terá id maior
+        ultima_exclusao = Exclusao.objects.order_by("-id").values_list("id", flat=True).first() or 0
+
+    ts, ultimo_id = estado["m"]
+    ts = datetime.fromisoformat(ts)
+    entregues = {pk: datetime.fromisoformat(atualizado) for pk, atualizado in estado["mj"]}
+    atrasados = _atrasados(materiais, ts, ultimo_id, entregues)[:limite]
+    linhas = list(leitura_materiais().linhas(materiais.filter(id__in=atrasados).order_by("updated_at", "id")))
+    novos = materiais.filter(Q(updated_at__gt=ts) | Q(updated_at=ts, id__gt=ultimo_id))
+    novos = list(leitura_materiais().linhas(novos.order_by("updated_at", "id")[:limite - len(linhas) + 1]))
+    mais_materiais = len(novos) > limite - len(linhas) or len(atrasados) == limite
+    novos = novos[:limite - len(linhas)]
+    linhas += novos
+    if novos:
+        estado_m = [novos[-1]["updated_at"], novos[-1]["id"]]
+    else:
+        estado_m = estado["m"]
+    # o que foi entregue e ainda cai na janela da próxima chamada
+    for linha in linhas:
+        entregues[linha["id"]] = datetime.fromisoformat(linha["updated_at"])
+    corte = datetime.fromisoformat(estado_m[0]) - timedelta(seconds=settings.SYNC_JANELA_S)
+    estado_mj = [[pk, atualizado.isoformat()] for pk, atualizado in entregues.items() if atualizado >= corte]
+
+    janela = datetime.fromisoformat(estado["t"]) - timedelta(seconds=settings.SYNC_JANELA_S)
+    lapides_entregues = {pk: datetime.fromisoformat(em) for pk, em in estado["ej"]}
+    if estado["e"] is None:
+        exclusoes = exclusoes.filter(excluido_em__gte=ts)
+    else:
+        exclusoes = (exclusoes.filter(Q(id__gt=estado["e"]) | Q(excluido_em__gte=janela))
+                     .exclude(id__in=list(lapides_entregues)))
+    lapides = list(exclusoes.order_by("id").values_list("id", "modelo", "objeto_id", "excluido_em")[:limite + 1])
+    mais_exclusoes = len(lapides) > limite
+    lapides = lapides[:limite]
+    estado_e = max([ultima_exclusao if estado["e"] is None else estado["e"], *(pk for pk, *_ in lapides)])
+    # com mais lápides por vir o instante não avança: a janela continua cobrindo as que faltam
+    instante = estado["t"] if mais_exclusoes else agora.isoformat()
+    lapides_entregues.update((pk, em) for pk, _, _, em in lapides)
+    corte = datetime.fromisoformat(instante) - timedelta(seconds=settings.SYNC_JANELA_S)
+    estado_ej = [[pk, em.isoformat()] for pk, em in lapides_entregues.items() if em >= corte]
+
+    dados = {
+        "materiais": linhas,
+        "materiais_excluidos": [obj for _, modelo, obj, _ in lapides if modelo == "MATERIAL"],
+        "projetos_excluidos": [obj for _, modelo, obj, _ in lapides if modelo == "PROJETO"],
+        "tem_mais": mais_materiais or mais_exclusoes,
+        "cursor": _guardar_entregues({"m": estado_m, "e": estado_e, "t": instante}, estado_mj, estado_ej),
+    }
+    return dados, estado
@@ -1,2 +1,1601 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import gzip
+import io
+import json
+import os
+import pstats
+import shutil
+import smtplib
+import sqlite3
+import tempfile
+import zipfile
+from concurrent.futures import Future
+from datetime import date, timedelta
+from pathlib import Path
+from io import StringIO
+from unittest import mock
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import mail
+from django.core.cache import caches
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+from reportlab.platypus import Paragraph
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Usuario, Projeto, Ambiente, Log, ModeloDocumento, MaterialSpec, Marca, Outbox, DescricaoMarca, ChaveIdempotencia, PerfilRequisicao, AtividadeDiaria
+from . import arquivo_logs, atividade, autocomplete, especificacao, exclusao_projetos, idempotencia, metricas, perfilamento, replicas
+from .arquivo_logs import ler_arquivados
+from .management.commands.startup_profile import medir_inicializacao
+from .eventos import BrokerBanco, broker
+from .especificacao import dados_especificacao
+from .throttling import TokenBucket, TokenBucketThrottle, _Vagas
+from .views import MaterialSpecViewSet, PaginacaoSemTotal, UsuarioViewSet
+from .serializers import LeituraRapida, MaterialSpecSerializer, leitura_materiais
+
+
+def criar_usuario(cargo="superadmin", email=None):
+    email = email or f"{cargo}@lab.com"
+    return Usuario.objects.create_user(username=email.split("@")[0], email=email, password="123456", cargo=cargo)
+
+
+def criar_projeto(nome="Projeto Teste", responsavel=None, ambientes=(), itens=("Piso", "Parede")):
+    projeto = Projeto.objects.create(
+        nome_do_projeto=nome,
+        tipo_do_projeto="RESIDENCIAL",
+        data_entrega=date(2030, 1, 1),
+        descricao="Descrição",
+        responsavel=responsavel,
+    )
+    projeto.ambientes.set(ambientes)
+    for amb in ambientes:
+        for item in itens:
+            MaterialSpec.objects.create(projeto=projeto, ambiente=amb, item=item, descricao=f"{item} de {amb}")
+    Projeto.recalcular_contadores([projeto.id])
+    projeto.refresh_from_db()
+    return projeto
+
+
+class APITestBase(TestCase):
+    cargo = "superadmin"
+
+    def setUp(self):
+        self.usuario = criar_usuario(self.cargo)
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+        self.sala = Ambiente.objects.create(nome_do_ambiente="Sala", categoria="PRIVATIVA")
+        self.hall = Ambiente.objects.create(nome_do_ambiente="Hall", categoria="COMUM")
+
+
+class ClonarProjetoTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        self.origem = criar_projeto(responsavel=self.usuario, ambientes=[self.sala, self.hall])
+        marca = Marca.objects.create(nome="Portobello")
+        MaterialSpec.objects.filter(projeto=self.origem).update(
+            status="APROVADO", aprovador=self.usuario, marca=marca, motivo="ok"
+        )
+        self.origem.status = "APROVADO"
+        self.origem.save()
+
+    def test_clona_projeto_ambientes_e_materiais_como_pendentes(self):
+        resp = self.client.post(f"/api/projetos/{self.origem.id}/clonar/", {"nome_do_projeto": "Cópia"}, format="json")
+
+        self.assertEqual(resp.status_code, 201)
+        novo = Projeto.objects.get(pk=resp.data["id"])
+        self.assertEqual(novo.status, "PENDENTE")
+        self.assertEqual(novo.responsavel, self.usuario)
+        self.assertEqual(set(novo.ambientes.all()), {self.sala, self.hall})
+        self.assertEqual(resp.data["materiais"], 4)
+        copias = MaterialSpec.objects.filter(projeto=novo)
+        self.assertFalse(copias.exclude(status="PENDENTE").exists())
+        self.assertFalse(copias.filter(aprovador__isnull=False).exists())
+        self.assertEqual(copias.filter(marca__nome="Portobello").count(), 4)
+        self.assertTrue(Log.objects.filter(projeto=novo, acao="CRIACAO").exists())
+
+    def test_nome_padrao_e_nome_duplicado(self):
+        resp = self.client.post(f"/api/projetos/{self.origem.id}/clonar/")
+        self.assertEqual(resp.data["nome_do_projeto"], "Projeto Teste (cópia)")
+        resp = self.client.post(f"/api/projetos/{self.origem.id}/clonar/")
+        self.assertEqual(resp.data["nome_do_projeto"], "Projeto Teste (cópia 2)")
+
+        resp = self.client.post(f"/api/projetos/{self.origem.id}/clonar/", {"nome_do_projeto": "Projeto Teste"}, format="json")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_clone_simultaneo_com_o_mesmo_nome(self):
+        self.client.post(f"/api/projetos/{self.origem.id}/clonar/", {"nome_do_projeto": "Torre B"}, format="json")
+        # o outro clone passou pelo exists() antes deste gravar: quem decide é a constraint
+        with mock.patch("django.db.models.query.QuerySet.exists", return_value=False):
+            resp = self.client.post(f"/api/projetos/{self.origem.id}/clonar/", {"nome_do_projeto": "Torre B"}, format="json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(Projeto.objects.filter(nome_do_projeto="Torre B").count(), 1)
+
+
+class ContadoresProjetoTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        self.projeto = criar_projeto(responsavel=self.usuario, ambientes=[self.sala, self.hall])
+
+    def contadores(self):
+        self.projeto.refresh_from_db()
+        return (self.projeto.materiais_pendentes, self.projeto.materiais_aprovados, self.projeto.materiais_reprovados)
+
+    def test_contadores_iniciais(self):
+        self.assertEqual(self.contadores(), (4, 0, 0))
+        self.assertEqual((self.projeto.ambientes_privativos, self.projeto.ambientes_comuns, self.projeto.ambientes_externos), (1, 1, 0))
+
+    def test_acoes_de_material_mantem_contadores(self):
+        m1, m2, m3, _ = MaterialSpec.objects.filter(projeto=self.projeto)
+        self.client.post(f"/api/materiais/{m1.id}/aprovar/")
+        self.client.post(f"/api/materiais/{m2.id}/reprovar/", {"motivo": "x"}, format="json")
+        self.client.post(f"/api/materiais/{m2.id}/aprovar/")
+        self.assertEqual(self.contadores(), (2, 2, 0))
+
+        self.client.delete(f"/api/materiais/{m3.id}/")
+        self.assertEqual(self.contadores(), (1, 2, 0))
+
+        self.client.post(f"/api/projetos/{self.projeto.id}/ambientes/{self.sala.id}/add-item/", {"item": "Teto"}, format="json")
+        self.assertEqual(self.contadores(), (2, 2, 0))
+
+        self.client.post(f"/api/materiais/{m1.id}/reverter/")
+        self.assertEqual(self.contadores(), (4, 0, 0))
+
+    def test_vinculos_e_categoria_de_ambiente(self):
+        varanda = Ambiente.objects.create(nome_do_ambiente="Varanda", categoria="EXTERNA")
+        self.projeto.ambientes.add(varanda)
+        self.projeto.refresh_from_db()
+        self.assertEqual(self.projeto.ambientes_externos, 1)
+
+        self.hall.categoria = "EXTERNA"
+        self.hall.save()
+        self.projeto.refresh_from_db()
+        self.assertEqual((self.projeto.ambientes_comuns, self.projeto.ambientes_externos), (0, 2))
+
+        self.client.delete(f"/api/ambientes/{self.hall.id}/")
+        self.projeto.refresh_from_db()
+        self.assertEqual(self.projeto.ambientes_externos, 1)
+        self.assertEqual(self.contadores(), (2, 0, 0))
+
+    def test_listagem_expoe_e_ordena_por_contadores(self):
+        outro = criar_projeto("Outro", responsavel=self.usuario, ambientes=[self.sala], itens=("Piso",))
+        resp = self.client.get("/api/projetos/?ordenar=materiais_pendentes")
+        self.assertEqual([p["id"] for p in resp.data["results"]], [outro.id, self.projeto.id])
+        self.assertEqual(resp.data["results"][1]["materiais_pendentes"], 4)
+
+    def test_comando_verificar_contadores(self):
+        Projeto.objects.filter(pk=self.projeto.pk).update(materiais_aprovados=7)
+        saida = StringIO()
+        call_command("verificar_contadores", stdout=saida)
+        self.assertIn("materiais_aprovados: 7 -> 0", saida.getvalue())
+        self.assertEqual(self.contadores(), (4, 7, 0))
+
+        call_command("verificar_contadores", "--corrigir", stdout=StringIO())
+        self.assertEqual(self.contadores(), (4, 0, 0))
+
+
+class PlanoQuerysetTests(APITestBase):
+    """Trava o número de queries de cada ação; cresce só se o plano mudar."""
+
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            criar_projeto(f"Projeto {i}", responsavel=self.usuario, ambientes=[self.sala, self.hall])
+        self.projeto = Projeto.objects.first()
+        for i in range(3):
+            Log.objects.create(usuario=self.usuario, acao="EDICAO", projeto=self.projeto, motivo=f"log {i}")
+            ModeloDocumento.objects.create(nome=f"Modelo {i}", descricao="texto", projeto=self.projeto)
+        self.material = MaterialSpec.objects.filter(projeto=self.projeto).first()
+
+    def test_projetos_list_sem_prefetch(self):
+        with self.assertNumQueries(2):  # count + página
+            resp = self.client.get("/api/projetos/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["results"][0]["responsavel_nome"], self.usuario.get_full_name())
+
+    def test_projetos_retrieve(self):
+        # projeto + ambientes + materiais + descrições de marca
+        with self.assertNumQueries(4):
+            resp = self.client.get(f"/api/projetos/{self.projeto.id}/")
+        self.assertEqual(len(resp.data["ambientes"]), 2)
+        self.assertEqual(sum(len(a["materials"]) for a in resp.data["ambientes"]), 4)
+
+    def test_materiais_list_e_retrieve(self):
+        with self.assertNumQueries(2):
+            resp = self.client.get(f"/api/materiais/?projeto={self.projeto.id}")
+        self.assertEqual(resp.data["results"][0]["ambiente_nome"], "Sala")
+        with self.assertNumQueries(1):
+            self.client.get(f"/api/materiais/{self.material.id}/")
+
+    def test_material_aprovar(self):
+        # select + contador + update + log + resumo de atividade (select + update) (+ savepoint do atomic)
+        with self.assertNumQueries(8):
+            resp = self.client.post(f"/api/materiais/{self.material.id}/aprovar/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(Log.objects.filter(acao="APROVACAO", projeto=self.projeto).exists())
+
+    def test_material_aprovar_trava_a_linha(self):
+        # o SQLite ignora o FOR UPDATE; o que importa é o queryset pedir a trava
+        with mock.patch("api.views.MaterialSpecViewSet.get_object", autospec=True,
+                        side_effect=MaterialSpecViewSet.get_object) as get_object:
+            self.client.post(f"/api/materiais/{self.material.id}/aprovar/")
+            self.client.post(f"/api/materiais/{self.material.id}/aprovar/")
+        view = get_object.call_args.args[0]
+        self.assertTrue(view.get_queryset().query.select_for_update)
+        self.projeto.refresh_from_db()
+        self.assertEqual(self.projeto.materiais_aprovados, 1)  # a segunda aprovação não mexe nos contadores
+
+    def test_logs_list_sem_n_mais_1(self):
+        with self.assertNumQueries(2):
+            resp = self.client.get("/api/logs/")
+        self.assertEqual(resp.data["results"][0]["projeto_nome"], self.projeto.nome_do_projeto)
+        self.assertEqual(resp.data["results"][0]["usuario_email"], self.usuario.email)
+
+    def test_modelos_documento_list_sem_n_mais_1(self):
+        with self.assertNumQueries(2):
+            resp = self.client.get("/api/modelos-documento/")
+        self.assertEqual(resp.data["results"][0]["projeto_nome"], self.projeto.nome_do_projeto)
+
+
+class StreamingJSONTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        self.projeto = criar_projeto(responsavel=self.usuario, ambientes=[self.sala, self.hall],
+                                     itens=("Piso", "Parede", "Teto"))
+        # ambiente vinculado sem materiais e material de ambiente não vinculado
+        self.projeto.ambientes.add(Ambiente.objects.create(nome_do_ambiente="Área", categoria="EXTERNA"))
+        solto = Ambiente.objects.create(nome_do_ambiente="Solto")
+        MaterialSpec.objects.create(projeto=self.projeto, ambiente=solto, item="Piso")
+        MaterialSpec.objects.filter(item="Teto").update(descricao="Gesso\u2028ç acabado", status="APROVADO",
+                                                        aprovador=self.usuario)
+        Projeto.recalcular_contadores([self.projeto.id])
+
+    def obter(self, url, limite):
+        with self.settings(JSON_STREAMING_MIN_ITENS=limite):
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        if resp.streaming:
+            return True, b"".join(resp.streaming_content)
+        return False, resp.content
+
+    def assertMesmosBytes(self, url):
+        normal, esperado = self.obter(url, 10**9)
+        streaming, obtido = self.obter(url, 0)
+        self.assertFalse(normal)
+        self.assertTrue(streaming)
+        self.assertEqual(obtido, esperado)
+
+    def test_retrieve_de_projeto(self):
+        self.assertMesmosBytes(f"/api/projetos/{self.projeto.id}/")
+
+    def test_listas(self):
+        Log.objects.create(usuario=self.usuario, acao="EDICAO", projeto=self.projeto, motivo="ação")
+        for url in ("/api/projetos/", f"/api/materiais/?projeto={self.projeto.id}", "/api/logs/",
+                    "/api/materiais/?projeto=0"):
+            with self.subTest(url=url):
+                self.assertMesmosBytes(url)
+
+    def test_streaming_em_pedacos(self):
+        from .renderers import StreamingJSONRenderer
+        renderer = StreamingJSONRenderer()
+        renderer.tamanho_chunk = 16
+        dados = {"itens": [{"n": i, "t": "ção"} for i in range(50)]}
+        pedacos = list(renderer.render_chunks(dados))
+        self.assertGreater(len(pedacos), 1)
+        self.assertEqual(b"".join(pedacos), renderer.render(dados))
+
+
+class MaterialSpecLeituraRapidaTests(APITestBase):
+    """A leitura via values_list tem que gerar exatamente os bytes do MaterialSpecSerializer."""
+
+    def setUp(self):
+        super().setUp()
+        self.projeto = criar_projeto(responsavel=self.usuario, ambientes=[self.sala, self.hall],
+                                     itens=("Piso", "Parede", "Teto", "Rodapé"))
+        marca = Marca.objects.create(nome="Deca ç")
+        piso, parede, teto = (MaterialSpec.objects.get(ambiente=self.sala, item=i) for i in ("Piso", "Parede", "Teto"))
+        for m in (piso, parede):
+            m.marca = marca
+        piso.status, piso.aprovador, piso.data_aprovacao = "APROVADO", self.usuario, timezone.now()
+        parede.status, parede.motivo, parede.descricao = "REPROVADO", "", "linha 1\nlinha 2\u2028 \"aspas\""
+        teto.motivo = None
+        for m in (piso, parede, teto):
+            m.save()
+        # material sem projeto (globais) também passa pelo mesmo mapa
+        MaterialSpec.objects.create(ambiente=self.hall, item="Soleira", descricao="Granito")
+
+    def assertParidade(self, rapida, serializer_class, queryset):
+        renderer = JSONRenderer()
+        esperado = renderer.render(serializer_class(queryset, many=True).data)
+        obtido = renderer.render(list(rapida.linhas(queryset)))
+        self.assertEqual(obtido, esperado)
+
+    def test_paridade_com_material_spec_serializer(self):
+        qs = MaterialSpec.objects.order_by("ambiente_id", "item")
+        self.assertParidade(leitura_materiais(), MaterialSpecSerializer, qs)
+
+    def test_paridade_em_streaming(self):
+        qs = MaterialSpec.objects.order_by("id")
+        self.assertEqual(list(leitura_materiais().linhas(qs, chunk_size=2)), list(leitura_materiais().linhas(qs)))
+
+    def test_campos_omitidos_como_no_drf(self):
+        linhas = {l["item"]: l for l in leitura_materiais().linhas(MaterialSpec.objects.filter(ambiente=self.sala))}
+        self.assertNotIn("item_label", linhas["Piso"])
+        self.assertIn("aprovador_email", linhas["Piso"])
+        self.assertNotIn("aprovador_email", linhas["Teto"])
+        self.assertNotIn("marca_nome", linhas["Teto"])
+
+    def test_get_display_com_choices(self):
+        class ComRotulo(MaterialSpecSerializer):
+            status_label = serializers.CharField(source="get_status_display", read_only=True)
+            aprovador_nome = serializers.CharField(source="aprovador.username", read_only=True)
+
+            class Meta(MaterialSpecSerializer.Meta):
+                fields = MaterialSpecSerializer.Meta.fields + ["status_label", "aprovador_nome"]
+
+        class ComRotuloRapida(LeituraRapida):
+            base = ComRotulo
+
+        self.assertParidade(ComRotuloRapida(), ComRotulo, MaterialSpec.objects.order_by("id"))
+
+
+class StatsAsyncTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        criar_projeto("A", responsavel=self.usuario)
+        criar_projeto("B", responsavel=self.usuario)
+        Projeto.objects.filter(nome_do_projeto="B").update(status="APROVADO")
+        token = str(RefreshToken.for_user(self.usuario).access_token)
+        self.async_client = AsyncClient(AUTHORIZATION=f"Bearer {token}")
+
+    async def test_mesmos_bytes_que_as_views_sincronas(self):
+        for sync_url, async_url in (("/api/stats/dashboard/", "/api/stats/async/dashboard/"),
+                                    ("/api/stats/mensais/", "/api/stats/async/mensais/")):
+            esperado = await sync_to_async(self.client.get)(sync_url)
+            obtido = await self.async_client.get(async_url)
+            self.assertEqual(obtido.status_code, 200)
+            self.assertEqual(obtido.content, esperado.content)
+
+    async def test_painel_combina_as_duas_consultas(self):
+        resp = await self.async_client.get("/api/stats/async/painel/")
+        dados = resp.json()
+        self.assertEqual(dados["contagens"], {"total_projetos": 2, "projetos_aprovados": 1,
+                                              "projetos_reprovados": 0, "projetos_pendentes": 1})
+        self.assertEqual(sum(m["APROVADO"] for m in dados["mensais"].values()), 1)
+
+    async def test_exige_token_valido(self):
+        resp = await AsyncClient().get("/api/stats/async/painel/")
+        self.assertEqual(resp.status_code, 401)
+        resp = await AsyncClient(AUTHORIZATION="Bearer invalido").get("/api/stats/async/painel/")
+        self.assertEqual(resp.status_code, 401)
+        resp = await self.async_client.post("/api/stats/async/painel/")
+        self.assertEqual(resp.status_code, 405)
+
+
+class ConexaoSMTPFalha(locmem.EmailBackend):
+    """Backend de teste: abre a conexão mas recusa os envios."""
+
+    def send_messages(self, messages):
+        raise smtplib.SMTPServerDisconnected("conexão caiu")
+
+
+class OutboxTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        self.atendente = criar_usuario("atendente")
+
+    def test_resetar_senha_so_enfileira(self):
+        resp = self.client.post(f"/api/usuarios-admin/{self.atendente.id}/resetar-senha/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        msg = Outbox.objects.get()
+        self.assertEqual(msg.destinatarios, [self.atendente.email])
+        self.assertEqual(msg.status, "PENDENTE")
+
+        call_command("send_outbox", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.atendente.email])
+        msg.refresh_from_db()
+        self.assertEqual((msg.status, msg.corpo), ("ENVIADO", ""))  # a senha não fica no banco
+        senha = mail.outbox[0].body.split("Nova senha: ")[1].split()[0]
+        self.atendente.refresh_from_db()
+        self.assertTrue(self.atendente.check_password(senha))
+
+    @override_settings(EMAIL_BACKEND="api.tests.ConexaoSMTPFalha", OUTBOX_MAX_TENTATIVAS=1)
+    def test_senha_some_quando_desiste_e_nao_aparece_no_admin(self):
+        self.client.post(f"/api/usuarios-admin/{self.atendente.id}/resetar-senha/")
+        call_command("send_outbox", stdout=StringIO(), stderr=StringIO())
+        msg = Outbox.objects.get()
+        self.assertEqual((msg.status, msg.corpo), ("FALHOU", ""))
+
+        Outbox.enfileirar("Aviso", "corpo comum", "x@lab.com")
+        call_command("send_outbox", stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Outbox.objects.get(assunto="Aviso").corpo, "corpo comum")  # só o sigiloso é apagado
+
+        Usuario.objects.filter(pk=self.usuario.pk).update(is_staff=True, is_superuser=True)
+        self.client.force_login(self.usuario)
+        pagina = self.client.get(f"/admin/api/outbox/{msg.id}/change/")
+        self.assertEqual(pagina.status_code, 200)
+        self.assertNotIn("corpo", pagina.context["adminform"].form.fields)
+
+    def test_lote_usa_uma_conexao(self):
+        for i in range(5):
+            Outbox.enfileirar(f"Assunto {i}", "corpo", f"u{i}@lab.com")
+        with mock.patch("django.core.mail.backends.locmem.EmailBackend.open", autospec=True) as abrir:
+            call_command("send_outbox", "--lote", "3", stdout=StringIO())
+        self.assertEqual(abrir.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(Outbox.objects.filter(status="PENDENTE").count(), 2)
+
+    @override_settings(EMAIL_BACKEND="api.tests.ConexaoSMTPFalha", OUTBOX_MAX_TENTATIVAS=2)
+    def test_falha_reagenda_com_backoff_e_desiste(self):
+        msg = Outbox.enfileirar("Assunto", "corpo", "x@lab.com")
+        call_command("send_outbox", stdout=StringIO(), stderr=StringIO())
+        msg.refresh_from_db()
+        self.assertEqual((msg.status, msg.tentativas), ("PENDENTE", 1))
+        self.assertIn("SMTPServerDisconnected", msg.ultimo_erro)
+        self.assertGreater(msg.proxima_tentativa, timezone.now())
+
+        # antes do horário agendado não tenta de novo
+        call_command("send_outbox", stdout=StringIO(), stderr=StringIO())
+        msg.refresh_from_db()
+        self.assertEqual(msg.tentativas, 1)
+
+        Outbox.objects.update(proxima_tentativa=timezone.now())
+        call_command("send_outbox", stdout=StringIO(), stderr=StringIO())
+        msg.refresh_from_db()
+        self.assertEqual((msg.status, msg.tentativas), ("FALHOU", 2))
+
+
+    def test_reserva_exclusiva_e_crash_no_meio_nao_reenvia(self):
+        for i in range(3):
+            Outbox.enfileirar(f"Assunto {i}", "corpo", f"u{i}@lab.com", remetente=None)
+        primeiro = Outbox.reservar(2, prazo_s=300)
+        self.assertEqual(len(primeiro), 2)
+        self.assertEqual([m.id for m in Outbox.reservar(10, prazo_s=300)], [Outbox.objects.last().id])
+        Outbox.objects.update(status="PENDENTE", reserva="", reservado_ate=None)
+
+        enviar = locmem.EmailBackend.send_messages
+
+        def cai_no_segundo(backend, mensagens):
+            if mail.outbox:
+                raise SystemExit("worker morto")
+            return enviar(backend, mensagens)
+
+        with mock.patch.object(locmem.EmailBackend, "send_messages", cai_no_segundo):
+            with self.assertRaises(SystemExit):
+                call_command("send_outbox", stdout=StringIO())
+        self.assertEqual(list(Outbox.objects.order_by("id").values_list("status", flat=True)),
+                         ["ENVIADO", "ENVIANDO", "ENVIANDO"])
+
+        # a reserva vence e outro worker entrega só o que faltou
+        Outbox.objects.filter(status="ENVIANDO").update(reservado_ate=timezone.now() - timedelta(seconds=1))
+        call_command("send_outbox", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(Outbox.objects.exclude(status="ENVIADO").exists())
+
+
+class EspecificacaoLoteTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        self.p1 = criar_projeto("Torre A", self.usuario, ambientes=[self.sala, self.hall])
+        self.p2 = criar_projeto("Torre B", self.usuario, ambientes=[self.sala])
+        DescricaoMarca.objects.create(material="Piso", marcas="Portobello")
+
+    def baixar_zip(self, ids):
+        resp = self.client.post("/api/projetos/especificacoes-lote/", {"ids": ids}, format="json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "application/zip")
+        return zipfile.ZipFile(io.BytesIO(b"".join(resp.streaming_content)))
+
+    def test_dados_em_consultas_fixas(self):
+        with self.assertNumQueries(4):
+            dados = dados_especificacao([self.p2.id, self.p1.id])
+        self.assertEqual([d["nome"] for d in dados], ["Torre B", "Torre A"])
+        self.assertEqual([a["nome"] for a in dados[1]["ambientes"]], ["Hall", "Sala"])
+        self.assertEqual(dados[1]["ambientes"][1]["materiais"], [("Parede", "Parede de Sala"), ("Piso", "Piso de Sala")])
+        self.assertEqual(dados[0]["marcas"], [("Piso", "Portobello")])
+
+    @override_settings(ESPECIFICACAO_WORKERS=1)
+    def test_zip_com_um_pdf_por_projeto(self):
+        zf = self.baixar_zip([self.p1.id, self.p2.id])
+        self.assertEqual(zf.namelist(), ["Torre A_especificacao.pdf", "Torre B_especificacao.pdf"])
+        individual = self.client.get(f"/api/projetos/{self.p1.id}/download-especificacao/")
+        self.assertEqual(individual.status_code, 200)
+        for nome in zf.namelist():
+            self.assertTrue(zf.read(nome).startswith(b"%PDF"))
+
+    @override_settings(ESPECIFICACAO_WORKERS=2)
+    def test_renderiza_no_pool_de_processos(self):
+        zf = self.baixar_zip([self.p1.id, self.p2.id])
+        self.assertEqual(len(zf.namelist()), 2)
+        self.assertTrue(all(zf.read(n).startswith(b"%PDF") for n in zf.namelist()))
+
+    def test_cliente_desconectado_cancela_a_fila(self):
+        class PoolDeMentira:
+            # só o primeiro PDF fica pronto; os outros ficam esperando um processo livre
+            def __init__(self):
+                self.futuros = []
+
+            def submit(self, funcao, *args):
+                futuro = Future()
+                if not self.futuros:
+                    futuro.set_result(funcao(*args))
+                self.futuros.append(futuro)
+                return futuro
+
+        falso = PoolDeMentira()
+        extras = [criar_projeto(f"Torre {c}", self.usuario, ambientes=[self.sala]).id for c in "CD"]
+        dados = dados_especificacao([self.p1.id, self.p2.id, *extras])
+        with mock.patch("api.especificacao.pool", return_value=falso):
+            pedacos = especificacao.zip_especificacoes(dados, workers=2)
+            self.assertTrue(next(pedacos))
+            pedacos.close()
+        self.assertEqual(len(falso.futuros), 3)  # 2 na fila + 1 reposto após o primeiro
+        self.assertTrue(all(f.cancelled() for f in falso.futuros[1:]))
+
+    def test_ids_invalidos(self):
+        url = "/api/projetos/especificacoes-lote/"
+        self.assertEqual(self.client.post(url, {"ids": []}, format="json").status_code, 400)
+        self.assertEqual(self.client.post(url, {"ids": ["1"]}, format="json").status_code, 400)
+        resp = self.client.post(url, {"ids": [self.p1.id, 9999]}, format="json")
+        self.assertEqual(resp.status_code, 404)
+        self.assertEqual(resp.data["ids"], [9999])
+
+
+class RenderizacaoEspecificacaoTests(TestCase):
+    def test_celulas_simples_sem_paragraph(self):
+        self.assertEqual(especificacao._celula("Piso", 120), "Piso")
+        self.assertIsInstance(especificacao._celula("Piso\nRodapé", 120), Paragraph)
+        self.assertIsInstance(especificacao._celula("Porcelanato retificado " * 5, 120), Paragraph)
+
+    def test_tabela_longa_dividida_com_cabecalho(self):
+        linhas = [(f"Item {i}", "-") for i in range(especificacao.LINHAS_POR_TABELA * 2 + 1)]
+        tabelas = list(especificacao._tabelas(["Item", "Descrição"], linhas, [120, 330]))
+        self.assertEqual(len(tabelas), 3)
+        self.assertTrue(all(t.repeatRows == 1 for t in tabelas))
+        self.assertEqual(sum(len(t._cellvalues) - 1 for t in tabelas), len(linhas))
+        # ambiente sem materiais ainda mostra o cabeçalho
+        self.assertEqual(len(list(especificacao._tabelas(["Item", "Descrição"], [], [120, 330]))), 1)
+
+    def test_pdf_com_varias_paginas(self):
+        dados = {
+            "id": 1, "nome": "Torre", "descricao": None, "marcas": [("Piso", "Portobello\nEliane")],
+            "ambientes": [{"nome": "Sala", "categoria": "PRIVATIVA",
+                           "materiais": [(f"Item {i}", "texto longo " * 20) for i in range(300)]}],
+        }
+        pdf = especificacao.renderizar_especificacao(dados)
+        self.assertTrue(pdf.startswith(b"%PDF"))
+        self.assertGreater(pdf.count(b"/Type /Page\n"), 1)
+
+
+@override_settings(LIMITES_CONCORRENCIA={"projeto_detalhe": 1, "especificacao": 1})
+class SobrecargaTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        TokenBucketThrottle.reiniciar()
+        self.addCleanup(TokenBucketThrottle.reiniciar)
+        self.projeto = criar_projeto(responsavel=self.usuario, ambientes=[self.sala])
+
+    def ocupar(self, nome):
+        vaga = _Vagas.tentar(nome)
+        self.assertIsNotNone(vaga)
+        self.addCleanup(vaga.release)
+        return vaga
+
+    def test_token_bucket_repoe_fichas(self):
+        balde = TokenBucket(capacidade=2, por_segundo=0.5)
+        self.assertEqual(balde.consumir("a", agora=0), 0)
+        self.assertEqual(balde.consumir("a", agora=0), 0)
+        self.assertEqual(balde.consumir("a", agora=0), 2)
+        self.assertEqual(balde.consumir("b", agora=0), 0)
+        self.assertEqual(balde.consumir("a", agora=2), 0)
+
+    def test_balde_descarta_chaves_paradas_e_limita_a_memoria(self):
+        balde = TokenBucket(capacidade=2, por_segundo=0.5, max_chaves=3)  # enche em 4 s
+        for i in range(3):
+            balde.consumir(f"ip{i}", agora=0)
+        balde.consumir("ip3", agora=1)
+        self.assertEqual(len(balde), 3)  # ip0, o menos recente, saiu
+        balde.consumir("ip1", agora=4.5)  # limpeza: ip1 e ip2, parados há 4.5 s, saem; ip1 volta
+        self.assertEqual(len(balde), 2)
+        self.assertEqual(balde.consumir("ip2", agora=4.5), 0)  # volta como balde cheio
+
+    def test_login_limitado_com_retry_after(self):
+        cliente = APIClient()
+        for _ in range(5):
+            resp = cliente.post("/api/token/", {"email": "x@lab.com", "password": "errada"}, format="json")
+            self.assertEqual(resp.status_code, 401)
+        resp = cliente.post("/api/token/", {"email": "x@lab.com", "password": "errada"}, format="json")
+        self.assertEqual(resp.status_code, 429)
+        self.assertGreaterEqual(int(resp["Retry-After"]), 1)
+
+    def test_detalhe_degradado_sem_vaga(self):
+        url = f"/api/projetos/{self.projeto.id}/"
+        self.assertIn("materiais_com_marcas", self.client.get(url).data)
+
+        vaga = self.ocupar("projeto_detalhe")
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["X-Degradado"], "1")
+        self.assertNotIn("materiais_com_marcas", resp.data)
+        self.assertEqual(len(resp.data["ambientes"][0]["materials"]), 2)
+
+        vaga.release()
+        self.assertIn("materiais_com_marcas", self.client.get(url).data)
+        vaga.acquire()  # devolvida no cleanup
+
+    def test_especificacao_recusada_sem_vaga(self):
+        url = f"/api/projetos/{self.projeto.id}/download-especificacao/"
+        self.ocupar("especificacao")
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp["Retry-After"], "5")
+
+    @override_settings(JSON_STREAMING_MIN_ITENS=0)
+    def test_vaga_devolvida_ao_fim_do_streaming(self):
+        resp = self.client.get(f"/api/projetos/{self.projeto.id}/")
+        self.assertTrue(resp.streaming)
+        self.assertIsNone(_Vagas.tentar("projeto_detalhe"))  # corpo ainda não saiu
+        b"".join(resp.streaming_content)
+        self.ocupar("projeto_detalhe")
+
+
+class ArquivoLogsTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = Path(pasta.name)
+        ajuste = override_settings(LOG_ARQUIVO_DIR=self.pasta)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+        self.atendente = criar_usuario("atendente")
+        self.projeto = criar_projeto(responsavel=self.usuario)
+        agora = timezone.now()
+        for i, (usuario, dias) in enumerate([(self.usuario, 400), (self.atendente, 380), (self.atendente, 370), (self.usuario, 1)]):
+            log = Log.objects.create(usuario=usuario, acao="APROVACAO", projeto=self.projeto, motivo=f"log {i}")
+            Log.objects.filter(pk=log.pk).update(data_hora=agora - timedelta(days=dias))
+
+    def arquivar(self):
+        call_command("archive_logs", "--older-than", "365", "--lote", "2", stdout=StringIO())
+
+    def test_move_logs_antigos_para_arquivos_mensais(self):
+        self.arquivar()
+        self.assertEqual(list(Log.objects.values_list("motivo", flat=True)), ["log 3"])
+        arquivos = sorted(self.pasta.glob("logs-*.jsonl.gz"))
+        self.assertGreaterEqual(len(arquivos), 1)
+        linhas = [json.loads(l) for a in arquivos for l in gzip.open(a, "rt")]
+        self.assertEqual(sorted(l["motivo"] for l in linhas), ["log 0", "log 1", "log 2"])
+
+        # lote regravado (queda entre gravar e apagar) não aparece duas vezes
+        with gzip.open(arquivos[0], "ab") as gz:
+            gz.write(json.dumps(linhas[0]).encode() + b"\n")
+        self.assertEqual(len(list(ler_arquivados())), 3)
+
+    def test_listagem_com_arquivo(self):
+        antes = self.client.get("/api/logs/").data["results"]
+        self.arquivar()
+        self.assertEqual(self.client.get("/api/logs/").data["count"], 1)
+
+        resp = self.client.get("/api/logs/?incluir_arquivo=1")
+        self.assertIsNone(resp.data["count"])  # contar leria todos os meses
+        self.assertIsNone(resp.data["next"])
+        self.assertEqual(resp.data["results"], antes)
+
+    @mock.patch.object(PaginacaoSemTotal, "page_size", 2)
+    def test_pagina_nao_le_meses_mais_antigos(self):
+        # um log por mês no arquivo
+        for motivo, dias in (("log 1", 430), ("log 0", 490)):
+            Log.objects.filter(motivo=motivo).update(data_hora=timezone.now() - timedelta(days=dias))
+        self.arquivar()
+        self.assertEqual(len(list(self.pasta.glob("logs-*.jsonl.gz"))), 3)
+
+        with mock.patch("api.arquivo_logs._ler_mes", wraps=arquivo_logs._ler_mes) as ler:
+            resp = self.client.get("/api/logs/?incluir_arquivo=1")
+        self.assertEqual([r["motivo"] for r in resp.data["results"]], ["log 3", "log 2"])
+        self.assertIn("page=2", resp.data["next"])
+        # o mês de "log 1" só foi aberto para saber se há próxima página; o de "log 0", nunca
+        self.assertEqual(ler.call_count, 2)
+
+        resp = self.client.get(resp.data["next"])
+        self.assertEqual([r["motivo"] for r in resp.data["results"]], ["log 1", "log 0"])
+        self.assertIsNone(resp.data["next"])
+        self.assertEqual(self.client.get("/api/logs/?incluir_arquivo=1&page=3").data["results"], [])
+
+    def test_arquivo_respeita_visibilidade_por_cargo(self):
+        self.arquivar()
+        self.client.force_authenticate(self.atendente)
+        resp = self.client.get("/api/logs/?incluir_arquivo=1")
+        self.assertEqual([r["motivo"] for r in resp.data["results"]], ["log 2", "log 1"])
+
+
+@override_settings(CACHES={
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "sincronizacao": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "sync-testes"},
+})
+class SincronizacaoTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        self.projeto = criar_projeto(responsavel=self.usuario, ambientes=[self.sala, self.hall])
+        self.outro = criar_projeto("Outro", self.usuario, ambientes=[self.sala], itens=("Teto",))
+        self.url = f"/api/projetos/{self.projeto.id}/alteracoes/"
+
+    def sincronizar(self, url, desde):
+        resp = self.client.get(url, {"desde": desde})
+        self.assertEqual(resp.status_code, 200, resp.data)
+        return resp.data
+
+    def test_primeira_chamada_por_timestamp_e_depois_pelo_cursor(self):
+        inicio = (timezone.now() - timedelta(minutes=1)).isoformat()
+        dados = self.sincronizar(self.url, inicio)
+        self.assertEqual(len(dados["materiais"]), 4)
+        self.assertEqual(dados["projeto"]["id"], self.projeto.id)
+
+        # nada mudou: resposta vazia
+        vazio = self.sincronizar(self.url, dados["cursor"])
+        self.assertEqual((vazio["materiais"], vazio["materiais_excluidos"], vazio["projeto"]), ([], [], None))
+
+        piso, parede = MaterialSpec.objects.filter(projeto=self.projeto, ambiente=self.sala).order_by("item")[:2]
+        self.client.post(f"/api/materiais/{piso.id}/aprovar/")
+        self.client.delete(f"/api/materiais/{parede.id}/")
+        MaterialSpec.objects.filter(projeto=self.outro).update(descricao="x", updated_at=timezone.now())
+
+        delta = self.sincronizar(self.url, vazio["cursor"])
+        self.assertEqual([(m["id"], m["status"]) for m in delta["materiais"]], [(piso.id, "APROVADO")])
+        self.assertEqual(delta["materiais_excluidos"], [parede.id])
+        self.assertEqual(delta["projeto"]["materiais_aprovados"], 1)  # contadores mudaram
+        self.assertEqual(self.sincronizar(self.url, delta["cursor"])["materiais"], [])
+
+    def test_paginacao_pelo_cursor(self):
+        inicio = (timezone.now() - timedelta(minutes=1)).isoformat()
+        with override_settings(SYNC_LIMITE=3):
+            pagina = self.sincronizar("/api/materiais/alteracoes/", inicio)
+            ids = [m["id"] for m in pagina["materiais"]]
+            self.assertTrue(pagina["tem_mais"])
+            pagina = self.sincronizar("/api/materiais/alteracoes/", pagina["cursor"])
+            ids += [m["id"] for m in pagina["materiais"]]
+            self.assertFalse(pagina["tem_mais"])
+        self.assertEqual(sorted(ids), sorted(MaterialSpec.objects.values_list("id", flat=True)))
+
+    def test_commit_atrasado_dentro_da_janela_nao_se_perde(self):
+        inicio = (timezone.now() - timedelta(minutes=1)).isoformat()
+        dados = self.sincronizar(self.url, inicio)
+        ultimo = max(MaterialSpec.objects.filter(projeto=self.projeto).values_list("updated_at", flat=True))
+
+        # transação que gravou antes da posição do cursor e só fez COMMIT agora
+        piso = MaterialSpec.objects.filter(projeto=self.projeto).order_by("id").first()
+        MaterialSpec.objects.filter(pk=piso.pk).update(descricao="atrasado", updated_at=ultimo - timedelta(seconds=5))
+        delta = self.sincronizar(self.url, dados["cursor"])
+        self.assertEqual([m["id"] for m in delta["materiais"]], [piso.id])
+
+        # entregue uma vez: a releitura da janela não repete
+        self.assertEqual(self.sincronizar(self.url, delta["cursor"])["materiais"], [])
+        self.assertEqual(self.sincronizar(self.url, dados["cursor"])["materiais"][0]["id"], piso.id)
+
+    def test_cursor_pequeno_em_alteracao_em_massa(self):
+        inicio = (timezone.now() - timedelta(minutes=1)).isoformat()
+        MaterialSpec.objects.bulk_create(
+            MaterialSpec(projeto=self.projeto, ambiente=self.sala, item=f"Item {i}", descricao="massa")
+            for i in range(1100)
+        )
+        ids, cursor, tamanhos = [], inicio, []
+        with override_settings(SYNC_LIMITE=200):
+            while True:
+                pagina = self.sincronizar(self.url, cursor)
+                ids += [m["id"] for m in pagina["materiais"]]
+                cursor = pagina["cursor"]
+                tamanhos.append(len(cursor))
+                if not pagina["tem_mais"]:
+                    break
+        self.assertEqual(sorted(ids), sorted(MaterialSpec.objects.filter(projeto=self.projeto).values_list("id", flat=True)))
+        self.assertLess(max(tamanhos), 200)  # a janela entregue fica no servidor, não na URL
+        self.assertEqual(self.sincronizar(self.url, cursor)["materiais"], [])
+
+        # sem a entrada no cache, a janela volta inteira: repetir é inofensivo, perder não
+        caches["sincronizacao"].clear()
+        self.assertEqual(len(self.sincronizar(self.url, cursor)["materiais"]), 500)
+
+    def test_projeto_apagado_vira_lapide_unica(self):
+        cursor = self.sincronizar("/api/materiais/alteracoes/", timezone.now().isoformat())["cursor"]
+        outro_id = self.outro.id
+        self.outro.delete()
+        delta = self.sincronizar("/api/materiais/alteracoes/", cursor)
+        self.assertEqual(delta["projetos_excluidos"], [outro_id])
+        self.assertEqual(delta["materiais_excluidos"], [])
+
+    def test_cursor_invalido_ou_expirado(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"desde": "lixo"}).status_code, 400)
+        antigo = (timezone.now() - timedelta(days=365)).isoformat()
+        self.assertEqual(self.client.get(self.url, {"desde": antigo}).status_code, 410)
+
+
+@override_settings(EVENTOS_BROKER="api.eventos.BrokerLocal")
+class EventosSSETests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        broker.cache_clear()
+        self.addCleanup(broker.cache_clear)
+        self.projeto = criar_projeto(responsavel=self.usuario, ambientes=[self.sala])
+        self.token = str(RefreshToken.for_user(self.usuario).access_token)
+        self.url = f"/api/projetos/{self.projeto.id}/eventos/"
+
+    async def abrir(self, **extra):
+        resp = await AsyncClient(AUTHORIZATION=f"Bearer {self.token}", **extra).get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+        return resp.streaming_content.__aiter__()
+
+    async def proximo(self, fluxo):
+        return (await asyncio.wait_for(fluxo.__anext__(), timeout=2)).decode()
+
+    async def desconectar(self, fluxo):
+        # como o handler ASGI faz quando o cliente cai: cancela a leitura em andamento
+        leitura = asyncio.ensure_future(fluxo.__anext__())
+        await asyncio.sleep(0)
+        leitura.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await leitura
+
+    async def test_aprovacao_chega_no_fluxo(self):
+        fluxo = await self.abrir()
+        self.assertEqual(await self.proximo(fluxo), "retry: 3000\n\n")
+
+        material = await MaterialSpec.objects.filter(projeto=self.projeto).afirst()
+
+        def aprovar():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(f"/api/materiais/{material.id}/aprovar/")
+        await sync_to_async(aprovar)()
+
+        evento = await self.proximo(fluxo)
+        self.assertTrue(evento.startswith("id: 1\nevent: status\n"))
+        dados = json.loads(evento.split("data: ")[1])
+        self.assertEqual((dados["tipo"], dados["objeto"], dados["status"]), ("material", material.id, "APROVADO"))
+        await self.desconectar(fluxo)
+        self.assertEqual(broker()._assinantes, {})
+
+    async def test_retoma_com_last_event_id(self):
+        for status_ in ("APROVADO", "REPROVADO", "PENDENTE"):
+            broker().publicar(self.projeto.id, {"status": status_})
+        broker().publicar(self.projeto.id + 1, {"status": "APROVADO"})  # outro projeto
+
+        fluxo = await self.abrir(LAST_EVENT_ID="1")
+        await self.proximo(fluxo)  # retry
+        self.assertIn('"status": "REPROVADO"', await self.proximo(fluxo))
+        self.assertIn('"status": "PENDENTE"', await self.proximo(fluxo))
+        await self.desconectar(fluxo)
+
+        # id que o servidor não conhece mais: manda ressincronizar
+        fluxo = await self.abrir(LAST_EVENT_ID="99")
+        await self.proximo(fluxo)
+        self.assertEqual(await self.proximo(fluxo), "event: reset\ndata: {}\n\n")
+        await self.desconectar(fluxo)
+
+    async def test_broker_no_banco_entre_processos(self):
+        # dois brokers = dois workers: um publica, o outro entrega às suas conexões
+        worker_a, worker_b = BrokerBanco(), BrokerBanco()
+        with mock.patch("api.eventos.threading.Thread"):  # a leitura periódica é feita à mão
+            fila, pendentes, perdeu = await worker_b.assinar(self.projeto.id)
+        self.assertEqual((pendentes, perdeu), ([], False))
+
+        publicar = sync_to_async(worker_a.publicar)
+        evento = await publicar(self.projeto.id, {"status": "APROVADO"})
+        await publicar(self.projeto.id + 1, {"status": "REPROVADO"})  # outro projeto
+        await sync_to_async(worker_b.entregar_novos)()
+        self.assertEqual(await asyncio.wait_for(fila.get(), timeout=2), evento)
+        await sync_to_async(worker_b.entregar_novos)()  # releitura da janela não repete
+        self.assertTrue(fila.empty())
+
+        # reconexão com Last-Event-ID: o histórico é a tabela
+        with mock.patch("api.eventos.threading.Thread"):
+            _, pendentes, perdeu = await worker_b.assinar(self.projeto.id, ultimo_id=evento["id"] - 1)
+            _, _, perdeu_futuro = await worker_b.assinar(self.projeto.id, ultimo_id=evento["id"] + 99)
+        self.assertEqual((pendentes, perdeu, perdeu_futuro), ([evento], False, True))
+
+    async def test_assinante_novo_nao_recebe_o_que_passou_sem_ninguem_ouvindo(self):
+        worker_a, worker_b = BrokerBanco(), BrokerBanco()
+        with mock.patch("api.eventos.threading.Thread"):
+            fila, _, _ = await worker_b.assinar(self.projeto.id)
+        worker_b.cancelar(fila)
+        with mock.patch("api.eventos.time.sleep"), mock.patch("api.eventos.connection"):
+            await sync_to_async(worker_b._vigiar)()  # sem assinantes: a thread para
+        self.assertIsNone(worker_b._vigia)
+
+        antigos = [await sync_to_async(worker_a.publicar)(self.projeto.id, {"status": s})
+                   for s in ("APROVADO", "REPROVADO")]
+        with mock.patch("api.eventos.threading.Thread"):
+            fila, pendentes, perdeu = await worker_b.assinar(self.projeto.id)
+        await sync_to_async(worker_b.entregar_novos)()
+        self.assertEqual((pendentes, perdeu), ([], False))
+        self.assertTrue(fila.empty())
+
+        # com Last-Event-ID o histórico continua disponível
+        _, pendentes, _ = await worker_b.assinar(self.projeto.id, ultimo_id=antigos[0]["id"] - 1)
+        self.assertEqual(pendentes, antigos)
+
+    async def test_token_pela_url_e_projeto_inexistente(self):
+        resp = await AsyncClient().get(f"{self.url}?token={self.token}")
+        self.assertEqual(resp.status_code, 200)
+        await self.desconectar(resp.streaming_content.__aiter__())
+        resp = await AsyncClient(AUTHORIZATION=f"Bearer {self.token}").get("/api/projetos/9999/eventos/")
+        self.assertEqual(resp.status_code, 404)
+        self.assertEqual((await AsyncClient().get(self.url)).status_code, 401)
+
+
+class InicializacaoTests(TestCase):
+    def test_boot_dentro_do_orcamento_e_sem_imports_pesados(self):
+        total, modulos, _ = medir_inicializacao()
+        pesados = [m for m in modulos if m.split(".")[0] in settings.IMPORTS_SOB_DEMANDA]
+        self.assertEqual(pesados, [])
+        self.assertLessEqual(total, settings.ORCAMENTO_INICIALIZACAO_MS,
+                             f"django.setup() + URLs levou {total:.0f} ms (rode manage.py startup_profile)")
+
+
+class DiretorioUsuariosTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        for i in range(12):
+            u = criar_usuario("atendente", f"atend{i:02d}@lab.com")
+            u.first_name = "Ana" if i % 2 else "Bruno"
+            u.save()
+        self.gerente = criar_usuario("gerente", "Zelia.Gerente@lab.com")
+        self.gerente.first_name, self.gerente.last_name = "Zélia", "Souza"
+        self.gerente.save()
+
+    def test_busca_por_prefixo_em_email_nome_e_username(self):
+        resp = self.client.get("/api/usuarios/?q=ZELIA")
+        self.assertEqual([u["id"] for u in resp.data["results"]], [self.gerente.id])
+        resp = self.client.get("/api/usuarios/?q=souz")
+        self.assertEqual([u["id"] for u in resp.data["results"]], [self.gerente.id])
+        resp = self.client.get("/api/usuarios-admin/?q=ana&limite=100")
+        self.assertEqual(len(resp.data["results"]), 6)
+        # prefixo, não substring
+        self.assertEqual(self.client.get("/api/usuarios/?q=lab.com").data["results"], [])
+
+    def test_filtro_por_cargo_e_campos_min(self):
+        resp = self.client.get("/api/usuarios/?cargo=gerente&campos=min")
+        self.assertEqual(resp.data["results"], [
+            {"id": self.gerente.id, "email": "Zelia.Gerente@lab.com", "nome": "Zélia Souza", "cargo": "gerente"},
+        ])
+        self.assertEqual(self.client.get("/api/usuarios/?cargo=chefe").status_code, 400)
+
+    def test_keyset_percorre_todos_sem_repetir_em_uma_consulta_por_pagina(self):
+        vistos, url = [], "/api/usuarios/?limite=5&campos=min"
+        while url:
+            with self.assertNumQueries(1):
+                resp = self.client.get(url)
+            vistos += [u["email"] for u in resp.data["results"]]
+            url = resp.data["next"]
+        self.assertEqual(vistos, sorted(Usuario.objects.values_list("email", flat=True), key=str.lower))
+
+    def test_busca_usa_indices(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("plano verificado só no SQLite")
+
+        def plano(**params):
+            view = UsuarioViewSet(action="list", request=mock.Mock(query_params=params))
+            sql, valores = view.get_queryset().order_by("email_busca").query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}", valores)
+                return " ".join(str(linha[-1]) for linha in cursor.fetchall())
+
+        self.assertIn("SEARCH api_usuario USING INDEX usuario_cargo_email_idx", plano(q="zel", cargo="gerente"))
+        sem_cargo = plano(q="zel")
+        self.assertIn("USING INDEX usuario_", sem_cargo)
+        self.assertNotIn("TEMP B-TREE", sem_cargo)
+
+
+class AutocompleteTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        autocomplete.descartar()
+        self.addCleanup(autocomplete.descartar)
+        self.portobello = Marca.objects.create(nome="Portobello")
+        Marca.objects.create(nome="Portinari")
+        Marca.objects.create(nome="Eliane")
+        self.projeto = criar_projeto(ambientes=[self.sala, self.hall], itens=("Piso", "Pia"))
+
+    def buscar(self, tipo, prefixo, **extra):
+        return self.client.get("/api/autocomplete/", {"tipo": tipo, "prefixo": prefixo, **extra})
+
+    def test_busca_por_prefixo_sem_acento_e_sem_banco(self):
+        self.buscar("marca", "")  # monta os índices
+        with self.assertNumQueries(0):
+            resp = autocomplete.indice("marca").buscar("PÓRT")
+        self.assertEqual(resp, [{"id": Marca.objects.get(nome="Portinari").id, "nome": "Portinari"},
+                                {"id": self.portobello.id, "nome": "Portobello"}])
+        self.assertEqual(self.buscar("item", "pi").data["resultados"], [{"nome": "Pia"}, {"nome": "Piso"}])
+        self.assertEqual(len(self.buscar("marca", "p", limite=1).data["resultados"]), 1)
+        self.assertEqual(self.buscar("cor", "p").status_code, 400)
+
+    def test_signals_atualizam_depois_do_commit(self):
+        self.buscar("marca", "")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.portobello.nome = "Biancogres"
+            self.portobello.save()
+            Ambiente.objects.create(nome_do_ambiente="Área de serviço", categoria="EXTERNA")
+        self.assertEqual([m["nome"] for m in self.buscar("marca", "").data["resultados"]],
+                         ["Biancogres", "Eliane", "Portinari"])
+        self.assertEqual(self.buscar("ambiente", "area").data["resultados"][0]["nome"], "Área de serviço")
+
+        # item só some quando o último material com ele é apagado
+        pias = list(MaterialSpec.objects.filter(item="Pia"))
+        with self.captureOnCommitCallbacks(execute=True):
+            pias[0].delete()
+        self.assertEqual(self.buscar("item", "pia").data["resultados"], [{"nome": "Pia"}])
+        with self.captureOnCommitCallbacks(execute=True):
+            pias[1].delete()
+        self.assertEqual(self.buscar("item", "pia").data["resultados"], [])
+
+    @override_settings(AUTOCOMPLETE_RECONSTRUIR_S=0)
+    @mock.patch("api.autocomplete.threading.Thread")
+    def test_reconstrucao_pega_o_que_passou_por_fora_dos_signals(self, thread):
+        self.buscar("item", "")
+        MaterialSpec.objects.filter(item="Piso").update(item="Rodapé")
+
+        # índice vencido: a resposta sai do antigo, sem banco, e só uma reconstrução é disparada
+        with self.assertNumQueries(0):
+            self.assertEqual(autocomplete.indice("item").buscar("ro"), [])
+            autocomplete.indice("item")
+        thread.assert_called_once()
+
+        # o que os signals mudam durante a reconstrução não se perde na troca
+        carregar = autocomplete.IndicePrefixos.carregar
+
+        def commit_no_meio(indice, pares):
+            carregar(indice, pares)
+            autocomplete.atualizar("marca", self.portobello.id, "Biancogres")
+        with mock.patch.object(autocomplete.IndicePrefixos, "carregar", commit_no_meio):
+            autocomplete._reconstruir()  # o que a thread roda
+        self.assertEqual(self.buscar("item", "ro").data["resultados"], [{"nome": "Rodapé"}])
+        self.assertEqual(self.buscar("marca", "bian").data["resultados"][0]["id"], self.portobello.id)
+
+
+@override_settings(CACHES={
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "replica": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "replica-testes"},
+})
+class ReplicaLeituraTests(APITestBase):
+    """A "réplica" é uma cópia do banco de teste num arquivo SQLite, congelada no setUp."""
+
+    def setUp(self):
+        super().setUp()
+        self.projeto = criar_projeto(responsavel=self.usuario, ambientes=[self.sala])
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta, ignore_errors=True)
+        self.arquivo = Path(pasta) / "replica.sqlite3"
+        connection.ensure_connection()
+        copia = sqlite3.connect(self.arquivo)
+        copia.executescript("\n".join(connection.connection.iterdump()))  # backup() travaria na transação do teste
+        copia.close()
+        self.configurar_replica(self.arquivo)
+        replicas._fora_ate = 0.0
+        # o alias só existe a partir daqui; o TestCase bloquearia conexões a ele
+        patcher = mock.patch.object(type(self), "databases", {"default", "replica"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def configurar_replica(self, arquivo):
+        self.remover_replica()
+        connections.settings["replica"] = {**connections.settings["default"], "NAME": f"file:{arquivo}?mode=ro"}
+        self.addCleanup(self.remover_replica)
+
+    def remover_replica(self):
+        if "replica" in connections.settings:
+            connections["replica"].close()
+            del connections["replica"]
+            del connections.settings["replica"]
+
+    def test_get_le_da_replica_e_escrita_fixa_no_primario(self):
+        Projeto.objects.filter(pk=self.projeto.pk).update(nome_do_projeto="Só no primário")
+        url = f"/api/projetos/{self.projeto.id}/"
+        self.assertEqual(self.client.get(url).data["nome_do_projeto"], "Projeto Teste")  # réplica atrasada
+
+        resp = self.client.patch(url, {"descricao": "nova"}, format="json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(replicas.COOKIE, resp.cookies)
+        self.assertEqual(self.client.get(url).data["nome_do_projeto"], "Só no primário")
+
+        self.client.cookies.pop(replicas.COOKIE)  # janela expirou
+        self.assertEqual(self.client.get(url).data["nome_do_projeto"], "Projeto Teste")
+
+    async def test_cliente_jwt_sem_cookie_fica_no_primario_depois_de_escrever(self):
+        token = str(RefreshToken.for_user(self.usuario).access_token)
+        jwt = {"AUTHORIZATION": f"Bearer {token}"}
+        await sync_to_async(criar_projeto)("Só no primário", self.usuario)
+
+        async def total():
+            resp = await AsyncClient(**jwt).get("/api/stats/async/dashboard/")  # view async: caminho async do middleware
+            self.assertEqual(resp.status_code, 200)
+            return json.loads(resp.content)["total_projetos"]
+        self.assertEqual(await total(), 1)  # réplica atrasada
+
+        resp = await AsyncClient(**jwt).patch(f"/api/projetos/{self.projeto.id}/", {"descricao": "nova"},
+                                              content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(await total(), 2)  # nenhum cookie guardado: fixado pelo id do usuário
+
+        await sync_to_async(caches["replica"].clear)()  # janela expirou
+        self.assertEqual(await total(), 1)
+
+    def test_replica_indisponivel_volta_ao_primario(self):
+        self.configurar_replica(Path(self.arquivo.parent) / "nao-existe.sqlite3")
+        Projeto.objects.filter(pk=self.projeto.pk).update(nome_do_projeto="Só no primário")
+        with self.assertLogs("api.replicas", "WARNING"):
+            resp = self.client.get(f"/api/projetos/{self.projeto.id}/")
+        self.assertEqual(resp.data["nome_do_projeto"], "Só no primário")
+        self.assertFalse(replicas.replica_disponivel())  # não tenta de novo logo em seguida
+
+    def test_sem_replica_tudo_no_primario(self):
+        self.remover_replica()
+        Projeto.objects.filter(pk=self.projeto.pk).update(nome_do_projeto="Só no primário")
+        resp = self.client.get(f"/api/projetos/{self.projeto.id}/")
+        self.assertEqual(resp.data["nome_do_projeto"], "Só no primário")
+        self.assertNotIn(replicas.COOKIE, self.client.patch(f"/api/projetos/{self.projeto.id}/", {}, format="json").cookies)
+
+
+class ExclusaoProjetoTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        self.projeto = criar_projeto(responsavel=self.usuario, ambientes=[self.sala, self.hall], itens=("Piso", "Parede", "Teto"))
+        ModeloDocumento.objects.create(nome="Memorial", descricao="...", projeto=self.projeto)
+        self.log = Log.objects.create(usuario=self.usuario, acao="CRIACAO", projeto=self.projeto)
+        self.url = f"/api/projetos/{self.projeto.id}/"
+
+    def test_delete_esconde_na_hora_e_comando_apaga_em_lotes(self):
+        resp = self.client.delete(self.url)
+        self.assertEqual(resp.status_code, 202)
+        # 6 materiais + 1 modelo + 2 vínculos + 1 log
+        self.assertEqual(resp.data, {"id": self.projeto.id, "status": "excluindo", "total": 10, "restantes": 10, "percentual": 0})
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get("/api/projetos/").data["count"], 0)
+        self.assertEqual(MaterialSpec.objects.filter(projeto_id=self.projeto.id).count(), 6)  # ainda não apagados
+        criar_projeto(nome="Projeto Teste")  # o nome já está livre
+
+        out = StringIO()
+        with mock.patch("api.exclusao_projetos._processar_lote", wraps=exclusao_projetos._processar_lote) as lotes:
+            call_command("excluir_projetos", "--lote", "4", stdout=out)
+        self.assertIn(f"Projeto #{self.projeto.id} excluído (10 linha(s) filhas)", out.getvalue())
+        # materiais 4 + 2, modelo, vínculos, logs, resumo de atividade; e a última passada junto do DELETE
+        self.assertEqual(lotes.call_count, 6 + 5)
+        self.assertFalse(Projeto.todos.filter(pk=self.projeto.id).exists())
+        self.assertFalse(MaterialSpec.objects.filter(projeto_id=self.projeto.id).exists())
+        self.log.refresh_from_db()
+        self.assertIsNone(self.log.projeto_id)
+        self.assertTrue(Ambiente.objects.filter(pk=self.sala.pk).exists())
+
+        progresso = self.client.get(f"{self.url}exclusao/").data
+        self.assertEqual((progresso["status"], progresso["percentual"]), ("concluida", 100))
+
+    def test_progresso_e_lapide_para_a_sincronizacao(self):
+        antes = timezone.now().isoformat()
+        self.client.delete(self.url)
+        exclusao_projetos._processar_lote(MaterialSpec.objects.filter(projeto_id=self.projeto.id), "apagar", 3)
+        progresso = self.client.get(f"{self.url}exclusao/").data
+        self.assertEqual((progresso["restantes"], progresso["percentual"]), (7, 30))
+        self.assertEqual(self.client.get("/api/projetos/999/exclusao/").status_code, 404)
+
+        resp = self.client.get("/api/materiais/alteracoes/", {"desde": antes})
+        self.assertEqual(resp.data["projetos_excluidos"], [self.projeto.id])
+
+    def test_materiais_do_projeto_oculto_somem_da_api(self):
+        material = MaterialSpec.objects.filter(projeto=self.projeto).first()
+        self.client.delete(self.url)
+        self.assertEqual(self.client.get("/api/materiais/").data["count"], 0)
+        self.assertEqual(self.client.get(f"/api/materiais/{material.id}/").status_code, 404)
+        self.assertEqual(self.client.post(f"/api/materiais/{material.id}/aprovar/").status_code, 404)
+        antes = (timezone.now() - timedelta(minutes=1)).isoformat()
+        self.assertEqual(self.client.get("/api/materiais/alteracoes/", {"desde": antes}).data["materiais"], [])
+
+    def test_log_gravado_durante_a_exclusao_nao_quebra_o_delete(self):
+        self.client.delete(self.url)
+        esvaziar = exclusao_projetos._esvaziar
+
+        def log_no_meio(qs, acao, lote):
+            feitos = esvaziar(qs, acao, lote)
+            if qs.model is AtividadeDiaria and not Log.objects.filter(motivo="atrasado").exists():
+                # requisição que já estava em andamento grava depois do lote dos logs
+                Log.objects.create(usuario=self.usuario, acao="EDICAO", projeto_id=self.projeto.id, motivo="atrasado")
+            return feitos
+        with mock.patch("api.exclusao_projetos._esvaziar", log_no_meio):
+            exclusao_projetos.excluir_projeto(self.projeto.id, lote=4)
+        self.assertFalse(Projeto.todos.filter(pk=self.projeto.id).exists())
+        self.assertIsNone(Log.objects.get(motivo="atrasado").projeto_id)
+
+    def test_so_superadmin_exclui(self):
+        self.client.force_authenticate(criar_usuario("gerente"))
+        self.assertEqual(self.client.delete(self.url).status_code, 403)
+        self.assertIsNone(Projeto.objects.get(pk=self.projeto.id).excluido_em)
+
+
+class IdempotenciaTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        self.projeto = criar_projeto(responsavel=self.usuario, ambientes=[self.sala])
+        self.add_item = f"/api/projetos/{self.projeto.id}/ambientes/{self.sala.id}/add-item/"
+
+    def post(self, url, dados, chave="abc-123"):
+        return self.client.post(url, dados, format="json", HTTP_IDEMPOTENCY_KEY=chave)
+
+    def test_repeticao_devolve_a_primeira_resposta_sem_rodar_a_view(self):
+        primeira = self.post(self.add_item, {"item": "Teto"})
+        self.assertEqual(primeira.status_code, 201)
+        with self.assertNumQueries(1):  # só a busca da chave
+            segunda = self.post(self.add_item, {"item": "Teto"})
+        self.assertEqual((segunda.status_code, segunda.data), (201, primeira.data))
+        self.assertEqual(segunda["Idempotency-Replayed"], "true")
+        self.assertEqual(MaterialSpec.objects.filter(projeto=self.projeto, item="Teto").count(), 1)
+
+        # a chave é por usuário
+        self.client.force_authenticate(criar_usuario("gerente"))
+        self.assertEqual(self.post(self.add_item, {"item": "Forro"}).status_code, 201)
+
+    def test_aprovacao_e_criacao_nao_duplicam_logs_nem_projetos(self):
+        material = MaterialSpec.objects.filter(projeto=self.projeto).first()
+        for _ in range(2):
+            self.assertEqual(self.post(f"/api/materiais/{material.id}/aprovar/", {}, "k1").status_code, 200)
+        self.assertEqual(Log.objects.filter(acao="APROVACAO").count(), 1)
+
+        dados = {"nome_do_projeto": "Novo", "tipo_do_projeto": "COMERCIAL", "data_entrega": "2031-01-01", "ambientes_ids": []}
+        ids = {self.post("/api/projetos/", dados, "k2").data["id"] for _ in range(2)}
+        self.assertEqual(len(ids), 1)
+        self.assertEqual(Projeto.objects.filter(nome_do_projeto="Novo").count(), 1)
+
+    def test_chave_reutilizada_em_andamento_e_expirada(self):
+        self.post(self.add_item, {"item": "Teto"})
+        self.assertEqual(self.post(self.add_item, {"item": "Forro"}).status_code, 422)
+
+        ChaveIdempotencia.objects.create(usuario=self.usuario, chave="lenta", requisicao="x")
+        self.assertEqual(self.post(self.add_item, {"item": "Forro"}, "lenta").status_code, 422)
+        ChaveIdempotencia.objects.filter(chave="lenta").update(requisicao=idempotencia._assinatura(
+            mock.Mock(method="POST", path=self.add_item, data={"item": "Forro"})))
+        self.assertEqual(self.post(self.add_item, {"item": "Forro"}, "lenta").status_code, 409)
+
+        ChaveIdempotencia.objects.update(criada_em=timezone.now() - timedelta(hours=settings.IDEMPOTENCIA_TTL_HORAS + 1))
+        self.assertEqual(self.post(self.add_item, {"item": "Forro"}, "lenta").status_code, 201)
+        self.assertEqual(ChaveIdempotencia.objects.get(chave="lenta").status_code, 201)  # a expirada foi substituída
+
+    def test_reserva_de_worker_morto_e_assumida(self):
+        assinatura = idempotencia._assinatura(mock.Mock(method="POST", path=self.add_item, data={"item": "Forro"}))
+        ChaveIdempotencia.objects.create(usuario=self.usuario, chave="morta", requisicao=assinatura)
+        self.assertEqual(self.post(self.add_item, {"item": "Forro"}, "morta").status_code, 409)  # ainda no prazo
+
+        ChaveIdempotencia.objects.update(
+            criada_em=timezone.now() - timedelta(seconds=settings.IDEMPOTENCIA_RESERVA_S + 1))
+        self.assertEqual(self.post(self.add_item, {"item": "Forro"}, "morta").status_code, 201)
+        self.assertEqual(ChaveIdempotencia.objects.get(chave="morta").status_code, 201)
+        self.assertEqual(self.post(self.add_item, {"item": "Forro"}, "morta")["Idempotency-Replayed"], "true")
+        self.assertEqual(MaterialSpec.objects.filter(projeto=self.projeto, item="Forro").count(), 1)
+
+    def test_falha_ao_guardar_a_resposta_desfaz_a_view(self):
+        material = MaterialSpec.objects.filter(projeto=self.projeto).first()
+        url = f"/api/materiais/{material.id}/aprovar/"
+        with mock.patch("api.idempotencia.JSONRenderer.render", side_effect=RuntimeError("queda")):
+            with self.assertRaises(RuntimeError):
+                self.post(url, {})
+        material.refresh_from_db()
+        self.assertEqual(material.status, "PENDENTE")  # nada confirmado sem a resposta guardada
+        self.assertFalse(ChaveIdempotencia.objects.exists())
+
+        self.assertEqual(self.post(url, {}).status_code, 200)
+        self.assertEqual(ChaveIdempotencia.objects.get().status_code, 200)
+        self.assertEqual(Log.objects.filter(acao="APROVACAO").count(), 1)
+
+    def test_erro_libera_a_chave_e_sem_cabecalho_nada_muda(self):
+        self.assertEqual(self.post(self.add_item, {}).status_code, 400)
+        self.assertFalse(ChaveIdempotencia.objects.exists())
+        self.assertEqual(self.client.post(self.add_item, {"item": "Teto"}, format="json").status_code, 201)
+        self.assertFalse(ChaveIdempotencia.objects.exists())
+
+
+class ItensEmMassaTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        self.quarto = Ambiente.objects.create(nome_do_ambiente="Quarto", categoria="PRIVATIVA")
+        self.outro = Ambiente.objects.create(nome_do_ambiente="Cozinha", categoria="PRIVATIVA")  # fora do projeto
+        self.projeto = criar_projeto(responsavel=self.usuario, ambientes=[self.sala, self.quarto, self.hall], itens=("Piso",))
+        self.marca = Marca.objects.create(nome="Santa Luzia")
+        self.url = f"/api/projetos/{self.projeto.id}/itens-em-massa/"
+
+    def test_categoria_cria_em_todos_os_ambientes(self):
+        with self.assertNumQueries(10):  # projeto, marca, alvos, bulk_create, contadores (2 contagens + update), ids e savepoint
+            resp = self.client.post(self.url, {"item": "Rodapé", "descricao": "7cm", "marca": self.marca.id,
+                                               "categoria": "PRIVATIVA"}, format="json")
+        self.assertEqual(resp.data, {"ambientes": sorted([self.sala.id, self.quarto.id]), "criados": 2, "atualizados": 0, "ignorados": 0})
+        self.assertEqual(set(MaterialSpec.objects.filter(item="Rodapé").values_list("ambiente_id", "marca_id")),
+                         {(self.sala.id, self.marca.id), (self.quarto.id, self.marca.id)})
+        self.projeto.refresh_from_db()
+        self.assertEqual(self.projeto.materiais_pendentes, 5)
+
+    def test_itens_novos_entram_no_autocomplete(self):
+        autocomplete.descartar()
+        self.addCleanup(autocomplete.descartar)
+        autocomplete.indice("item")  # montado antes: só os signals (ou a view) o atualizam
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {"item": "Soleira", "categoria": "PRIVATIVA"}, format="json")
+        self.assertEqual(autocomplete.indice("item").buscar("sol"), [{"nome": "Soleira"}])
+
+    def test_pular_ou_sobrescrever_existentes(self):
+        piso = MaterialSpec.objects.get(projeto=self.projeto, ambiente=self.sala, item="Piso")
+        piso.status, piso.motivo = "APROVADO", "ok"
+        piso.save()
+
+        resp = self.client.post(self.url, {"item": "Piso", "descricao": "novo", "ambientes": [self.sala.id]}, format="json")
+        self.assertEqual((resp.data["criados"], resp.data["ignorados"]), (0, 1))
+        piso.refresh_from_db()
+        self.assertEqual((piso.descricao, piso.status), ("Piso de Sala", "APROVADO"))
+
+        resp = self.client.post(self.url, {"item": "Piso", "descricao": "novo", "ambientes": [self.sala.id, self.hall.id],
+                                           "existentes": "sobrescrever"}, format="json")
+        self.assertEqual((resp.data["criados"], resp.data["atualizados"]), (0, 2))
+        piso.refresh_from_db()
+        self.assertEqual((piso.id, piso.descricao, piso.status, piso.motivo), (piso.id, "novo", "PENDENTE", None))
+        self.projeto.refresh_from_db()
+        self.assertEqual((self.projeto.materiais_pendentes, self.projeto.materiais_aprovados), (3, 0))
+
+    def test_validacoes(self):
+        def post(**dados):
+            return self.client.post(self.url, {"item": "Rodapé", **dados}, format="json")
+
+        self.assertEqual(post().status_code, 400)  # sem seletor
+        self.assertEqual(post(categoria="COMUM", ambientes=[self.hall.id]).status_code, 400)
+        resp = post(ambientes=[self.sala.id, self.outro.id])
+        self.assertEqual((resp.status_code, resp.data["ids"]), (400, [self.outro.id]))
+        self.assertEqual(post(categoria="COMUM", existentes="trocar").status_code, 400)
+        self.assertEqual(post(categoria="COMUM", marca=999).status_code, 400)
+        # tipos errados são 400, não 500
+        self.assertEqual(post(tipo="abc").status_code, 400)
+        self.assertEqual(post(categoria="COMUM", descricao=None).status_code, 400)
+        self.assertEqual(post(ambientes=["x"]).status_code, 400)
+        self.assertEqual(post(ambientes=[True]).status_code, 400)
+        self.assertFalse(MaterialSpec.objects.filter(item="Rodapé").exists())
+        self.client.force_authenticate(criar_usuario("atendente"))
+        self.assertEqual(post(categoria="COMUM").status_code, 403)
+
+
+class PerfilamentoTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        self.projeto = criar_projeto(responsavel=self.usuario, ambientes=[self.sala])
+        self.url = f"/api/projetos/{self.projeto.id}/"
+
+    def get_com_token(self, usuario, **extra):
+        token = RefreshToken.for_user(usuario).access_token
+        return APIClient().get(self.url, HTTP_AUTHORIZATION=f"Bearer {token}", **extra)
+
+    def test_cabecalho_de_gerente_grava_perfil(self):
+        gerente = criar_usuario("gerente")
+        resp = self.get_com_token(gerente, HTTP_X_PERFILAR="1")
+        self.assertEqual(resp.status_code, 200)
+        registro = PerfilRequisicao.objects.get(pk=resp["X-Perfil-Id"])
+        self.assertEqual((registro.metodo, registro.caminho, registro.usuario, registro.motivo, registro.status_code),
+                         ("GET", self.url, gerente, "CABECALHO", 200))
+        self.assertIn("api/projetos/", registro.rota)
+        self.assertGreater(registro.duracao_ms, 0)
+        funcoes = [f for _, _, _, f in perfilamento.top_funcoes(bytes(registro.perfil))]
+        self.assertTrue(any("retrieve" in f for f in funcoes))
+
+        # atendente (ou sem token) não consegue pedir
+        self.assertNotIn("X-Perfil-Id", self.get_com_token(criar_usuario("atendente"), HTTP_X_PERFILAR="1"))
+        self.assertNotIn("X-Perfil-Id", APIClient().get(self.url, HTTP_X_PERFILAR="1"))
+        self.assertEqual(PerfilRequisicao.objects.count(), 1)
+
+    async def test_asgi_perfila_view_sincrona_e_pula_view_async(self):
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.usuario).access_token))()
+        cliente = AsyncClient(AUTHORIZATION=f"Bearer {token}", X_PERFILAR="1")
+        resp = await cliente.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        registro = await PerfilRequisicao.objects.aget(pk=resp["X-Perfil-Id"])
+        funcoes = [f for _, _, _, f in perfilamento.top_funcoes(bytes(registro.perfil))]
+        self.assertTrue(any("retrieve" in f for f in funcoes))  # a view rodou na thread perfilada
+
+        resp = await cliente.get("/api/stats/async/dashboard/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn("X-Perfil-Id", resp)
+        self.assertEqual(await PerfilRequisicao.objects.acount(), 1)
+
+    def test_amostragem(self):
+        with override_settings(PERFIL_AMOSTRAGEM=1.0):
+            self.get_com_token(criar_usuario("atendente"))
+        with override_settings(PERFIL_AMOSTRAGEM=0):
+            self.get_com_token(self.usuario)
+        self.assertEqual(list(PerfilRequisicao.objects.values_list("motivo", flat=True)), ["AMOSTRAGEM"])
+
+    def test_admin_mostra_tabela_e_baixa_o_prof(self):
+        resp = self.get_com_token(self.usuario, HTTP_X_PERFILAR="1")
+        pk = resp["X-Perfil-Id"]
+        admin_user = Usuario.objects.create_superuser(username="root", email="root@lab.com", password="123456")
+        self.client.force_login(admin_user)
+        pagina = self.client.get(f"/admin/api/perfilrequisicao/{pk}/change/")
+        self.assertContains(pagina, "acumulado ms")
+        self.assertContains(pagina, "retrieve")
+        self.assertContains(pagina, f"perfil-{pk}.prof")
+
+        arquivo = self.client.get(f"/admin/api/perfilrequisicao/{pk}/download/")
+        with tempfile.NamedTemporaryFile(suffix=".prof") as f:
+            f.write(arquivo.content)
+            f.flush()
+            self.assertGreater(pstats.Stats(f.name).total_calls, 0)
+
+
+class MetricasTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        metricas.registro._zerar()
+        self.projeto = criar_projeto(responsavel=self.usuario, ambientes=[self.sala])
+
+    def linhas(self, **extra):
+        resp = APIClient().get("/metrics", **extra)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp["Content-Type"].startswith("text/plain; version=0.0.4"))
+        return resp.content.decode().splitlines()
+
+    def test_latencia_e_consultas_por_rota(self):
+        self.client.get(f"/api/projetos/{self.projeto.id}/")
+        self.client.get(f"/api/projetos/{self.projeto.id}/")
+        linhas = self.linhas()
+        rota = 'metodo="GET",rota="projetos-detail",status="2xx"'
+        self.assertIn(f"http_requisicoes_segundos_count{{{rota}}} 2", linhas)
+        self.assertIn(f'http_requisicoes_segundos_bucket{{{rota},le="+Inf"}} 2', linhas)
+        self.assertIn("# TYPE http_requisicoes_segundos histogram", linhas)
+        self.assertIn("http_requisicoes_em_andamento 0", linhas)
+        consultas = next(l for l in linhas if l.startswith('db_consultas_total{rota="projetos-detail"}'))
+        self.assertGreater(int(consultas.split()[-1]), 0)
+        # o próprio scrape não entra na conta
+        self.assertFalse(any('rota="metricas"' in l for l in self.linhas()))
+
+    def valor(self, nome, **labels):
+        return metricas.registro.valores.get((nome, tuple(sorted(labels.items()))), 0)
+
+    def test_streaming_conta_ate_o_corpo_sair(self):
+        with self.settings(JSON_STREAMING_MIN_ITENS=0):
+            resp = self.client.get(f"/api/projetos/{self.projeto.id}/")
+        self.assertTrue(resp.streaming)
+        self.assertEqual(self.valor("http_requisicoes_em_andamento"), 1)  # corpo ainda não saiu
+        b"".join(resp.streaming_content)
+        self.assertEqual(self.valor("http_requisicoes_em_andamento"), 0)
+        self.assertIn('http_requisicoes_segundos_count{metodo="GET",rota="projetos-detail",status="2xx"} 1',
+                      self.linhas())
+
+    async def test_asgi_conta_consultas_da_thread_da_view(self):
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.usuario).access_token))()
+        cliente = AsyncClient(AUTHORIZATION=f"Bearer {token}")
+        for url in ("/api/stats/async/dashboard/", f"/api/projetos/{self.projeto.id}/"):
+            self.assertEqual((await cliente.get(url)).status_code, 200)
+        # a view async consulta via sync_to_async; a síncrona roda inteira em outra thread
+        self.assertGreater(self.valor("db_consultas_total", rota="stats-dashboard-async"), 0)
+        self.assertGreater(self.valor("db_consultas_total", rota="projetos-detail"), 0)
+        self.assertEqual(self.valor("http_requisicoes_em_andamento"), 0)
+
+    def test_login_pdf_e_cache(self):
+        APIClient().post("/api/token/", {"email": self.usuario.email, "password": "errada"}, format="json")
+        especificacao.renderizar_especificacao(dados_especificacao([self.projeto.id])[0])
+        autocomplete.descartar()
+        self.client.get("/api/autocomplete/", {"tipo": "ambiente", "q": "sa"})
+        self.client.get("/api/autocomplete/", {"tipo": "ambiente", "q": "ha"})
+        linhas = self.linhas()
+        self.assertIn('login_verificacao_segundos_count{resultado="falha"} 1', linhas)
+        self.assertIn("pdf_renderizacao_segundos_count 1", linhas)
+        self.assertIn('cache_acertos_total{cache="autocomplete"} 1', linhas)
+        self.assertIn('cache_taxa_acerto{cache="autocomplete"} 0.5', linhas)
+
+    def test_junta_os_arquivos_dos_workers(self):
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, diretorio)
+        # worker que já saiu: contadores e histogramas ficam, o gauge não
+        morto = {
+            "pid": 2**22 + 1,
+            "valores": [["http_requisicoes_em_andamento", [], 3], ["db_consultas_total", [["rota", "x"]], 5]],
+            "histogramas": [["pdf_renderizacao_segundos", [], [1] + [0] * 10 + [0.04]]],
+        }
+        for pid in (morto["pid"], morto["pid"] + 1):  # dois workers reciclados
+            with open(Path(diretorio) / f"metricas-{pid}.json", "w") as f:
+                json.dump({**morto, "pid": pid}, f)
+        with override_settings(METRICAS_DIR=diretorio):
+            metricas.consolidar(morto["pid"])  # child_exit do gunicorn
+            metricas.somar("db_consultas_total", 2, rota="x")
+            metricas.observar("pdf_renderizacao_segundos", 3)
+            linhas = self.linhas()  # a coleta consolida o outro, que saiu sem child_exit
+            self.assertEqual(self.linhas(), linhas)  # consolidado uma vez só
+        self.assertIn('db_consultas_total{rota="x"} 12', linhas)
+        self.assertNotIn("http_requisicoes_em_andamento 6", linhas)
+        self.assertIn('pdf_renderizacao_segundos_bucket{le="0.05"} 2', linhas)
+        self.assertIn('pdf_renderizacao_segundos_bucket{le="5"} 3', linhas)
+        self.assertIn("pdf_renderizacao_segundos_sum 3.08", linhas)
+        # só o acumulado dos que saíram e o arquivo deste processo
+        self.assertEqual(sorted(os.listdir(diretorio)),
+                         sorted([".consolidacao.lock", metricas.ARQUIVO_MORTOS, f"metricas-{os.getpid()}.json"]))
+
+    @override_settings(METRICAS_TOKEN="segredo")
+    def test_token(self):
+        self.assertEqual(APIClient().get("/metrics").status_code, 401)
+        self.linhas(HTTP_AUTHORIZATION="Bearer segredo")
+
+
+class AtividadeTests(APITestBase):
+    url = "/api/stats/atividade/"
+
+    def setUp(self):
+        super().setUp()
+        self.projeto = criar_projeto(responsavel=self.usuario, ambientes=[self.sala, self.hall])
+        Projeto.objects.filter(pk=self.projeto.pk).update(data_criacao=timezone.now() - timedelta(hours=2))
+        self.gerente = criar_usuario("gerente")
+        cliente = APIClient()
+        cliente.force_authenticate(self.gerente)
+        piso, parede, piso_hall, _ = MaterialSpec.objects.filter(projeto=self.projeto).order_by("id")
+        cliente.post(f"/api/materiais/{piso.id}/aprovar/")
+        cliente.post(f"/api/materiais/{parede.id}/aprovar/")
+        cliente.post(f"/api/materiais/{piso_hall.id}/reprovar/", {"motivo": "cor"}, format="json")
+        cliente.post(f"/api/materiais/{piso.id}/reverter/")
+
+    def linhas(self):
+        return list(AtividadeDiaria.objects.order_by("dia", "usuario_id", "projeto_id").values(
+            "dia", "usuario_id", "projeto_id", "aprovacoes", "reprovacoes", "edicoes", "decisoes_por_faixa"))
+
+    def test_resumo_mantido_pelos_logs(self):
+        with self.assertNumQueries(1):
+            dados = self.client.get(self.url).data
+        revisor, = dados["usuarios"]
+        self.assertEqual(
+            {k: revisor[k] for k in ("usuario", "email", "aprovacoes", "reprovacoes", "edicoes", "decisoes")},
+            {"usuario": self.gerente.id, "email": self.gerente.email, "aprovacoes": 2, "reprovacoes": 1,
+             "edicoes": 1, "decisoes": 3},
+        )
+        # as 3 decisões caem na faixa de 1 h a 3 h: a mediana fica no meio dela
+        self.assertEqual(revisor["mediana_decisao_horas"], 2.0)
+        self.assertEqual(dados["projetos"][0]["projeto"], self.projeto.id)
+        self.assertEqual(dados["projetos"][0]["aprovacoes"], 2)
+
+        ontem = (timezone.localdate() - timedelta(days=1)).isoformat()
+        self.assertEqual(self.client.get(self.url, {"fim": ontem}).data["usuarios"], [])
+        self.assertEqual(self.client.get(self.url, {"usuario": self.usuario.id}).data["usuarios"], [])
+
+    def test_recalcular_reproduz_o_resumo(self):
+        mantido = self.linhas()
+        AtividadeDiaria.objects.all().delete()
+        call_command("recalcular_atividade", stdout=StringIO())
+        self.assertEqual(self.linhas(), mantido)
+
+        # refazer um intervalo não duplica
+        hoje = timezone.localdate().isoformat()
+        call_command("recalcular_atividade", "--desde", hoje, "--ate", hoje, stdout=StringIO())
+        self.assertEqual(self.linhas(), mantido)
+
+    def test_uma_linha_sem_projeto_por_dia_e_usuario(self):
+        chave = {"dia": timezone.localdate(), "usuario": self.gerente, "projeto": None}
+        AtividadeDiaria.objects.create(**chave, edicoes=1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            AtividadeDiaria.objects.create(**chave, edicoes=1)
+
+        # o projeto apagado junta o resumo dele na linha sem projeto, em vez de colidir
+        exclusao_projetos.ocultar(self.projeto)
+        exclusao_projetos.excluir_projeto(self.projeto.id)
+        linha, = self.linhas()
+        self.assertEqual((linha["projeto_id"], linha["aprovacoes"], linha["reprovacoes"], linha["edicoes"]),
+                         (None, 2, 1, 2))
+        self.assertEqual(sum(linha["decisoes_por_faixa"]), 3)
+
+    def test_mediana_das_faixas(self):
+        faixas = [0] * (len(atividade.FAIXAS_DECISAO_S) + 1)
+        self.assertIsNone(atividade.mediana_faixas(faixas))
+        faixas[0], faixas[-1] = 1, 1
+        self.assertEqual(atividade.mediana_faixas(faixas), 900)
+        faixas[-1] = 5
+        self.assertEqual(atividade.mediana_faixas(faixas), atividade.FAIXAS_DECISAO_S[-1])
+
+    def test_permissao_e_datas(self):
+        atendente = APIClient()
+        atendente.force_authenticate(criar_usuario("atendente"))
+        self.assertEqual(atendente.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get(self.url, {"inicio": "31/12/2025"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"inicio": "2026-02-01", "fim": "2026-01-01"}).status_code, 400)
@@ -0,0 +1,216 @@
+"""
+Proteção contra sobrecarga, tudo em memória (por processo):
+
+- `TokenBucketThrottle`: throttle do DRF no formato balde de fichas. A taxa vem
+  de REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"] ("5/min" = balde de 5 fichas,
+  repostas a 5 por minuto). Estourou -> 429 com Retry-After.
+- `LimiteConcorrenciaMixin`: no máximo N requisições simultâneas por ação
+  (settings.LIMITES_CONCORRENCIA). Sem vaga, a ação degrada (ex.: detalhe do
+  projeto sem `materiais_com_marcas`) ou recusa na hora com 503 + Retry-After,
+  em vez de ocupar o worker numa fila.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.throttling import BaseThrottle
+
+
+# ---------------- TOKEN BUCKET ----------------
+
+class TokenBucket:
+    """
+    Um balde por chave (usuário ou IP). Balde parado há mais tempo do que leva
+    para encher de novo é igual a um balde novo: some na limpeza, feita no
+    máximo uma vez por esse intervalo. Além disso, acima de `max_chaves` os
+    menos usados recentemente são descartados (rotação de IPs não cresce a
+    memória sem limite).
+    """
+
+    def __init__(self, capacidade, por_segundo, max_chaves=None):
+        self.capacidade = capacidade
+        self.por_segundo = por_segundo
+        self.max_chaves = max_chaves or settings.THROTTLE_MAX_CHAVES
+        self.tempo_cheio = capacidade / por_segundo
+        self._baldes = OrderedDict()  # chave -> (fichas, instante da última reposição), do mais antigo ao mais recente
+        self._proxima_limpeza = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._baldes)
+
+    def _limpar(self, agora):
+        # a ordem é a do último uso: para no primeiro que ainda não encheu
+        while self._baldes:
+            chave, (_, ultimo) = next(iter(self._baldes.items()))
+            if agora - ultimo < self.tempo_cheio:
+                break
+            del self._baldes[chave]
+        self._proxima_limpeza = agora + self.tempo_cheio
+
+    def consumir(self, chave, agora=None):
+        """Tira uma ficha do balde da chave. Retorna 0 se conseguiu, senão os segundos até a próxima ficha."""
+        agora = time.monotonic() if agora is None else agora
+        with self._lock:
+            if self._proxima_limpeza is None or agora >= self._proxima_limpeza:
+                self._limpar(agora)
+            fichas, ultimo = self._baldes.pop(chave, (self.capacidade, agora))
+            fichas = min(self.capacidade, fichas + (agora - ultimo) * self.por_segundo)
+            espera = 0 if fichas >= 1 else (1 - fichas) / self.por_segundo
+            self._baldes[chave] = (fichas - 1 if fichas >= 1 else fichas, agora)
+            while len(self._baldes) > self.max_chaves:
+                self._baldes.popitem(last=False)
+            return espera
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Igual ao ScopedRateThrottle do DRF (usa `throttle_scope` da view, ou o
+    `scope` da subclasse), mas com balde de fichas em memória: permite rajadas
+    curtas e não depende de cache.
+    """
+    scope = None
+    _baldes = {}  # escopo -> TokenBucket (compartilhado pelas threads do processo)
+    _lock = threading.Lock()
+
+    def allow_request(self, request, view):
+        escopo = getattr(view, "throttle_scope", None) or self.scope
+        taxa = settings.REST_FRAMEWORK.get("DEFAULT_THROTTLE_RATES", {}).get(escopo)
+        if not taxa:
+            return True
+
+        balde = self.balde(escopo, taxa)
+        if request.user and request.user.is_authenticated:
+            chave = f"user:{request.user.pk}"
+        else:
+            chave = f"ip:{self.get_ident(request)}"
+        self.espera = balde.consumir(chave)
+        return self.espera == 0
+
+    def wait(self):
+        return self.espera
+
+    @classmethod
+    def balde(cls, escopo, taxa):
+        with cls._lock:
+            balde = cls._baldes.get((escopo, taxa))
+            if balde is None:
+                quantidade, periodo = taxa.split("/")
+                quantidade = int(quantidade)
+                duracao = {"s": 1, "m": 60, "h": 3600, "d": 86400}[periodo[0]]
+                balde = cls._baldes[(escopo, taxa)] = TokenBucket(quantidade, quantidade / duracao)
+            return balde
+
+    @classmethod
+    def reiniciar(cls):
+        with cls._lock:
+            cls._baldes.clear()
+
+
+class LoginThrottle(TokenBucketThrottle):
+    scope = "token"
+
+
+class RefreshTokenThrottle(TokenBucketThrottle):
+    scope = "token_refresh"
+
+
+class EspecificacaoThrottle(TokenBucketThrottle):
+    scope = "especificacao"
+
+
+# ---------------- CONCORRÊNCIA ----------------
+
+class Sobrecarregado(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Servidor ocupado com outras requisições pesadas. Tente novamente em instantes."
+    default_code = "sobrecarregado"
+
+    def __init__(self, wait):
+        super().__init__()
+        self.wait = wait  # o exception_handler do DRF vira Retry-After
+
+
+class _Vagas:
+    """Semáforos por nome, criados sob demanda com o limite do settings."""
+    _semaforos = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def tentar(cls, nome):
+        limite = settings.LIMITES_CONCORRENCIA[nome]
+        with cls._lock:
+            semaforo = cls._semaforos.get((nome, limite))
+            if semaforo is None:
+                semaforo = cls._semaforos[(nome, limite)] = threading.BoundedSemaphore(limite)
+        return semaforo if semaforo.acquire(blocking=False) else None
+
+
+class _LiberaAoFechar:
+    """
+    Corpo de resposta em streaming que devolve a vaga quando termina de sair
+    (ou quando o servidor fecha a resposta, mesmo sem ter começado a enviar).
+    """
+
+    def __init__(self, conteudo, semaforo):
+        self._conteudo = iter(conteudo)
+        self._semaforo = semaforo
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._conteudo)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if self._semaforo is not None:
+            self._semaforo.release()
+            self._semaforo = None
+        if hasattr(self._conteudo, "close"):
+            self._conteudo.close()
+
+
+class LimiteConcorrenciaMixin:
+    """
+    `limites_concorrencia = {"acao": ("nome em LIMITES_CONCORRENCIA", "degradar" | "recusar")}`.
+    No modo "degradar" a view confere `self.degradado` e faz menos trabalho.
+    """
+    limites_concorrencia = {}
+    degradado = False
+    _vaga = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        limite = self.limites_concorrencia.get(self.action)
+        if limite is None:
+            return
+        nome, modo = limite
+        self._vaga = _Vagas.tentar(nome)
+        if self._vaga is None:
+            if modo == "recusar":
+                raise Sobrecarregado(wait=settings.RETRY_AFTER_SOBRECARGA)
+            self.degradado = True
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["degradado"] = self.degradado
+        return context
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        vaga, self._vaga = self._vaga, None
+        if vaga is not None:
+            if response.streaming:
+                response.streaming_content = _LiberaAoFechar(response.streaming_content, vaga)
+            else:
+                vaga.release()
+        if self.degradado:
+            response["X-Degradado"] = "1"
+        return response
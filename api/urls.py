@@ -2,7 +2,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView
 from .serializers import CustomTokenObtainPairSerializer
-from . import views
+from . import views, async_views
+from .throttling import LoginThrottle
 
 router = DefaultRouter()
 router.register(r'usuarios', views.UsuarioViewSet, basename='usuarios')
@@ -21,11 +22,19 @@ router.register(r'marcas-descricao', views.DescricaoMarcaViewSet, basename='marc
 stats_patterns = [
     path('dashboard/', views.dashboard_stats, name='dashboard-stats'),
     path('mensais/', views.stats_mensais, name='stats-mensais'),
+    path('atividade/', views.stats_atividade, name='stats-atividade'),
+
+    # versões async (ASGI: uvicorn/daphne com config.asgi)
+    path('async/dashboard/', async_views.dashboard_stats, name='stats-dashboard-async'),
+    path('async/mensais/', async_views.stats_mensais, name='stats-mensais-async'),
+    path('async/painel/', async_views.painel, name='stats-painel-async'),
 ]
 
 urlpatterns = [
     path('', include(router.urls)),
     path('projetos/<int:projeto_id>/ambientes/<int:ambiente_id>/add-item/', views.add_material_item, name='add-item'),
+    path('projetos/<int:projeto_id>/eventos/', async_views.eventos_projeto, name='projeto-eventos'),  # SSE (ASGI)
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
     path('stats/', include(stats_patterns)),  # agrupamento limpo
-    path("api/token/", TokenObtainPairView.as_view(serializer_class=CustomTokenObtainPairSerializer), name="token_obtain_pair"),
+    path("api/token/", TokenObtainPairView.as_view(serializer_class=CustomTokenObtainPairSerializer, throttle_classes=[LoginThrottle]), name="token_obtain_pair"),
 ]
\ No newline at end of file
@@ -1,43 +1,109 @@
-from django.db import models
+from datetime import datetime, timedelta
+
+from django.db import IntegrityError, connection, models, transaction
 from rest_framework import viewsets, permissions, status
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from django.utils import timezone
-from django.db.models.functions import TruncMonth
-from django.db.models import Count, Prefetch
-from django.core.mail import send_mail
+from django.db.models.functions import Lower, TruncMonth
+from django.db.models import Count, Prefetch, Q
 from django.conf import settings
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
-from reportlab.lib.styles import ParagraphStyle
-from reportlab.lib.enums import TA_LEFT
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 
 from django.shortcuts import get_object_or_404
+from django.utils.crypto import get_random_string
 
-from .models import Usuario, Projeto, Ambiente, Log, ModeloDocumento, MaterialSpec, TipoAmbiente, Marca, DescricaoMarca
+from .models import Usuario, Projeto, Ambiente, Log, ModeloDocumento, MaterialSpec, TipoAmbiente, Marca, DescricaoMarca, Exclusao
 from .serializers import (
-    UsuarioSerializer, ProjetoSerializer, ProjetoListSerializer, AmbienteSerializer,
+    UsuarioSerializer, UsuarioResumoSerializer, ProjetoSerializer, ProjetoListSerializer, AmbienteSerializer,
     LogSerializer, ModeloDocumentoSerializer, MyTokenObtainPairSerializer,
-    MaterialSpecSerializer, TipoAmbienteSerializer, MarcaSerializer, DescricaoMarcaSerializer
+    MaterialSpecSerializer, TipoAmbienteSerializer, MarcaSerializer, DescricaoMarcaSerializer,
+    ItensEmMassaSerializer, materiais_para_serializer,
 )
+from .renderers import ListaSobDemanda, StreamingJSONRenderer
+from .arquivo_logs import LogsComArquivo, ler_arquivados
+from .eventos import publicar_status
+from .idempotencia import idempotente
+from .signals import notificar_redefinicao_senha
+from . import atividade, autocomplete as autocompletar, exclusao_projetos, sincronizacao
+from .throttling import EspecificacaoThrottle, LimiteConcorrenciaMixin, LoginThrottle, RefreshTokenThrottle
 from .permissions import (
-    AllowCreateForBasicButNoEdit, AllowWriteForManagerUp, OnlySuperadminDelete
+    AllowCreateForBasicButNoEdit, AllowWriteForManagerUp, ManagerUpOnly, OnlySuperadminDelete
 )
 
+# ---------------- DIRETÓRIO DE USUÁRIOS ----------------
+class UsuariosCursorPagination(CursorPagination):
+    """
+    Keyset pelo e-mail em minúsculas: cada página é uma faixa do índice
+    (`usuario_email_busca_idx` / `usuario_cargo_email_idx`), sem OFFSET nem COUNT.
+    """
+    ordering = ("email_busca",)
+    page_size_query_param = "limite"
+    max_page_size = 100
+
+
+class DiretorioUsuariosMixin:
+    """
+    Listagem de usuários com:
+    - ?q=      prefixo (sem diferenciar maiúsculas) em e-mail, nome, sobrenome ou username;
+    - ?cargo=  atendente | gerente | superadmin;
+    - ?campos=min  só id, email, nome e cargo.
+    O prefixo vira uma faixa `>= q AND < fim` sobre LOWER(campo), que usa os
+    índices de expressão do Usuario (LIKE/ILIKE não usaria).
+    """
+    pagination_class = UsuariosCursorPagination
+    CAMPOS_BUSCA = ("email", "first_name", "last_name", "username")
+    CAMPOS_MIN = ("id", "email", "first_name", "last_name", "cargo")
+
+    def campos_min(self):
+        return self.request.query_params.get("campos") == "min" and self.action in ("list", "retrieve")
+
+    def get_queryset(self):
+        qs = Usuario.objects.annotate(email_busca=Lower("email"))
+        if self.campos_min():
+            qs = qs.only(*self.CAMPOS_MIN)
+        if self.action != "list":
+            return qs
+
+        params = self.request.query_params
+        cargo = params.get("cargo")
+        if cargo:
+            if cargo not in dict(Usuario.CARGO_CHOICES):
+                raise ValidationError({"cargo": f"Cargo inválido: {cargo}."})
+            qs = qs.filter(cargo=cargo)
+
+        q = params.get("q", "").strip().lower()
+        if q:
+            # menor string maior que todas as que começam com q
+            fim = q[:-1] + chr(ord(q[-1]) + 1)
+            filtro = Q()
+            for campo in self.CAMPOS_BUSCA:
+                apelido = f"{campo}_busca"
+                if apelido != "email_busca":
+                    qs = qs.alias(**{apelido: Lower(campo)})
+                filtro |= Q(**{f"{apelido}__gte": q, f"{apelido}__lt": fim})
+            qs = qs.filter(filtro)
+        return qs
+
+    def get_serializer_class(self):
+        if self.campos_min():
+            return UsuarioResumoSerializer
+        return super().get_serializer_class()
+
+
 # ---------------- USUÁRIOS (somente leitura) ----------------
-class UsuarioViewSet(viewsets.ReadOnlyModelViewSet):
+class UsuarioViewSet(DiretorioUsuariosMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Usuario.objects.all()
     serializer_class = UsuarioSerializer
     permission_classes = [permissions.IsAuthenticated]  # apenas logados
 
 
 # --- CRIAR USUÁRIOS (apenas superadmin) ---
-class UsuarioAdminViewSet(viewsets.ModelViewSet):
+class UsuarioAdminViewSet(DiretorioUsuariosMixin, viewsets.ModelViewSet):
     queryset = Usuario.objects.all().order_by("id")
     serializer_class = UsuarioSerializer
 
@@ -51,13 +117,15 @@ class UsuarioAdminViewSet(viewsets.ModelViewSet):
         return [permissions.IsAuthenticated()]
 
     @action(detail=True, methods=['post'], url_path='resetar-senha')
+    @transaction.atomic
     def resetar_senha(self, request, pk=None):
         usuario = self.get_object()
-        nova_senha = Usuario.objects.make_random_password()
+        nova_senha = get_random_string(10)
         usuario.set_password(nova_senha)
         usuario.save()
 
-        # envia o e-mail automaticamente usando a função do signals
+        # enfileira o e-mail (Outbox) usando a função do signals; o envio SMTP
+        # acontece fora do request, no `manage.py send_outbox`
         notificar_redefinicao_senha(usuario, nova_senha)
 
         return Response(    
@@ -65,9 +133,86 @@ class UsuarioAdminViewSet(viewsets.ModelViewSet):
             status=200
         )
 
+# ---------------- STREAMING DE RESPOSTAS GRANDES ----------------
+class StreamingListMixin:
+    """
+    Listas (e retrieves que ligarem `self.streaming`) com pelo menos
+    JSON_STREAMING_MIN_ITENS itens saem como StreamingHttpResponse: o JSON
+    é gerado em pedaços enquanto as linhas são serializadas, sem montar a
+    estrutura inteira nem a string inteira na memória. Os bytes são os
+    mesmos do JSONRenderer.
+    """
+    streaming = False
+
+    def pode_fazer_streaming(self):
+        return isinstance(getattr(self.request, "accepted_renderer", None), StreamingJSONRenderer)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["streaming"] = self.streaming
+        return context
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        itens = page if page is not None else queryset
+
+        grande = page is None or len(page) >= settings.JSON_STREAMING_MIN_ITENS
+        if not (self.pode_fazer_streaming() and grande):
+            serializer = self.get_serializer(itens, many=True)
+            if page is not None:
+                return self.get_paginated_response(serializer.data)
+            return Response(serializer.data)
+
+        self.streaming = True
+        if page is None:
+            itens = queryset.iterator(chunk_size=1000)
+        dados = ListaSobDemanda(itens, self.get_serializer(many=True).child.to_representation)
+        if page is not None:
+            return self.get_paginated_response(dados)
+        return Response(dados)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if not (self.streaming and isinstance(response, Response) and not response.exception):
+            return response
+
+        renderer = response.accepted_renderer
+        streaming = StreamingHttpResponse(
+            renderer.render_chunks(response.data, response.accepted_media_type, response.renderer_context),
+            status=response.status_code,
+            content_type=renderer.media_type,
+        )
+        for cabecalho, valor in response.items():
+            if cabecalho.lower() != "content-type":
+                streaming[cabecalho] = valor
+        return streaming
+
+
 # ---------------- PROJETOS ----------------
-class ProjetoViewSet(viewsets.ModelViewSet):
+def _nome_copia(nome):
+    """Gera um nome livre para a cópia: "X (cópia)", "X (cópia 2)", ..."""
+    base = f"{nome} (cópia)"
+    candidato, n = base, 1
+    while Projeto.objects.filter(nome_do_projeto=candidato).exists():
+        n += 1
+        candidato = f"{nome} (cópia {n})"
+    return candidato
+
+
+class ProjetoViewSet(LimiteConcorrenciaMixin, StreamingListMixin, viewsets.ModelViewSet):
     serializer_class = ProjetoSerializer
+    CAMPOS_ORDENACAO = {"data_criacao", "nome_do_projeto", *Projeto.CAMPOS_CONTADORES}
+    limites_concorrencia = {
+        "retrieve": ("projeto_detalhe", "degradar"),
+        "download_especificacao": ("especificacao", "recusar"),
+        "especificacoes_lote": ("especificacao", "recusar"),
+    }
+
+    def get_throttles(self):
+        if self.action in ["download_especificacao", "especificacoes_lote"]:
+            return [EspecificacaoThrottle()]
+        return super().get_throttles()
 
     def get_serializer_class(self):
         # quando for listagem, usa o serializer mais leve
@@ -76,26 +221,50 @@ class ProjetoViewSet(viewsets.ModelViewSet):
         return ProjetoSerializer
 
     def get_queryset(self):
-        qs = (Projeto.objects
-              .all()
-              .select_related("responsavel")  # evita query extra para usuário
-              .prefetch_related(
-                  "ambientes",
-                  Prefetch(
-                      "materiais",
-                      queryset=(MaterialSpec.objects
-                                .select_related("ambiente", "marca", "aprovador")
-                                .order_by("ambiente_id", "item"))
-                  )
-              )
-              .order_by("-data_criacao"))
+        qs = Projeto.objects.all().order_by("-data_criacao")
+
+        # cada ação carrega só o que o seu serializer usa
+        if self.action in ["list", "alteracoes"]:
+            qs = (qs.select_related("responsavel")
+                    .only("id", "nome_do_projeto", "tipo_do_projeto", "status",
+                          "data_criacao", "data_atualizacao", *Projeto.CAMPOS_CONTADORES,
+                          "responsavel__first_name", "responsavel__last_name"))
+        elif self.action == "retrieve":
+            # os materiais são lidos pelo serializer via values_list (MaterialSpecLeituraRapida)
+            qs = (qs.select_related("responsavel")  # evita query extra para usuário
+                    .defer("observacoes_gerais", "responsavel__password")
+                    .prefetch_related(
+                        Prefetch("ambientes", queryset=Ambiente.objects.order_by("nome_do_ambiente", "id")),
+                    ))
+        elif self.action in ["update", "partial_update"]:
+            # o prefetch seria descartado após o save; a resposta recarrega sozinha
+            qs = qs.select_related("responsavel")
+        elif self.action == "download_especificacao":
+            # o resto vem de dados_especificacao()
+            qs = qs.only("id", "nome_do_projeto")
+        else:
+            # aprovar, reprovar, destroy: basta a linha do projeto
+            qs = qs.defer("descricao", "observacoes_gerais")
 
         status_param = self.request.query_params.get("status")
         if status_param:
             qs = qs.filter(status__iexact=status_param)
 
+        # ?ordenar=-materiais_pendentes (somente colunas, sem GROUP BY)
+        ordenar = self.request.query_params.get("ordenar")
+        if ordenar and ordenar.lstrip("-") in self.CAMPOS_ORDENACAO:
+            qs = qs.order_by(ordenar, "-data_criacao")
+
         return qs
 
+    def retrieve(self, request, *args, **kwargs):
+        projeto = self.get_object()
+        total = projeto.materiais_pendentes + projeto.materiais_aprovados + projeto.materiais_reprovados
+        if self.pode_fazer_streaming() and total >= settings.JSON_STREAMING_MIN_ITENS:
+            # projeto grande: materiais saem direto do cursor para a resposta
+            self.streaming = True
+        return Response(self.get_serializer(projeto).data)
+
     def get_permissions(self):
         if self.action in ["list", "retrieve"]:
             return [permissions.IsAuthenticated()]
@@ -103,12 +272,21 @@ class ProjetoViewSet(viewsets.ModelViewSet):
             return [AllowCreateForBasicButNoEdit()]
         if self.action in ["update", "partial_update"]:
             return [AllowWriteForManagerUp()]
-        if self.action in ["aprovar", "reprovar"]:
+        if self.action in ["aprovar", "reprovar", "itens_em_massa"]:
             return [AllowWriteForManagerUp()]
+        if self.action == "clonar":
+            return [AllowCreateForBasicButNoEdit()]
+        if self.action == "especificacoes_lote":
+            return [permissions.IsAuthenticated()]
         if self.action == "destroy":
             return [OnlySuperadminDelete()]
         return [permissions.IsAuthenticated()]
 
+    @idempotente
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    @transaction.atomic
     def perform_create(self, serializer):
         projeto = serializer.save(responsavel=self.request.user)
         Log.objects.create(usuario=self.request.user, acao="CRIACAO", projeto=projeto)
@@ -131,30 +309,214 @@ class ProjetoViewSet(viewsets.ModelViewSet):
                     }
                 )
 
+        Projeto.recalcular_contadores([projeto.id])
+
+    def destroy(self, request, *args, **kwargs):
+        """
+        Só esconde o projeto; materiais, modelos e vínculos são apagados em lotes
+        pelo `manage.py excluir_projetos`. Responde 202 com o progresso, que pode
+        ser acompanhado em GET /api/projetos/<id>/exclusao/.
+        """
+        projeto = self.get_object()
+        exclusao_projetos.ocultar(projeto)
+        return Response(exclusao_projetos.progresso(projeto.pk), status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=["GET"])
+    def exclusao(self, request, pk=None):
+        # o projeto já não aparece no queryset da viewset: lê direto pelo id
+        try:
+            progresso = exclusao_projetos.progresso(int(pk))
+        except ValueError:
+            progresso = None
+        if progresso is None:
+            return Response({"detail": "Nenhuma exclusão para este projeto."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(progresso)
+
     @action(detail=True, methods=["post"], permission_classes=[AllowWriteForManagerUp])
+    @idempotente
     def aprovar(self, request, pk=None):
         projeto = self.get_object()
         projeto.status = "APROVADO"
         projeto.save(update_fields=["status", "data_atualizacao"])
         Log.objects.create(usuario=request.user, acao="APROVACAO", projeto=projeto)
+        publicar_status(projeto.id, "projeto", projeto.id, projeto.status)
         return Response({"status": projeto.status}, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=["post"], permission_classes=[AllowWriteForManagerUp])
+    @idempotente
     def reprovar(self, request, pk=None):
         projeto = self.get_object()
         projeto.status = "REPROVADO"
         projeto.save(update_fields=["status", "data_atualizacao"])
         Log.objects.create(usuario=request.user, acao="REPROVACAO", projeto=projeto)
+        publicar_status(projeto.id, "projeto", projeto.id, projeto.status)
         return Response({"status": projeto.status}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["post"], url_path="clonar")
+    def clonar(self, request, pk=None):
+        """
+        POST /api/projetos/<id>/clonar/
+        body (opcional): {"nome_do_projeto": "Residencial X - Torre B"}
+
+        Copia o projeto, os vínculos com ambientes e todos os materiais,
+        voltando tudo para PENDENTE. A cópia é feita em lote (bulk_create),
+        sem passar objeto por objeto pelo ORM.
+        """
+        # sem self.get_object(): o queryset padrão pré-carrega todos os materiais
+        origem = get_object_or_404(Projeto, pk=pk)
+        self.check_object_permissions(request, origem)
+
+        nome = (request.data.get("nome_do_projeto") or "").strip() or _nome_copia(origem.nome_do_projeto)
+        nome_em_uso = Response({"detail": "Já existe um projeto com esse nome."}, status=400)
+        if Projeto.objects.filter(nome_do_projeto=nome).exists():
+            return nome_em_uso
+
+        with transaction.atomic():
+            try:
+                # outro clone com o mesmo nome pode ter passado pelo exists() junto
+                with transaction.atomic():
+                    novo = Projeto.objects.create(
+                        nome_do_projeto=nome,
+                        tipo_do_projeto=origem.tipo_do_projeto,
+                        data_entrega=origem.data_entrega,
+                        descricao=origem.descricao,
+                        observacoes_gerais=origem.observacoes_gerais,
+                        status="PENDENTE",
+                        responsavel=request.user,
+                    )
+            except IntegrityError:
+                return nome_em_uso
+
+            # vínculos M2M direto na tabela intermediária
+            Vinculo = Projeto.ambientes.through
+            Vinculo.objects.bulk_create([
+                Vinculo(projeto_id=novo.id, ambiente_id=ambiente_id)
+                for ambiente_id in origem.ambientes.values_list("id", flat=True)
+            ])
+
+            # materiais: lê só as colunas necessárias e insere em lotes
+            linhas = (MaterialSpec.objects
+                      .filter(projeto=origem)
+                      .values_list("ambiente_id", "item", "descricao", "marca_id")
+                      .iterator(chunk_size=2000))
+            MaterialSpec.objects.bulk_create(
+                (MaterialSpec(projeto_id=novo.id, ambiente_id=ambiente_id, item=item,
+                              descricao=descricao, marca_id=marca_id, status="PENDENTE")
+                 for ambiente_id, item, descricao, marca_id in linhas),
+                batch_size=500,
+            )
+            Projeto.recalcular_contadores([novo.id])
+
+            Log.objects.create(
+                usuario=request.user,
+                acao="CRIACAO",
+                projeto=novo,
+                motivo=f"Projeto clonado de {origem.nome_do_projeto}",
+            )
+
+        return Response(
+            {
+                "id": novo.id,
+                "nome_do_projeto": novo.nome_do_projeto,
+                "status": novo.status,
+                "materiais": MaterialSpec.objects.filter(projeto=novo).count(),
+            },
+            status=status.HTTP_201_CREATED,
+        )
     
+    @action(detail=True, methods=["POST"], url_path="itens-em-massa")
+    @idempotente
+    def itens_em_massa(self, request, pk=None):
+        """
+        POST /api/projetos/<id>/itens-em-massa/
+        {
+          "item": "Rodapé", "descricao": "Poliestireno 7cm", "marca": 3,
+          // um seletor de ambientes do projeto:
+          "ambientes": [1, 2] | "categoria": "PRIVATIVA" | "tipo": <TipoAmbiente id>,
+          "existentes": "pular" (padrão) | "sobrescrever"
+        }
+        Cria o item em todos os ambientes escolhidos com um único bulk_create.
+        Quem já tem o item é pulado ou sobrescrito (e volta para PENDENTE).
+        """
+        projeto = self.get_object()
+        entrada = ItensEmMassaSerializer(data=request.data)
+        entrada.is_valid(raise_exception=True)
+        dados = entrada.validated_data
+        item, seletor = dados["item"], dados["seletor"]
+        marca_id = dados["marca"].pk if dados.get("marca") else None
+
+        alvos = projeto.ambientes.order_by()
+        if seletor == "ambientes":
+            alvos = alvos.filter(pk__in=dados["ambientes"])
+        elif seletor == "categoria":
+            alvos = alvos.filter(categoria=dados["categoria"])
+        else:
+            alvos = alvos.filter(tipo_id=dados["tipo"])
+
+        # uma consulta: ambientes alvo e se cada um já tem o item
+        alvos = dict(alvos.annotate(
+            ja_tem=models.Exists(MaterialSpec.objects.filter(
+                projeto=projeto, ambiente=models.OuterRef("pk"), item=item))
+        ).values_list("id", "ja_tem"))
+        if seletor == "ambientes":
+            fora = sorted(set(dados["ambientes"]) - set(alvos))
+            if fora:
+                return Response({"detail": "Ambientes que não pertencem ao projeto.", "ids": fora}, status=400)
+
+        sobrescrever = dados["existentes"] == "sobrescrever"
+        novos = [MaterialSpec(projeto=projeto, ambiente_id=amb_id, item=item,
+                              descricao=dados["descricao"], marca_id=marca_id, status="PENDENTE")
+                 for amb_id, ja_tem in alvos.items() if sobrescrever or not ja_tem]
+        with transaction.atomic():
+            if sobrescrever:
+                conflito = {"update_conflicts": True, "update_fields": [
+                    "descricao", "marca", "status", "motivo", "aprovador", "data_aprovacao", "updated_at"]}
+                if connection.features.supports_update_conflicts_with_target:
+                    conflito["unique_fields"] = ["projeto", "ambiente", "item"]  # MySQL não aceita o alvo
+            else:
+                conflito = {"ignore_conflicts": True}  # corrida com outra inclusão: mantém a que chegou antes
+            MaterialSpec.objects.bulk_create(novos, **conflito)
+            Projeto.recalcular_contadores([projeto.id])
+            if novos:
+                # bulk_create não dispara os signals: o índice do autocomplete recebe os ids
+                # (com ignore_conflicts/MySQL eles não voltam nos objetos)
+                ids = list(MaterialSpec.objects.filter(projeto=projeto, item=item, ambiente_id__in=list(alvos))
+                           .values_list("id", flat=True))
+
+                def indexar():
+                    for pk in ids:
+                        autocompletar.atualizar("item", pk, item)
+                transaction.on_commit(indexar)
+
+        ja_tinham = sum(alvos.values())
+        return Response({
+            "ambientes": sorted(alvos),
+            "criados": len(alvos) - ja_tinham,
+            "atualizados": ja_tinham if sobrescrever else 0,
+            "ignorados": 0 if sobrescrever else ja_tinham,
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["GET"])
+    def alteracoes(self, request, pk=None):
+        """
+        GET /api/projetos/<id>/alteracoes/?desde=<timestamp|cursor>
+        Só os materiais alterados/apagados desde o cursor, e o cabeçalho do
+        projeto se ele mudou. Guarde `cursor` para a próxima chamada.
+        """
+        projeto = self.get_object()
+        dados, estado = sincronizacao.alteracoes(
+            MaterialSpec.objects.filter(projeto=projeto),
+            Exclusao.objects.filter(modelo="MATERIAL", projeto_id=projeto.id),
+            request.query_params.get("desde"),
+        )
+        desde = datetime.fromisoformat(estado["t"])
+        dados["projeto"] = ProjetoListSerializer(projeto).data if projeto.data_atualizacao >= desde else None
+        return Response(dados)
+
     @action(detail=True, methods=["GET"], url_path="download-especificacao")
     def download_especificacao(self, request, pk=None):
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-        from reportlab.lib.pagesizes import A4
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.enums import TA_LEFT
-        from reportlab.lib import colors
-        from django.http import HttpResponse
+        # reportlab só é carregado por quem gera PDF (não pesa no boot dos workers)
+        from .especificacao import dados_especificacao, renderizar_especificacao
 
         projeto = self.get_object()
 
@@ -162,103 +524,35 @@ class ProjetoViewSet(viewsets.ModelViewSet):
         response = HttpResponse(content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="{projeto.nome_do_projeto}_especificacao.pdf"'
 
-        doc = SimpleDocTemplate(response, pagesize=A4)
-        styles = getSampleStyleSheet()
-        story = []
+        dados, = dados_especificacao([projeto.id])
+        return renderizar_especificacao(dados, response)
 
-        # --------- CÉLULAS COM QUEBRA DE LINHA ---------
-        paragraph_style = ParagraphStyle(
-            'cell_style',
-            fontSize=10,
-            leading=12,
-            alignment=TA_LEFT
+    @action(detail=False, methods=["POST"], url_path="especificacoes-lote")
+    def especificacoes_lote(self, request):
+        """
+        POST {"ids": [1, 2, ...]} -> ZIP com o PDF de especificação de cada projeto.
+        Os dados saem em poucas consultas e os PDFs são renderizados em paralelo.
+        """
+        from .especificacao import dados_especificacao, zip_especificacoes
+
+        ids = request.data.get("ids")
+        if (not isinstance(ids, list) or not ids
+                or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)):
+            return Response({"detail": "Informe 'ids' como uma lista de ids de projeto."}, status=400)
+        if len(ids) > settings.ESPECIFICACAO_LOTE_MAX:
+            return Response({"detail": f"No máximo {settings.ESPECIFICACAO_LOTE_MAX} projetos por lote."}, status=400)
+
+        dados = dados_especificacao(ids)
+        inexistentes = sorted(set(ids) - {d["id"] for d in dados})
+        if inexistentes:
+            return Response({"detail": "Projetos não encontrados.", "ids": inexistentes}, status=404)
+
+        resposta = StreamingHttpResponse(
+            zip_especificacoes(dados, workers=settings.ESPECIFICACAO_WORKERS),
+            content_type="application/zip",
         )
-
-        def cell(text):
-            return Paragraph(str(text).replace("\n", "<br/>"), paragraph_style)
-
-        # --------- CABEÇALHO ---------
-        story.append(Paragraph("<b>ESPECIFICAÇÃO TÉCNICA</b>", styles['Title']))
-        story.append(Spacer(1, 20))
-
-        story.append(Paragraph(f"<b>Projeto:</b> {projeto.nome_do_projeto}", styles['Normal']))
-        story.append(Paragraph(f"<b>Observações:</b> {projeto.descricao or '-'}", styles['Normal']))
-        story.append(Spacer(1, 20))
-
-        # --------- ÁREA PRIVATIVA ---------
-        story.append(Paragraph("<b>ÁREA PRIVATIVA</b>", styles['Heading2']))
-        ambientes_privativos = projeto.ambientes.filter(categoria="PRIVATIVA")
-
-        for amb in ambientes_privativos:
-            story.append(Paragraph(f"<b>{amb.nome_do_ambiente}</b>", styles['Heading3']))
-
-            materiais = projeto.materiais.filter(ambiente=amb).order_by("item")
-
-            data = [[cell("Item"), cell("Descrição")]]
-
-            for m in materiais:
-                data.append([cell(m.item), cell(m.descricao or "-")])
-
-            tabela = Table(data, colWidths=[120, 330])
-            tabela.setStyle(TableStyle([
-                ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
-                ('GRID', (0,0), (-1,-1), 0.7, colors.black),
-                ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-                ('VALIGN', (0,0), (-1,-1), 'TOP')
-            ]))
-
-            story.append(tabela)
-            story.append(Spacer(1, 15))
-
-        # --------- ÁREA COMUM ---------
-        story.append(Paragraph("<b>ÁREA COMUM</b>", styles['Heading2']))
-        ambientes_comuns = projeto.ambientes.filter(categoria="COMUM")
-
-        for amb in ambientes_comuns:
-            story.append(Paragraph(f"<b>{amb.nome_do_ambiente}</b>", styles['Heading3']))
-
-            materiais = projeto.materiais.filter(ambiente=amb).order_by("item")
-
-            data = [[cell("Item"), cell("Descrição")]]
-
-            for m in materiais:
-                data.append([cell(m.item), cell(m.descricao or "-")])
-
-            tabela = Table(data, colWidths=[120, 330])
-            tabela.setStyle(TableStyle([
-                ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
-                ('GRID', (0,0), (-1,-1), 0.7, colors.black),
-                ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-                ('VALIGN', (0,0), (-1,-1), 'TOP')
-            ]))
-
-            story.append(tabela)
-            story.append(Spacer(1, 15))
-
-        # --------- MARCAS ---------
-        story.append(Paragraph("<b>DESCRIÇÃO DAS MARCAS</b>", styles['Heading2']))
-
-        from api.models import DescricaoMarca
-        marcas = DescricaoMarca.objects.all().order_by("material")
-
-        data = [[cell("Material"), cell("Marcas")]]
-
-        for m in marcas:
-            data.append([cell(m.material), cell(m.marcas)])
-
-        tabela = Table(data, colWidths=[150, 300])
-        tabela.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
-            ('GRID', (0,0), (-1,-1), 0.7, colors.black),
-            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-            ('VALIGN', (0,0), (-1,-1), 'TOP')
-        ]))
-
-        story.append(tabela)
-
-        # FINALIZAR PDF
-        doc.build(story)
-        return response
+        resposta["Content-Disposition"] = 'attachment; filename="especificacoes.zip"'
+        return resposta
 
     
 # --- TIPO DE AMBIENTE ---
@@ -339,40 +633,111 @@ class AmbienteViewSet(viewsets.ModelViewSet):
             return [OnlySuperadminDelete()]
         return [permissions.IsAuthenticated()]
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        # o delete leva junto os vínculos e os materiais (CASCADE)
+        projeto_ids = list(instance.projetos.values_list("id", flat=True))
+        instance.delete()
+        Projeto.recalcular_contadores(projeto_ids)
+
 # ---------------- LOGS (somente leitura) ----------------
-class LogViewSet(viewsets.ReadOnlyModelViewSet):
+class LogViewSet(StreamingListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Log.objects.all().order_by('-data_hora')
     serializer_class = LogSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_queryset(self):
+    def usuarios_visiveis(self):
+        """Ids dos usuários cujos logs o usuário atual pode ver (None = todos)."""
         u = self.request.user
-        if not u.is_authenticated:
-            return Log.objects.none()
-
         r = (getattr(u, "cargo", "") or "").lower()
         if r == "cliente":
             r = "atendente"
 
         if r == "superadmin":
             # superadmin vê tudo
-            return Log.objects.all().order_by('-data_hora')
+            return None
 
         if r == "gerente":
             # gerente vê logs dos ATENDENTES + as próprias
-            atendentes_ids = Usuario.objects.filter(
-                cargo__in=["atendente", "cliente"]
+            return Usuario.objects.filter(
+                models.Q(cargo__in=["atendente", "cliente"]) | models.Q(pk=u.pk)
             ).values_list("id", flat=True)
-            return Log.objects.filter(
-                models.Q(usuario__in=atendentes_ids) | models.Q(usuario=u)
-            ).order_by('-data_hora')
 
         # atendente: só as próprias
-        return Log.objects.filter(usuario=u).order_by('-data_hora')
+        return [u.pk]
+
+    def get_queryset(self):
+        u = self.request.user
+        if not u.is_authenticated:
+            return Log.objects.none()
+
+        # LogSerializer lê só o e-mail do usuário e o nome do projeto
+        logs = (Log.objects
+                .select_related("usuario", "projeto")
+                .only("id", "acao", "motivo", "data_hora", "usuario__email", "projeto__nome_do_projeto"))
+
+        visiveis = self.usuarios_visiveis()
+        if visiveis is not None:
+            logs = logs.filter(usuario__in=visiveis)
+        return logs.order_by('-data_hora')
+
+    def list(self, request, *args, **kwargs):
+        # ?incluir_arquivo=1: junta os meses já movidos por `manage.py archive_logs`
+        if request.query_params.get("incluir_arquivo") not in ("1", "true"):
+            return super().list(request, *args, **kwargs)
+
+        visiveis = self.usuarios_visiveis()
+        arquivados = ler_arquivados(None if visiveis is None else list(visiveis))
+        paginador = PaginacaoSemTotal()
+        pagina = paginador.paginate_queryset(LogsComArquivo(self.get_queryset(), arquivados), request, view=self)
+        quentes = self.get_serializer([l for l in pagina if isinstance(l, Log)], many=True).data
+        quentes = iter(quentes)
+        dados = [next(quentes) if isinstance(l, Log) else l for l in pagina]
+        return paginador.get_paginated_response(dados)
+
+
+class PaginacaoSemTotal(PageNumberPagination):
+    """
+    ?page=N sem contar o total (`count` vem null): lê só até o fim da página
+    pedida, mais um item para saber se existe a próxima.
+    """
+    display_page_controls = False
+
+    def paginate_queryset(self, sequencia, request, view=None):
+        self.request = request
+        tamanho = self.get_page_size(request)
+        numero = request.query_params.get(self.page_query_param) or 1
+        try:
+            self.numero = int(numero)
+            if self.numero < 1:
+                raise ValueError
+        except ValueError:
+            raise NotFound(self.invalid_page_message.format(page_number=numero, message="Página inválida."))
+        inicio = (self.numero - 1) * tamanho
+        itens = sequencia.fatia(inicio, inicio + tamanho + 1)
+        self.tem_proxima = len(itens) > tamanho
+        return itens[:tamanho]
+
+    def get_next_link(self):
+        if not self.tem_proxima:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.numero + 1)
+
+    def get_previous_link(self):
+        if self.numero == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.numero == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.numero - 1)
+
+    def get_paginated_response(self, data):
+        return Response({"count": None, "next": self.get_next_link(),
+                         "previous": self.get_previous_link(), "results": data})
 
 # ---------------- MODELOS DE DOCUMENTO ----------------
 
-class ModeloDocumentoViewSet(viewsets.ModelViewSet):
+class ModeloDocumentoViewSet(StreamingListMixin, viewsets.ModelViewSet):
     queryset = ModeloDocumento.objects.all().order_by("-id")
     serializer_class = ModeloDocumentoSerializer
     # opcional: aplique a mesma permissão que você usa para alterar/criar
@@ -380,6 +745,9 @@ class ModeloDocumentoViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         qs = super().get_queryset()
+        if self.action in ["list", "retrieve"]:
+            # projeto_nome vem do join; o resto do projeto não é lido
+            qs = qs.select_related("projeto").only("id", "nome", "descricao", "projeto__nome_do_projeto")
         projeto_id = self.request.query_params.get("projeto")
         if projeto_id:
             qs = qs.filter(projeto_id=projeto_id)
@@ -425,21 +793,19 @@ class ModeloDocumentoViewSet(viewsets.ModelViewSet):
 
 
 # ---------------- STATS DO DASHBOARD ----------------
+# as quatro contagens numa query só (COUNT ... FILTER / CASE WHEN)
+AGREGADOS_DASHBOARD = {
+    'total_projetos': Count('id'),
+    'projetos_aprovados': Count('id', filter=models.Q(status='APROVADO')),
+    'projetos_reprovados': Count('id', filter=models.Q(status='REPROVADO')),
+    'projetos_pendentes': Count('id', filter=models.Q(status='PENDENTE')),
+}
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def dashboard_stats(request):
-    total_projetos = Projeto.objects.count()
-    aprovados = Projeto.objects.filter(status='APROVADO').count()
-    reprovados = Projeto.objects.filter(status='REPROVADO').count()
-    pendentes = Projeto.objects.filter(status='PENDENTE').count()
-
-    data = {
-        'total_projetos': total_projetos,
-        'projetos_aprovados': aprovados,
-        'projetos_reprovados': reprovados,
-        'projetos_pendentes': pendentes,
-    }
-    return Response(data)
+    return Response(Projeto.objects.aggregate(**AGREGADOS_DASHBOARD))
 
 class MarcaViewSet(viewsets.ModelViewSet):
     queryset = Marca.objects.all().order_by("nome")
@@ -452,15 +818,23 @@ class MarcaViewSet(viewsets.ModelViewSet):
             return [AllowWriteForManagerUp()]
         return [permissions.IsAuthenticated()]
     
-class MaterialSpecViewSet(viewsets.ModelViewSet):
+class MaterialSpecViewSet(StreamingListMixin, viewsets.ModelViewSet):
     serializer_class = MaterialSpecSerializer
 
     def get_queryset(self):
-        from django.db.models import Q
-
-        queryset = MaterialSpec.objects.select_related(
-            "ambiente", "aprovador", "marca", "projeto"
-        ).order_by("ambiente_id", "item")
+        if self.action in ["aprovar", "reprovar", "destroy"]:
+            # ações que só mudam a linha: sem joins e sem os textos
+            queryset = MaterialSpec.objects.defer("descricao").order_by("ambiente_id", "item")
+            if self.action != "destroy":
+                # o status anterior decide o ajuste dos contadores: duas aprovações
+                # simultâneas do mesmo item não podem ver ambas o status antigo
+                queryset = queryset.select_for_update()
+        elif self.action == "reverter":
+            queryset = MaterialSpec.objects.select_related("projeto").only(
+                "id", "projeto__id", "projeto__status", "projeto__data_atualizacao"
+            )
+        else:
+            queryset = materiais_para_serializer()
 
         projeto_id = self.request.query_params.get("projeto")
         ambiente_id = self.request.query_params.get("ambiente")
@@ -477,7 +851,9 @@ class MaterialSpecViewSet(viewsets.ModelViewSet):
         elif ambiente_id:
             queryset = queryset.filter(ambiente_id=ambiente_id)
 
-        return queryset
+        # materiais de projeto excluído (oculto, à espera do excluir_projetos) somem junto com ele;
+        # subconsulta em vez de JOIN: não estende o FOR UPDATE à linha do projeto
+        return queryset.exclude(projeto_id__in=Projeto.todos.filter(excluido_em__isnull=False).values("pk"))
 
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
@@ -488,39 +864,57 @@ class MaterialSpecViewSet(viewsets.ModelViewSet):
             return [AllowWriteForManagerUp()]
         return [permissions.IsAuthenticated()]
 
+    @transaction.atomic
+    def perform_create(self, serializer):
+        m = serializer.save()
+        Projeto.ajustar_contadores(m.projeto_id, para=m.status)
+
+    @transaction.atomic
     def perform_update(self, serializer):
         obj = self.get_object()
         if obj.status == 'APROVADO':
             raise PermissionDenied('Item aprovado não pode ser editado. Use reverter.')
-        serializer.save()
+        status_anterior = obj.status
+        m = serializer.save()
+        Projeto.ajustar_contadores(m.projeto_id, de=status_anterior, para=m.status)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        Projeto.ajustar_contadores(instance.projeto_id, de=instance.status)
+        instance.delete()
 
     #  Aprovar material individual
     @action(detail=True, methods=['post'])
+    @idempotente
+    @transaction.atomic
     def aprovar(self, request, pk=None):
         m = self.get_object()
+        Projeto.ajustar_contadores(m.projeto_id, de=m.status, para='APROVADO')
         m.status = 'APROVADO'
         m.aprovador = request.user
         m.data_aprovacao = timezone.now()
         m.motivo = ''
         m.save(update_fields=['status', 'aprovador', 'data_aprovacao', 'motivo', 'updated_at'])
 
-        # cria log
-        projeto = m.ambiente.projetos.first()
-
+        # cria log (o projeto vem direto do material, sem buscar a linha)
         Log.objects.create(
             usuario=request.user,
             acao='APROVACAO',
-            projeto=projeto,
+            projeto_id=m.projeto_id,
             motivo=f'Item {m.item} aprovado'
         )
+        publicar_status(m.projeto_id, "material", m.id, m.status)
 
         return Response({'status': m.status}, status=status.HTTP_200_OK)
 
     # Reprovar material individual
     @action(detail=True, methods=['post'])
+    @idempotente
+    @transaction.atomic
     def reprovar(self, request, pk=None):
         m = self.get_object()
         motivo = request.data.get('motivo', '')
+        Projeto.ajustar_contadores(m.projeto_id, de=m.status, para='REPROVADO')
 
         m.status = 'REPROVADO'
         m.aprovador = request.user
@@ -531,27 +925,45 @@ class MaterialSpecViewSet(viewsets.ModelViewSet):
         Log.objects.create(
             usuario=request.user,
             acao='REPROVACAO',
-            projeto=m.projeto,  # AGORA VEM DIRETO DO MATERIAL
+            projeto_id=m.projeto_id,  # AGORA VEM DIRETO DO MATERIAL
             motivo=f'Item {m.item} reprovado: {motivo}'
         )
+        publicar_status(m.projeto_id, "material", m.id, m.status)
 
         return Response({'status': m.status}, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=["GET"])
+    def alteracoes(self, request):
+        """
+        GET /api/materiais/alteracoes/?desde=<timestamp|cursor>[&projeto=<id>]
+        Materiais alterados e lápides (materiais e projetos apagados) desde o cursor.
+        """
+        exclusoes = Exclusao.objects.all()
+        projeto_id = request.query_params.get("projeto")
+        if projeto_id:
+            exclusoes = exclusoes.filter(projeto_id=projeto_id)
+        dados, _ = sincronizacao.alteracoes(self.get_queryset(), exclusoes, request.query_params.get("desde"))
+        return Response(dados)
+
     # Reverter para pendente
     @action(detail=True, methods=['post'])
+    @transaction.atomic
     def reverter(self, request, pk=None):
-        projeto = self.get_object()
+        projeto = self.get_object().projeto
+        if projeto is None:
+            return Response({"detail": "Material sem projeto."}, status=400)
         projeto.status = "PENDENTE"
         projeto.save(update_fields=["status", "data_atualizacao"])
 
         # reverte todos os materiais do projeto
-        from .models import MaterialSpec
-        MaterialSpec.objects.filter(ambiente__projetos=projeto).update(
+        MaterialSpec.objects.filter(projeto=projeto).update(
             status="PENDENTE",
             aprovador=None,
             data_aprovacao=None,
-            motivo=""
+            motivo="",
+            updated_at=timezone.now(),  # update() não aciona o auto_now; a sincronização depende dele
         )
+        Projeto.recalcular_contadores([projeto.id])
 
         Log.objects.create(
             usuario=request.user,
@@ -559,25 +971,63 @@ class MaterialSpecViewSet(viewsets.ModelViewSet):
             projeto=projeto,
             motivo="Projeto revertido para pendente com todos os itens."
         )
+        publicar_status(projeto.id, "projeto", projeto.id, projeto.status)
 
         return Response({"status": projeto.status}, status=status.HTTP_200_OK)
 
-@api_view(['GET'])
-@permission_classes([permissions.IsAuthenticated])
-def stats_mensais(request):
-    qs = Projeto.objects.annotate(mes=TruncMonth('data_criacao')) \
-                        .values('mes', 'status') \
-                        .annotate(qtd=Count('id')) \
-                        .order_by('mes')
+def stats_mensais_qs():
+    return Projeto.objects.annotate(mes=TruncMonth('data_criacao')) \
+                          .values('mes', 'status') \
+                          .annotate(qtd=Count('id')) \
+                          .order_by('mes')
+
+
+def montar_stats_mensais(linhas):
     data = {}
-    for r in qs:
+    for r in linhas:
         key = r['mes'].strftime('%Y-%m')
         data.setdefault(key, {'APROVADO': 0, 'REPROVADO': 0, 'PENDENTE': 0})
         data[key][r['status']] = r['qtd']
-    return Response(data)
+    return data
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def stats_mensais(request):
+    return Response(montar_stats_mensais(stats_mensais_qs()))
+
+
+def _data_param(request, nome, padrao):
+    valor = request.query_params.get(nome)
+    if not valor:
+        return padrao
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValidationError({nome: "Use o formato AAAA-MM-DD."})
+
+
+@api_view(['GET'])
+@permission_classes([ManagerUpOnly])
+def stats_atividade(request):
+    """
+    GET /api/stats/atividade/?inicio=AAAA-MM-DD&fim=AAAA-MM-DD[&usuario=<id>][&projeto=<id>]
+    Aprovações, reprovações, edições e mediana do tempo até a decisão por
+    revisor e por projeto (padrão: últimos 30 dias), lidas do resumo diário.
+    """
+    fim = _data_param(request, "fim", timezone.localdate())
+    inicio = _data_param(request, "inicio", fim - timedelta(days=29))
+    if inicio > fim:
+        raise ValidationError({"inicio": "Deve ser anterior ou igual a fim."})
+    return Response(atividade.resumo(
+        inicio, fim,
+        usuario_id=request.query_params.get("usuario"),
+        projeto_id=request.query_params.get("projeto"),
+    ))
 
 @api_view(['POST'])
 @permission_classes([AllowWriteForManagerUp])  # somente gerente+ cria
+@idempotente
 def add_material_item(request, projeto_id=None, ambiente_id=None):
     """
     POST /api/projetos/<projeto_id>/ambientes/<ambiente_id>/add-item/
@@ -604,14 +1054,16 @@ def add_material_item(request, projeto_id=None, ambiente_id=None):
     if marca_id:
         marca_obj = Marca.objects.filter(id=marca_id).first()
 
-    material = MaterialSpec.objects.create(
-        projeto=projeto,
-        ambiente=ambiente,
-        item=item,
-        descricao=descricao,
-        marca=marca_obj,
-        status="PENDENTE"
-    )
+    with transaction.atomic():
+        material = MaterialSpec.objects.create(
+            projeto=projeto,
+            ambiente=ambiente,
+            item=item,
+            descricao=descricao,
+            marca=marca_obj,
+            status="PENDENTE"
+        )
+        Projeto.ajustar_contadores(projeto.id, para=material.status)
 
     return Response(
         {
@@ -622,6 +1074,31 @@ def add_material_item(request, projeto_id=None, ambiente_id=None):
         status=201
     )
 
+# ---------------- AUTOCOMPLETE ----------------
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def autocomplete(request):
+    """
+    GET /api/autocomplete/?tipo=marca|tipo_ambiente|ambiente|item&prefixo=por&limite=10
+    Responde do índice em memória (api/autocomplete.py), sem consultar o banco.
+    """
+    tipo = request.query_params.get("tipo")
+    if tipo not in autocompletar.FONTES:
+        raise ValidationError({"tipo": f"Use um destes: {', '.join(autocompletar.FONTES)}."})
+    try:
+        limite = min(max(int(request.query_params.get("limite", 10)), 1), 50)
+    except ValueError:
+        raise ValidationError({"limite": "Informe um número inteiro."})
+    prefixo = request.query_params.get("prefixo", "")
+    return Response({"tipo": tipo, "resultados": autocompletar.indice(tipo).buscar(prefixo, limite)})
+
+
 # ---------------- JWT ----------------
 class MyTokenObtainPairView(TokenObtainPairView):
-    serializer_class = MyTokenObtainPairSerializer
\ No newline at end of file
+    serializer_class = MyTokenObtainPairSerializer
+    # login é alvo de força bruta e o hash da senha é caro: limite bem estrito
+    throttle_classes = [LoginThrottle]
+
+
+class MyTokenRefreshView(TokenRefreshView):
+    throttle_classes = [RefreshTokenThrottle]
\ No newline at end of file
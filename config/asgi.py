@@ -1,4 +1,6 @@
 #aplicações assincronas
+# ex.: uvicorn config.asgi:application  |  daphne config.asgi:application
+# (as views de api/async_views.py rodam nativamente aqui; as do DRF via thread)
 import os
 from django.core.asgi import get_asgi_application
 
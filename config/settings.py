@@ -3,6 +3,8 @@ import os
 from dotenv import load_dotenv
 from datetime import timedelta
 
+from corsheaders.defaults import default_headers
+
 # Carrega o .env
 load_dotenv()
 
@@ -35,12 +37,15 @@ INSTALLED_APPS = [
 ]
 
 AUTH_USER_MODEL = "api.Usuario"
+# o ModelBackend de sempre, medindo o tempo de verificação da senha (/metrics)
+AUTHENTICATION_BACKENDS = ["api.metricas.ModelBackendMedido"]
 
 # ==============================
 # MIDDLEWARE
 # ==============================
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
+    "api.metricas.MetricasMiddleware",  # latência, consultas e requisições em andamento para /metrics
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -49,6 +54,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "api.perfilamento.PerfilamentoMiddleware",  # cProfile sob demanda (X-Perfilar) ou por amostragem
+    "api.replicas.LeituraReplicaMiddleware",  # GETs da API na réplica, se houver
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -101,6 +108,37 @@ else:
         }
     }
 
+# réplica de leitura (opcional). Local: SQLITE_REPLICA=caminho/para/copia.sqlite3
+# (aberta só para leitura); produção: MYSQLREPLICAHOST (mesmo banco/usuário do primário)
+REPLICA_ALIAS = "replica"
+if DEBUG and os.getenv("SQLITE_REPLICA"):
+    DATABASES[REPLICA_ALIAS] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": f"file:{os.getenv('SQLITE_REPLICA')}?mode=ro",
+    }
+elif not DEBUG and os.getenv("MYSQLREPLICAHOST"):
+    DATABASES[REPLICA_ALIAS] = {
+        **DATABASES["default"],
+        "HOST": os.getenv("MYSQLREPLICAHOST"),
+        "PORT": os.getenv("MYSQLREPLICAPORT", DATABASES["default"]["PORT"]),
+    }
+if REPLICA_ALIAS in DATABASES:
+    DATABASES[REPLICA_ALIAS]["TEST"] = {"MIRROR": "default"}  # nos testes a réplica é o próprio banco
+DATABASE_ROUTERS = ["api.replicas.ReplicaRouter"]
+REPLICA_FIXAR_PRIMARIO_S = int(os.getenv("REPLICA_FIXAR_PRIMARIO_S", "5"))  # read-your-writes após escrever
+# quem escreveu fica no primário pelo cookie e pelo id do usuário neste cache (clientes JWT/mobile
+# não guardam cookie). Precisa ser comum aos workers: o padrão é um diretório local, que serve a
+# todos os workers da máquina; com mais de uma máquina, aponte para um cache compartilhado.
+REPLICA_CACHE = "replica"
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    REPLICA_CACHE: {
+        "BACKEND": os.getenv("REPLICA_CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.getenv("REPLICA_CACHE_LOCATION", str(BASE_DIR / "cache_replica")),
+    },
+}
+REPLICA_NOVA_TENTATIVA_S = 30  # réplica fora: quanto tempo ler só do primário
+
 # ==============================
 # CONFIG PADRÕES
 # ==============================
@@ -126,7 +164,30 @@ REST_FRAMEWORK = {
     ],
      "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,  # número de projetos por página
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.StreamingJSONRenderer",  # mesmo JSON, com render_chunks() para streaming
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    # balde de fichas por usuário/IP (api.throttling.TokenBucketThrottle)
+    "DEFAULT_THROTTLE_RATES": {
+        "token": os.getenv("THROTTLE_TOKEN", "5/min"),
+        "token_refresh": os.getenv("THROTTLE_TOKEN_REFRESH", "20/min"),
+        "especificacao": os.getenv("THROTTLE_ESPECIFICACAO", "20/min"),
+    },
+}
+
+# chaves (usuário/IP) guardadas por balde do throttle; acima disso saem as menos usadas
+THROTTLE_MAX_CHAVES = int(os.getenv("THROTTLE_MAX_CHAVES", "10000"))
+
+# requisições pesadas simultâneas por processo (api.throttling.LimiteConcorrenciaMixin)
+LIMITES_CONCORRENCIA = {
+    "projeto_detalhe": int(os.getenv("LIMITE_PROJETO_DETALHE", "4")),
+    "especificacao": int(os.getenv("LIMITE_ESPECIFICACAO", "2")),
 }
+RETRY_AFTER_SOBRECARGA = 5  # segundos
+
+# respostas com pelo menos esse número de itens (página ou materiais do projeto) saem em streaming
+JSON_STREAMING_MIN_ITENS = int(os.getenv("JSON_STREAMING_MIN_ITENS", "500"))
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(hours=3),  # token dura 3 horas
@@ -147,6 +208,8 @@ CORS_ALLOWED_ORIGINS = [
     "https://frontend-jn.vercel.app",
 ]
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
+CORS_EXPOSE_HEADERS = ["Idempotency-Replayed"]
 
 # ==========================================================
 # CONFIGURAÇÃO DE E-MAIL 
@@ -158,4 +221,75 @@ if not DEBUG:
     EMAIL_USE_TLS = True
     EMAIL_HOST_USER = os.getenv('EMAIL_USER')        
     EMAIL_HOST_PASSWORD = os.getenv('EMAIL_APP_PASSWORD')
-    DEFAULT_FROM_EMAIL = os.getenv('EMAIL_USER')
+    # o remetente da Outbox não pode ser nulo: sem EMAIL_USER, fica o padrão do Django
+    DEFAULT_FROM_EMAIL = os.getenv('EMAIL_USER') or 'webmaster@localhost'
+else:
+    # local: os e-mails do send_outbox aparecem no terminal
+    EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# lote de especificações em PDF (POST /api/projetos/especificacoes-lote/)
+ESPECIFICACAO_LOTE_MAX = int(os.getenv("ESPECIFICACAO_LOTE_MAX", "100"))
+# processos do pool de renderização de cada worker (criado no primeiro uso); 0 = um por núcleo
+ESPECIFICACAO_WORKERS = int(os.getenv("ESPECIFICACAO_WORKERS", "0"))
+
+# sincronização incremental (.../alteracoes/?desde=)
+SYNC_LIMITE = 500  # linhas por resposta
+# quanto antes do cursor cada chamada relê (transações que gravaram antes e fizeram COMMIT depois)
+SYNC_JANELA_S = int(os.getenv("SYNC_JANELA_S", "120"))
+SYNC_RETENCAO_EXCLUSOES_DIAS = int(os.getenv("SYNC_RETENCAO_EXCLUSOES_DIAS", "30"))  # ver limpar_exclusoes
+# o que já foi entregue dentro da janela fica neste cache (o cursor leva só a chave). Comum aos
+# workers, como o da réplica; se a entrada se perder, a janela é reenviada (o cliente grava por id)
+SYNC_CACHE = "sincronizacao"
+CACHES[SYNC_CACHE] = {
+    "BACKEND": os.getenv("SYNC_CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+    "LOCATION": os.getenv("SYNC_CACHE_LOCATION", str(BASE_DIR / "cache_sincronizacao")),
+    "TIMEOUT": 86400,
+    "OPTIONS": {"MAX_ENTRIES": 20000},
+}
+
+# eventos de status em tempo real (SSE /api/projetos/<id>/eventos/, ASGI)
+# BrokerBanco: tabela EventoStatus, vale entre workers; BrokerLocal: em memória, um processo só (testes)
+EVENTOS_BROKER = os.getenv("EVENTOS_BROKER", "api.eventos.BrokerBanco")
+EVENTOS_INTERVALO_S = float(os.getenv("EVENTOS_INTERVALO_S", "1"))  # leitura de eventos novos, por processo
+EVENTOS_JANELA_S = 10  # releitura para ids que fizeram COMMIT fora de ordem
+EVENTOS_RETENCAO_HORAS = int(os.getenv("EVENTOS_RETENCAO_HORAS", "24"))  # histórico para Last-Event-ID
+EVENTOS_HEARTBEAT = 15  # segundos entre comentários "ping"
+
+# autocomplete em memória (/api/autocomplete/): por processo, remontado do banco
+# a cada tantos segundos para pegar o que outros workers gravaram
+AUTOCOMPLETE_RECONSTRUIR_S = int(os.getenv("AUTOCOMPLETE_RECONSTRUIR_S", "300"))
+
+# meses de Log arquivados por `manage.py archive_logs` (JSONL gzip)
+LOG_ARQUIVO_DIR = Path(os.getenv("LOG_ARQUIVO_DIR", BASE_DIR / "arquivo_logs"))
+
+# inicialização dos workers (manage.py startup_profile e o teste de orçamento)
+ORCAMENTO_INICIALIZACAO_MS = int(os.getenv("ORCAMENTO_INICIALIZACAO_MS", "1500"))
+# pacotes que só as rotas que precisam deles devem importar
+IMPORTS_SOB_DEMANDA = ["reportlab"]
+
+# exclusão de projetos em segundo plano (manage.py excluir_projetos)
+EXCLUSAO_LOTE = int(os.getenv("EXCLUSAO_LOTE", "1000"))  # linhas por DELETE/transação
+
+# Idempotency-Key nos POSTs de criação/aprovação: por quanto tempo a primeira resposta é reaproveitada
+IDEMPOTENCIA_TTL_HORAS = int(os.getenv("IDEMPOTENCIA_TTL_HORAS", "24"))
+# reserva sem resposta há mais que isto é de um worker que morreu no meio (a view foi desfeita):
+# a repetição assume. Maior que o timeout do gunicorn, que mata o worker antes
+IDEMPOTENCIA_RESERVA_S = int(os.getenv("IDEMPOTENCIA_RESERVA_S", "120"))
+
+# perfilamento de requisições (api/perfilamento.py; perfis no admin)
+PERFIL_AMOSTRAGEM = float(os.getenv("PERFIL_AMOSTRAGEM", "0"))  # fração das requisições da API; 0 = só X-Perfilar
+PERFIL_TOP_N = 40
+PERFIL_RETENCAO_DIAS = int(os.getenv("PERFIL_RETENCAO_DIAS", "7"))
+
+# métricas para o Prometheus (GET /metrics, api/metricas.py). Com vários workers
+# do gunicorn, METRICAS_DIR precisa ser um diretório local comum a todos eles.
+METRICAS_DIR = os.getenv("METRICAS_DIR", os.getenv("PROMETHEUS_MULTIPROC_DIR", ""))
+METRICAS_GRAVAR_S = float(os.getenv("METRICAS_GRAVAR_S", "1"))  # intervalo mínimo entre gravações de cada worker
+METRICAS_TOKEN = os.getenv("METRICAS_TOKEN", "")  # se definido, o scrape manda "Authorization: Bearer <token>"
+
+# fila de e-mails (api.Outbox / manage.py send_outbox)
+OUTBOX_LOTE = int(os.getenv("OUTBOX_LOTE", "50"))
+OUTBOX_MAX_TENTATIVAS = int(os.getenv("OUTBOX_MAX_TENTATIVAS", "6"))
+OUTBOX_BACKOFF_BASE = 30       # segundos; dobra a cada falha
+OUTBOX_BACKOFF_MAX = 60 * 60   # no máximo 1h entre tentativas
+OUTBOX_RESERVA_S = int(os.getenv("OUTBOX_RESERVA_S", "300"))  # prazo da reserva de um lote; vencido, outro worker reenvia
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.urls import path, include, re_path 
-from api.views import MyTokenObtainPairView
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from api.metricas import metricas_view
+from api.views import MyTokenObtainPairView, MyTokenRefreshView
 from django.views.generic import TemplateView     
 
 urlpatterns = [
@@ -10,9 +10,12 @@ urlpatterns = [
 
     # substituir a view padrão pela nossa
     path('api/token/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/token/refresh/', MyTokenRefreshView.as_view(), name='token_refresh'),
+
+    # scrape do Prometheus (fora de /api/: sem JWT, protegido por METRICAS_TOKEN)
+    path('metrics', metricas_view, name='metricas'),
 ]
 # Fallback para o React SPA: captura tudo que não for /api ou /admin
 urlpatterns += [
-    re_path(r"^(?!api/|admin/).*", TemplateView.as_view(template_name="index.html")),
+    re_path(r"^(?!api/|admin/|metrics$).*", TemplateView.as_view(template_name="index.html")),
 ]
\ No newline at end of file
@@ -0,0 +1,104 @@
+"""
+Perfil de produção do gunicorn (lido automaticamente: `gunicorn` na raiz do projeto).
+
+- preload: o app é carregado uma vez no master e os workers nascem por fork,
+  compartilhando a memória (copy-on-write) do que já foi importado/aquecido;
+- reciclagem: cada worker sai depois de `max_requests` (+ jitter, para não
+  reiniciarem todos juntos) ou quando o RSS passa de GUNICORN_MAX_RSS_MB
+  (a geração de PDF costuma inchar o processo);
+- workers/threads vêm do ambiente (WEB_CONCURRENCY, GUNICORN_THREADS) ou da
+  fórmula padrão 2 x núcleos + 1.
+"""
+import gc
+import multiprocessing
+import os
+import resource
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+wsgi_app = "config.wsgi:application"
+preload_app = True
+
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", "2"))
+worker_class = "gthread" if threads > 1 else "sync"
+
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", str(max_requests // 10)))
+MAX_RSS_MB = int(os.getenv("GUNICORN_MAX_RSS_MB", "512"))
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOGLEVEL", "info")
+
+
+def rss_mb():
+    """RSS atual do processo (Linux: /proc; fora dele, o pico do getrusage)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def on_starting(server):
+    """Antes de tudo, no master: retratos de métricas de uma execução anterior não valem mais."""
+    diretorio = os.getenv("METRICAS_DIR", os.getenv("PROMETHEUS_MULTIPROC_DIR", ""))
+    if diretorio and os.path.isdir(diretorio):
+        for arquivo in os.listdir(diretorio):
+            if arquivo.startswith("metricas-"):
+                os.remove(os.path.join(diretorio, arquivo))
+
+
+def when_ready(server):
+    """No master, depois do preload e antes do fork dos workers."""
+    from django.urls import get_resolver
+
+    from api import autocomplete
+    from api.serializers import ProjetoSerializer, leitura_materiais
+
+    get_resolver().url_patterns   # resolve todas as rotas
+    leitura_materiais()           # plano da leitura rápida de materiais (lru_cache)
+    ProjetoSerializer().fields    # monta os campos dos serializers do detalhe
+    autocomplete.montar()         # índices do /api/autocomplete/, herdados pelos workers
+    if os.getenv("GUNICORN_AQUECER_PDF") == "1":
+        # reportlab é sob demanda; com preload pode valer carregar no master e dividir entre os workers
+        from api.especificacao import _estilos
+        _estilos()
+
+    # o que já existe não é mais varrido pelo GC: evita que a coleta toque
+    # (e copie) as páginas herdadas do master
+    gc.collect()
+    gc.freeze()
+    server.log.info("App aquecido no master (%.0f MiB)", rss_mb())
+
+
+def post_fork(server, worker):
+    # conexões abertas no master não podem ser compartilhadas entre processos
+    from django.db import connections
+    connections.close_all()
+
+
+def post_worker_init(worker):
+    worker.log.info("Worker %s pronto (%.0f MiB)", worker.pid, rss_mb())
+
+
+def post_request(worker, req, environ, resp):
+    rss = rss_mb()
+    if rss > MAX_RSS_MB:
+        # termina a requisição atual e sai; o master sobe um worker novo
+        worker.log.warning("Worker %s com %.0f MiB (> %s MiB): reciclando", worker.pid, rss, MAX_RSS_MB)
+        worker.alive = False
+
+
+def worker_exit(server, worker):
+    worker.log.info("Worker %s saindo (%.0f MiB)", worker.pid, rss_mb())
+
+
+def child_exit(server, worker):
+    """No master, depois que o worker saiu: as métricas dele entram no acumulado dos que já saíram."""
+    from api import metricas
+    metricas.consolidar(worker.pid)